@@ -1,14 +1,40 @@
+import os
 import numpy as np
-from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+import scipy.sparse as sp
+from scipy.sparse.linalg import eigsh, splu
+from scipy.optimize import brentq
 from arc import DynamicPolarizability, ShirleyMethod
 from arc import Cesium as Cs
+from arc.wigner import Wigner6j
 from models.utility import wavelength2freq, power2field
 from scipy.constants import c as C_c
+from scipy.constants import h as C_h
+from scipy.constants import e as C_e
 from scipy.constants import epsilon_0
+from scipy.constants import physical_constants
+
+a0 = physical_constants["Bohr radius"][0]
+
+# Shirley Hamiltonian blocks shared by all ACStarkShift instances, keyed on
+# the state and basis parameters (see ACStarkShift.shirley_cache_key)
+_SHIRLEY_BLOCKS_CACHE = {}
+# Sum-over-states data for the dynamic polarizability, keyed on the atom,
+# the state (n, l, j) and the basis n range
+_POLARIZABILITY_DATA_CACHE = {}
+
+
+def clear_shirley_cache():
+    """
+    Clear the in-memory cache of Shirley Hamiltonian blocks. Files written to
+    an on-disk cache directory are left untouched.
+    """
+    _SHIRLEY_BLOCKS_CACHE.clear()
 
 
 class ACStarkShift:
-    def __init__(self, laserWaist=1e-6, n=6, l=0, j=0.5, mj=0.5, q=0):
+    def __init__(self, laserWaist=1e-6, n=6, l=0, j=0.5, mj=0.5, q=0,
+                 cache_dir=None):
         """
         Initialize the ACStarkShift object for computing AC Stark shifts given a
         state.
@@ -27,6 +53,10 @@ class ACStarkShift:
             Magnetic quantum number of the state. Defaults to 0.5.
         q : int, optional
             Polarization of the laser. Defaults to 0.
+        cache_dir : str, optional
+            Directory in which the Shirley Hamiltonian blocks are saved, so
+            that later sessions can skip the basis construction. Defaults to
+            None, in which case blocks are only cached in memory.
         """
         self.laserWaist = laserWaist
         self.n = n
@@ -35,6 +65,7 @@ class ACStarkShift:
         self.mj = mj
         self.q = q
         self.atom = Cs()
+        self.cache_dir = cache_dir
 
         # calculation specific parameters
         self.target_state = [self.n, self.l, self.j]
@@ -44,10 +75,157 @@ class ACStarkShift:
         self.basis_n_min = self.n - 5
         self.basis_n_max = self.n + 5
 
+    def get_polarizability_data(self):
+        """
+        Extract the sum-over-states data of the dynamic polarizability.
+
+        The basis of dipole-coupled states is the one of ARC's
+        `DynamicPolarizability` between `basis_n_min` and `basis_n_max`. The
+        data only depends on the state and the basis, so it is cached across
+        all instances.
+
+        Returns
+        -------
+        data : dict
+            Dictionary with the basis states "basis", the transition energies
+            from the target state "transition_energies" (in J), the squared
+            reduced dipole matrix elements "dipole_sq" (in C^2 m^2), the total
+            angular momenta of the coupled states "j" and the target state
+            energy "target_energy" (in J).
+        """
+        key = (self.atom.elementName, self.n, self.l, float(self.j),
+               self.basis_n_min, self.basis_n_max)
+        if key in _POLARIZABILITY_DATA_CACHE:
+            return _POLARIZABILITY_DATA_CACHE[key]
+
+        calc = DynamicPolarizability(self.atom, *self.target_state)
+        calc.defineBasis(self.basis_n_min, self.basis_n_max)
+        # same selection of coupled states as DynamicPolarizability
+        basis = [state for state in calc.basis
+                 if abs(state[2] - self.j) < 1.1 and
+                 0.5 < abs(state[1] - self.l) < 1.1]
+
+        target_energy = self.atom.getEnergy(self.n, self.l, self.j) * C_e
+        transition_energies = np.asarray(
+            [self.atom.getEnergy(n1, l1, j1) * C_e
+             for n1, l1, j1, *_ in basis]) - target_energy
+        dipole_sq = np.asarray(
+            [self.atom.getReducedMatrixElementJ(self.n, self.l, self.j,
+                                                n1, l1, j1)**2
+             for n1, l1, j1, *_ in basis]) * (C_e * a0)**2
+
+        data = {"basis": basis,
+                "transition_energies": transition_energies,
+                "dipole_sq": dipole_sq,
+                "j": np.asarray([state[2] for state in basis], dtype=float),
+                "target_energy": target_energy}
+        _POLARIZABILITY_DATA_CACHE[key] = data
+        return data
+
+    def get_polarizability(self, wavelengths):
+        """
+        Compute the scalar, vector and tensor dynamic polarizabilities for an
+        array of wavelengths.
+
+        Vectorized equivalent of ARC's `DynamicPolarizability.getPolarizability`
+        (without state lifetimes): the sum over states is evaluated as a single
+        NumPy broadcast over wavelengths and basis states.
+
+        Parameters
+        ----------
+        wavelengths : array_like
+            Wavelengths of the driving field, in meters.
+
+        Returns
+        -------
+        alpha0 : np.ndarray
+            Scalar polarizability at each wavelength, in Hz m^2 / V^2.
+        alpha1 : np.ndarray
+            Vector polarizability at each wavelength, in Hz m^2 / V^2.
+        alpha2 : np.ndarray
+            Tensor polarizability at each wavelength, in Hz m^2 / V^2.
+        """
+        data = self.get_polarizability_data()
+        j = self.j
+        j1 = data["j"]
+        dE = data["transition_energies"][np.newaxis, :]
+        d2 = data["dipole_sq"][np.newaxis, :]
+        driveEnergy = (C_c / np.atleast_1d(np.asarray(wavelengths, dtype=float))
+                       * C_h)[:, np.newaxis]
+        denominator = dE**2 - driveEnergy**2
+
+        alpha0 = np.sum(d2 * dE / denominator, axis=-1)
+        alpha0 = 2.0 * alpha0 / (3.0 * (2.0 * j + 1.0)) / C_h
+
+        alpha1 = np.sum(-(j * (j + 1) + 2 - j1 * (j1 + 1)) * d2 * driveEnergy
+                        / denominator, axis=-1)
+        alpha1 = alpha1 / ((j + 1) * (2 * j + 1)) / C_h
+
+        # tensor polarizability vanishes for j=1/2 and j=0 states
+        if j > 0.6:
+            sign = (-1.0)**np.round(j + j1 + 1)
+            wigner = np.asarray([Wigner6j(j, 1, jj, 1, j, 2) for jj in j1])
+            alpha2 = np.sum(sign * d2 * wigner * dE / denominator, axis=-1)
+            prefactor2 = (6 * j * (2 * j - 1) /
+                          (6 * (j + 1) * (2 * j + 1) * (2 * j + 3)))**0.5
+            alpha2 = -4 * prefactor2 * alpha2 / C_h
+        else:
+            alpha2 = np.zeros_like(alpha0)
+
+        return alpha0, alpha1, alpha2
+
+    def get_state_polarizability(self, wavelengths):
+        """
+        Compute the dynamic polarizability of the state |j, mj> in light of
+        polarization `q`, combining the scalar, vector and tensor parts of
+        `get_polarizability`.
+
+        With the quantization axis along the polarization for q=0 and along
+        the propagation direction for q=+-1,
+
+            alpha = alpha0 + q mj / (2 j) alpha1
+                    + c_q (3 mj^2 - j (j + 1)) / (j (2 j - 1)) alpha2,
+
+        with c_0 = 1 and c_{+-1} = -1/2. The tensor term vanishes for j=1/2.
+
+        Parameters
+        ----------
+        wavelengths : array_like
+            Wavelengths of the driving field, in meters.
+
+        Returns
+        -------
+        alpha : np.ndarray
+            Polarizability at each wavelength, in Hz m^2 / V^2.
+        """
+        alpha0, alpha1, alpha2 = self.get_polarizability(wavelengths)
+        j, mj = self.j, self.mj
+        alpha = alpha0 + self.q * mj / (2 * j) * alpha1
+        if j > 0.6:
+            tensor = (3 * mj**2 - j * (j + 1)) / (j * (2 * j - 1))
+            alpha = alpha + (1.0 if self.q == 0 else -0.5) * tensor * alpha2
+        return alpha
+
+    def get_resonance_wavelengths(self):
+        """
+        Wavelengths of the dipole transitions included in the polarizability
+        basis, i.e. the poles of the dynamic polarizability.
+
+        Returns
+        -------
+        wavelengths : np.ndarray
+            Sorted resonance wavelengths, in meters.
+        """
+        data = self.get_polarizability_data()
+        return np.sort(C_c * C_h / np.abs(data["transition_energies"]))
+
     def ac_stark_shift_polarizability(self, wavelengthList, P):
         """
         Computes the AC Stark shift via the dynamic polarizability method.
 
+        The polarizability includes the vector and tensor parts for the mj and
+        q of the state, see `get_state_polarizability`.
+
         Parameters
         ----------
         wavelengthList : list
@@ -61,42 +239,27 @@ class ACStarkShift:
             A list of the AC Stark shifts at each of the wavelengths in
             wavelengthList.
         """
-        calc = DynamicPolarizability(self.atom, *self.target_state)
-        calc.defineBasis(self.basis_n_min, self.basis_n_max)
-        alpha0_lst = []
-        for wavelength in wavelengthList:
-            alpha0, alpha1, alpha2, alphaC, alphaP, closestState = calc.getPolarizability(
-                wavelength, units="SI")
-            alpha0_lst.append(alpha0)
+        alpha = self.get_state_polarizability(wavelengthList)
 
         I = 2 * P / (np.pi * self.laserWaist**2)
-        U_AC = -np.real(alpha0_lst) * I / (2 * C_c * epsilon_0)
+        U_AC = -np.real(alpha) * I / (2 * C_c * epsilon_0)
 
         return U_AC
 
-    def ac_stark_shift_shirley(self, wavelengths, powers):
-
+    def define_shirley_calculation(self):
         """
-        Computes the AC Stark shift using the Shirley method.
+        Set up the ARC Shirley calculation for the target state.
 
-        Parameters
-        ----------
-        wavelengths : list
-            A list of wavelengths to compute the AC Stark shift at.
-        powers : list
-            A list of powers to compute the AC Stark shift at.
+        The basis includes the local (microwave) basis around the target state
+        and, for highly-excited target states, the states near the ground
+        state that are coupled by optical transitions.
 
         Returns
         -------
-        u_shirley : array_like
-            A 2D array of the AC Stark shifts at each combination of powers and
-            wavelengths.
+        calc_full : arc.ShirleyMethod
+            The ARC Shirley calculation with the basis and the Floquet
+            Hamiltonian defined.
         """
-        # Define the frequencies and electric field magnitudes that generate
-        # the shifts
-        freqs = wavelength2freq(wavelengths)
-        eFields = power2field(powers, self.laserWaist)
-
         calc_full = ShirleyMethod(self.atom)
 
         # define a basis set that includes the local (microwave) and coupled
@@ -131,11 +294,671 @@ class ACStarkShift:
         # Define the Hamiltonian
         calc_full.defineShirleyHamiltonian(fn=1)
 
+        return calc_full
+
+    def shirley_cache_key(self):
+        """
+        Key identifying the Shirley Hamiltonian blocks of this instance.
+
+        Returns
+        -------
+        key : tuple
+            The atom, the target state (n, l, j, mj), the polarization q, the
+            basis range (n_min, n_max) and lmax.
+        """
+        return (self.atom.elementName, self.n, self.l, float(self.j),
+                float(self.mj), self.q, self.basis_n_min, self.basis_n_max,
+                self.lmax)
+
+    def get_shirley_blocks(self, use_cache=True):
+        """
+        Extract the constant building blocks of the Shirley Hamiltonian.
+
+        The Floquet Hamiltonian at electric field E and frequency f is
+        H = diag(h0 + dT * f) + B * E, so the blocks only need to be computed
+        once for any number of (frequency, field) points. Blocks are cached in
+        memory across all instances and, if `cache_dir` is set, on disk.
+
+        Parameters
+        ----------
+        use_cache : bool, optional
+            Whether to look up and store the blocks in the cache. Defaults to
+            True.
+
+        Returns
+        -------
+        blocks : dict
+            Dictionary with the field-independent diagonal "h0", the
+            photon-number diagonal "dT", the sparse coupling matrix "B" (per
+            unit field), the index of the target state in the Floquet basis
+            "target_index" and the bare energy of the target state
+            "target_energy". Energies are in Hz. The cached arrays are shared,
+            do not modify them in place.
+        """
+        key = self.shirley_cache_key()
+        if use_cache:
+            if key in _SHIRLEY_BLOCKS_CACHE:
+                return _SHIRLEY_BLOCKS_CACHE[key]
+            blocks = self._load_shirley_blocks(key)
+            if blocks is not None:
+                _SHIRLEY_BLOCKS_CACHE[key] = blocks
+                return blocks
+
+        calc_full = self.define_shirley_calculation()
+        # index of the target state in the k=0 block of the Floquet basis
+        target_index = (calc_full.fn * len(calc_full.basisStates) +
+                        calc_full.indexOfCoupledState)
+        blocks = {"h0": calc_full.H0.diagonal(),
+                  "dT": calc_full.dT.diagonal(),
+                  "B": calc_full.B,
+                  "target_index": target_index,
+                  "target_energy": calc_full.targetEnergy}
+
+        if use_cache:
+            _SHIRLEY_BLOCKS_CACHE[key] = blocks
+            self._save_shirley_blocks(key, blocks)
+        return blocks
+
+    def _shirley_cache_path(self, key):
+        """
+        Path of the on-disk cache file for the given key, or None if no
+        cache directory is set.
+        """
+        if self.cache_dir is None:
+            return None
+        name = "shirley_" + "_".join(str(k) for k in key) + ".npz"
+        return os.path.join(self.cache_dir, name)
+
+    def _load_shirley_blocks(self, key):
+        """
+        Load Shirley Hamiltonian blocks from the on-disk cache, if present.
+        """
+        path = self._shirley_cache_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            B = sp.csr_matrix((data["B_data"], data["B_indices"],
+                               data["B_indptr"]), shape=data["B_shape"])
+            return {"h0": data["h0"], "dT": data["dT"], "B": B,
+                    "target_index": int(data["target_index"]),
+                    "target_energy": float(data["target_energy"])}
+
+    def _save_shirley_blocks(self, key, blocks):
+        """
+        Save Shirley Hamiltonian blocks to the on-disk cache, if enabled.
+        """
+        path = self._shirley_cache_path(key)
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        B = blocks["B"].tocsr()
+        np.savez(path, h0=blocks["h0"], dT=blocks["dT"], B_data=B.data,
+                 B_indices=B.indices, B_indptr=B.indptr, B_shape=B.shape,
+                 target_index=blocks["target_index"],
+                 target_energy=blocks["target_energy"])
+
+    @staticmethod
+    def diagonalise_shirley_batch(blocks, freqs, eFields, chunk_size=128,
+                                  n_jobs=1):
+        """
+        Compute the target state shift for a batch of (frequency, field) pairs.
+
+        The Floquet Hamiltonians are assembled from the constant blocks and
+        diagonalized as a stack with a single vectorized LAPACK call per chunk.
+
+        Parameters
+        ----------
+        blocks : dict
+            The Shirley Hamiltonian blocks returned by `get_shirley_blocks`.
+        freqs : array_like
+            Driving frequencies in Hz.
+        eFields : array_like
+            Electric field amplitudes in V/m, paired element-wise with `freqs`.
+        chunk_size : int, optional
+            Number of Hamiltonians diagonalized at once, limits the memory
+            footprint of the stack. Defaults to 128.
+        n_jobs : int, optional
+            Number of threads used to diagonalize chunks in parallel. NumPy
+            releases the GIL inside LAPACK, so threads scale with the number
+            of cores. Defaults to 1.
+
+        Returns
+        -------
+        shifts : np.ndarray
+            Shift of the target state at each (frequency, field) pair, in Hz.
+            Same convention as ARC's `ShirleyMethod.targetShifts`.
+        """
+        freqs, eFields = np.broadcast_arrays(np.asarray(freqs, dtype=float),
+                                             np.asarray(eFields, dtype=float))
+        freqs = freqs.ravel()
+        eFields = eFields.ravel()
+        h0 = blocks["h0"]
+        dT = blocks["dT"]
+        B = blocks["B"].toarray()
+        target_index = blocks["target_index"]
+        diag = np.arange(len(h0))
+
+        shifts = np.empty(len(freqs))
+
+        def diagonalise_chunk(start):
+            f = freqs[start:start + chunk_size]
+            E = eFields[start:start + chunk_size]
+            Hf = B[np.newaxis, :, :] * E[:, np.newaxis, np.newaxis]
+            Hf[:, diag, diag] += h0[np.newaxis, :] + np.outer(f, dT)
+            ev, egvector = np.linalg.eigh(Hf)
+            # eigenvector with the largest overlap with the target state
+            evInd = np.argmax(np.abs(egvector[:, target_index, :])**2, axis=-1)
+            shifts[start:start + chunk_size] = (
+                blocks["target_energy"] -
+                np.take_along_axis(ev, evInd[:, np.newaxis], axis=-1)[:, 0])
+
+        starts = range(0, len(freqs), chunk_size)
+        if n_jobs == 1:
+            for start in starts:
+                diagonalise_chunk(start)
+        else:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                list(executor.map(diagonalise_chunk, starts))
+
+        return shifts
+
+    @staticmethod
+    def track_shirley_shift(blocks, freqs, eFields, tol=1e3, maxiter=10,
+                            n_eigs=6):
+        """
+        Track the target state shift along an ordered path of (frequency,
+        field) pairs.
+
+        Only the eigenpair connected to the target state is computed. The
+        first point is found with a sparse shift-invert solve around the bare
+        target energy; every following point is refined by Rayleigh quotient
+        iteration, warm-started from the previous eigenvector (eigenvalue
+        continuation). For smooth scans this converges in a couple of sparse
+        LU solves per point.
+
+        Parameters
+        ----------
+        blocks : dict
+            The Shirley Hamiltonian blocks returned by `get_shirley_blocks`.
+        freqs : array_like
+            Driving frequencies in Hz, in scan order.
+        eFields : array_like
+            Electric field amplitudes in V/m, paired element-wise with `freqs`.
+        tol : float, optional
+            Convergence threshold on the eigenpair residual, in Hz. The error
+            on the eigenvalue is of order tol**2 / (gap to the next level).
+            Defaults to 1e3.
+        maxiter : int, optional
+            Maximum number of Rayleigh quotient iterations per point. If the
+            iteration does not converge the point is solved cold with
+            shift-invert. Defaults to 10.
+        n_eigs : int, optional
+            Number of eigenpairs computed around the bare target energy in a
+            cold solve. Defaults to 6.
+
+        Returns
+        -------
+        shifts : np.ndarray
+            Shift of the target state at each (frequency, field) pair, in Hz.
+        """
+        freqs, eFields = np.broadcast_arrays(np.asarray(freqs, dtype=float),
+                                             np.asarray(eFields, dtype=float))
+        freqs = freqs.ravel()
+        eFields = eFields.ravel()
+        h0 = blocks["h0"]
+        dT = blocks["dT"]
+        B = blocks["B"].tocsc()
+        target_index = blocks["target_index"]
+        target_energy = blocks["target_energy"]
+        dim = len(h0)
+        identity = sp.identity(dim, format='csc')
+
+        def cold_solve(Hf):
+            ev, egvector = eigsh(Hf, k=min(n_eigs, dim - 2),
+                                 sigma=target_energy, which='LM')
+            evInd = np.argmax(np.abs(egvector[target_index, :])**2)
+            return ev[evInd], egvector[:, evInd]
+
+        shifts = np.empty(len(freqs))
+        x = None
+        for i, (f, E) in enumerate(zip(freqs, eFields)):
+            Hf = (sp.diags(h0 + dT * f, format='csc') + B * E).tocsc()
+            converged = False
+            if x is not None:
+                mu = x @ (Hf @ x)
+                for _ in range(maxiter):
+                    if np.linalg.norm(Hf @ x - mu * x) < tol:
+                        converged = True
+                        break
+                    try:
+                        y = splu(Hf - mu * identity).solve(x)
+                    except RuntimeError:
+                        # (H - mu) is exactly singular, mu is an eigenvalue
+                        converged = True
+                        break
+                    x = y / np.linalg.norm(y)
+                    mu = x @ (Hf @ x)
+            if not converged:
+                mu, x = cold_solve(Hf)
+            shifts[i] = target_energy - mu
+
+        return shifts
+
+    def ac_stark_shift_shirley(self, wavelengths, powers, chunk_size=128,
+                               n_jobs=1, method="batch"):
+        """
+        Computes the AC Stark shift using the Shirley method.
+
+        The Floquet Hamiltonian blocks are computed once. With
+        method="batch" all combinations of wavelength and power are fully
+        diagonalized in vectorized batches. With method="tracking" only the
+        target eigenvalue is followed through the grid, which scales to much
+        larger bases (see `track_shirley_shift`).
+
+        Parameters
+        ----------
+        wavelengths : list
+            A list of wavelengths to compute the AC Stark shift at.
+        powers : list
+            A list of powers to compute the AC Stark shift at.
+        chunk_size : int, optional
+            Number of Hamiltonians diagonalized at once. Defaults to 128.
+        n_jobs : int, optional
+            Number of threads used for the diagonalization. Defaults to 1.
+        method : str, optional
+            Either "batch" or "tracking". Defaults to "batch".
+
+        Returns
+        -------
+        u_shirley : array_like
+            A 2D array of the AC Stark shifts at each combination of powers and
+            wavelengths, with shape (len(powers), len(wavelengths)).
+        """
+        # Define the frequencies and electric field magnitudes that generate
+        # the shifts
+        freqs = np.atleast_1d(wavelength2freq(np.asarray(wavelengths)))
+        eFields = np.atleast_1d(power2field(np.asarray(powers),
+                                            self.laserWaist))
+
+        blocks = self.get_shirley_blocks()
+
         # Compute the AC Stark shifts
-        u_shirley = []
-        for freq, eField in product(freqs, eFields):
-            calc_full.diagonalise(eField, freq, progressOutput=False)
-            u_shirley.append(calc_full.targetShifts)
-        results_Shirley = np.array(u_shirley).reshape((len(eFields),
-                                                          len(freqs)))
+        eField_grid, freq_grid = np.meshgrid(eFields, freqs, indexing='ij')
+        if method == "batch":
+            u_shirley = self.diagonalise_shirley_batch(blocks, freq_grid,
+                                                       eField_grid,
+                                                       chunk_size=chunk_size,
+                                                       n_jobs=n_jobs)
+        elif method == "tracking":
+            # traverse the grid in snake order so that consecutive points are
+            # always neighbours and the warm start stays close
+            freq_grid[1::2] = freq_grid[1::2, ::-1]
+            u_shirley = self.track_shirley_shift(blocks, freq_grid,
+                                                 eField_grid).reshape(
+                freq_grid.shape)
+            u_shirley[1::2] = u_shirley[1::2, ::-1]
+        else:
+            raise ValueError(f"Invalid Shirley method: {method}")
+        results_Shirley = u_shirley.reshape((len(eFields), len(freqs)))
         return results_Shirley
+
+    def ac_stark_shift_shirley_adaptive(self, wavelength_min, wavelength_max,
+                                        power, tol=1e5, n_initial=16,
+                                        min_spacing=1e-12, max_points=2000):
+        """
+        Computes the AC Stark shift with the Shirley method on an adaptively
+        refined wavelength grid.
+
+        The scan starts from a coarse grid, uniform in frequency, augmented
+        with the resonance wavelengths of the basis transitions. Every round,
+        the intervals whose estimated linear interpolation error exceeds `tol`
+        are bisected, and all new midpoints are diagonalized in one batch. The
+        error of an interval is estimated from the deviation of the shift at
+        its midpoint from the linear interpolation of its end points, and is
+        assumed to drop by a factor of 4 for each of its two halves. This
+        concentrates the points near resonances, where the shift curvature is
+        large, and keeps the grid coarse elsewhere.
+
+        Parameters
+        ----------
+        wavelength_min : float
+            Lower end of the wavelength range, in meters.
+        wavelength_max : float
+            Upper end of the wavelength range, in meters.
+        power : float
+            The power of the laser, in W.
+        tol : float, optional
+            Target interpolation error of the shift, in Hz. Defaults to 1e5.
+        n_initial : int, optional
+            Number of points of the initial grid, in addition to the
+            resonance wavelengths. Defaults to 16.
+        min_spacing : float, optional
+            Intervals shorter than this are never bisected, in meters. Stops
+            the refinement at discontinuities of the tracked shift.
+            Defaults to 1e-12.
+        max_points : int, optional
+            Maximum number of Shirley diagonalizations. Defaults to 2000.
+
+        Returns
+        -------
+        wavelengths : np.ndarray
+            The non-uniform, sorted wavelength grid, in meters.
+        u_shirley : np.ndarray
+            The AC Stark shift at each wavelength, in Hz.
+        errors : np.ndarray
+            Estimated linear interpolation error of each of the
+            len(wavelengths) - 1 intervals, in Hz.
+        """
+        blocks = self.get_shirley_blocks()
+        eField = power2field(power, self.laserWaist)
+
+        def shirley(wavelengths):
+            return self.diagonalise_shirley_batch(
+                blocks, wavelength2freq(wavelengths), eField)
+
+        resonances = self.get_resonance_wavelengths()
+        resonances = resonances[(resonances > wavelength_min) &
+                                (resonances < wavelength_max)]
+        wavelengths = np.unique(np.concatenate([
+            C_c / np.linspace(C_c / wavelength_max, C_c / wavelength_min,
+                              n_initial), resonances]))
+        u_shirley = shirley(wavelengths)
+        # error of each interval is unknown until its midpoint is computed
+        errors = np.full(len(wavelengths) - 1, np.inf)
+
+        while True:
+            refine = ((errors > tol) & (np.diff(wavelengths) > min_spacing))
+            n_refine = min(np.count_nonzero(refine),
+                           max_points - len(wavelengths))
+            if n_refine <= 0:
+                break
+            # refine the worst intervals first if we run out of points
+            refine_idx = np.nonzero(refine)[0]
+            refine_idx = np.sort(
+                refine_idx[np.argsort(-errors[refine_idx])[:n_refine]])
+
+            midpoints = 0.5 * (wavelengths[refine_idx] +
+                               wavelengths[refine_idx + 1])
+            u_mid = shirley(midpoints)
+            mid_errors = np.abs(u_mid - 0.5 * (u_shirley[refine_idx] +
+                                               u_shirley[refine_idx + 1]))
+
+            # each refined interval is replaced by its two halves
+            new_errors = errors.copy()
+            new_errors[refine_idx] = mid_errors / 4
+            errors = np.insert(new_errors, refine_idx + 1, mid_errors / 4)
+            wavelengths = np.insert(wavelengths, refine_idx + 1, midpoints)
+            u_shirley = np.insert(u_shirley, refine_idx + 1, u_mid)
+
+        return wavelengths, u_shirley, errors
+
+    def get_nonlinearity(self, wavelengths, eFields):
+        """
+        Estimate the relative deviation of the AC Stark shift from the
+        linear (second-order perturbative) regime.
+
+        For each dipole transition k of the polarizability basis, the exact
+        two-level shift deviates from the perturbative one by a relative
+        amount Omega_k^2 / (4 Delta_k^2), where Omega_k is the Rabi frequency
+        (bounded using the reduced matrix element) and Delta_k the detuning of
+        the drive from the transition. The largest ratio over all transitions
+        is returned.
+
+        Parameters
+        ----------
+        wavelengths : array_like
+            Wavelengths of the laser, in meters.
+        eFields : array_like
+            Electric field amplitudes in V/m, broadcast against `wavelengths`.
+
+        Returns
+        -------
+        nonlinearity : np.ndarray
+            Estimated relative deviation from the linear regime.
+        """
+        data = self.get_polarizability_data()
+        wavelengths, eFields = np.broadcast_arrays(
+            np.asarray(wavelengths, dtype=float),
+            np.asarray(eFields, dtype=float))
+        freqs = wavelength2freq(wavelengths)[..., np.newaxis]
+        transition_freqs = np.abs(data["transition_energies"]) / C_h
+        # rotating and counter-rotating detunings
+        detunings = np.minimum(np.abs(transition_freqs - freqs),
+                               transition_freqs + freqs)
+        rabi_freqs = (np.sqrt(data["dipole_sq"]) / C_h *
+                      eFields[..., np.newaxis])
+        return np.max(rabi_freqs**2 / (4 * detunings**2), axis=-1)
+
+    def ac_stark_shift_hybrid(self, wavelengths, powers, rtol=1e-3):
+        """
+        Computes the AC Stark shift, using the linear (perturbative) result
+        wherever it is valid and the Shirley method elsewhere.
+
+        The linear coefficient of the shift at each wavelength is obtained
+        from one Shirley diagonalization at a low reference field, so both
+        regimes agree at the crossover. Points where `get_nonlinearity`
+        exceeds `rtol` are diagonalized in a batch with the Shirley method.
+        Power scans in the linear regime therefore cost one diagonalization
+        per wavelength.
+
+        Parameters
+        ----------
+        wavelengths : list
+            A list of wavelengths to compute the AC Stark shift at.
+        powers : list
+            A list of powers to compute the AC Stark shift at.
+        rtol : float, optional
+            Largest estimated relative deviation from the linear regime for
+            which the linear result is used. Defaults to 1e-3.
+
+        Returns
+        -------
+        u_hybrid : np.ndarray
+            A 2D array of the AC Stark shifts at each combination of powers
+            and wavelengths, with shape (len(powers), len(wavelengths)). Same
+            convention as `ac_stark_shift_shirley`.
+        shirley_mask : np.ndarray
+            Boolean array of the same shape, True where the Shirley method
+            was used.
+        """
+        wavelengths = np.atleast_1d(np.asarray(wavelengths, dtype=float))
+        freqs = wavelength2freq(wavelengths)
+        eFields = np.atleast_1d(power2field(np.asarray(powers),
+                                            self.laserWaist))
+        blocks = self.get_shirley_blocks()
+
+        # reference field deep in the linear regime; the nonlinearity scales
+        # as the field squared
+        nonlinearity_unit_field = self.get_nonlinearity(wavelengths, 1.0)
+        eField_ref = np.minimum(
+            np.sqrt(1e-2 * rtol / nonlinearity_unit_field), np.max(eFields))
+        eField_ref[eField_ref == 0] = 1.0
+        slope = (self.diagonalise_shirley_batch(blocks, freqs, eField_ref)
+                 / eField_ref**2)
+
+        eField_grid, freq_idx = np.meshgrid(eFields, np.arange(len(freqs)),
+                                            indexing='ij')
+        u_hybrid = slope[freq_idx] * eField_grid**2
+        shirley_mask = (nonlinearity_unit_field[freq_idx] * eField_grid**2
+                        > rtol)
+        if np.any(shirley_mask):
+            u_hybrid[shirley_mask] = self.diagonalise_shirley_batch(
+                blocks, freqs[freq_idx[shirley_mask]],
+                eField_grid[shirley_mask])
+
+        return u_hybrid, shirley_mask
+
+    def get_shift_intensity_table(self, wavelength, max_intensity,
+                                  n_points=256):
+        """
+        Tabulate the Shirley AC Stark shift versus laser intensity at a fixed
+        wavelength.
+
+        Parameters
+        ----------
+        wavelength : float
+            The wavelength of the laser, in meters.
+        max_intensity : float
+            Largest intensity in the table, in W/m^2.
+        n_points : int, optional
+            Number of intensities in the table, evenly spaced from zero.
+            Defaults to 256.
+
+        Returns
+        -------
+        intensities : np.ndarray
+            The tabulated intensities, in W/m^2.
+        shifts : np.ndarray
+            The AC Stark shift at each intensity, in Hz.
+        """
+        intensities = np.linspace(0, max_intensity, n_points)
+        eFields = np.sqrt(2.0 * intensities / (C_c * epsilon_0))
+        shifts = self.diagonalise_shirley_batch(
+            self.get_shirley_blocks(), wavelength2freq(wavelength), eFields)
+        return intensities, shifts
+
+    def light_shift_map(self, wavelength, intensity_map, n_points=256):
+        """
+        Compute the AC Stark shift for every pixel of an intensity map.
+
+        The shift is tabulated versus intensity once (see
+        `get_shift_intensity_table`) and the map is evaluated by a single
+        vectorized interpolation, so the cost is independent of the number of
+        pixels and tweezer sites.
+
+        Parameters
+        ----------
+        wavelength : float
+            The wavelength of the laser, in meters.
+        intensity_map : array_like
+            Intensity at each pixel or voxel, in W/m^2. Any shape.
+        n_points : int, optional
+            Number of intensities in the table. Defaults to 256.
+
+        Returns
+        -------
+        shift_map : np.ndarray
+            The AC Stark shift at each pixel, in Hz, with the shape of
+            `intensity_map`.
+        """
+        intensity_map = np.asarray(intensity_map, dtype=float)
+        intensities, shifts = self.get_shift_intensity_table(
+            wavelength, np.max(intensity_map), n_points=n_points)
+        return np.interp(intensity_map, intensities, shifts)
+
+
+def find_magic_wavelengths(shifter1, shifter2, wavelength_min,
+                           wavelength_max, samples_per_interval=16,
+                           pole_margin=1e-9, xtol=1e-16):
+    """
+    Find the magic wavelengths of two states in a wavelength range.
+
+    Magic wavelengths are the zero crossings of the differential
+    polarizability of the two states, where both experience the same light
+    shift. The polarizability of each state includes the vector and tensor
+    parts for its mj and q, see `ACStarkShift.get_state_polarizability`.
+    The range is split at the resonances (poles) of both states; each
+    pole-free interval is sampled on a coarse grid, uniform in frequency, and
+    every sign change is refined with Brent's method on the vectorized
+    polarizability.
+
+    Parameters
+    ----------
+    shifter1 : ACStarkShift
+        The first state.
+    shifter2 : ACStarkShift
+        The second state.
+    wavelength_min : float
+        Lower end of the wavelength range, in meters.
+    wavelength_max : float
+        Upper end of the wavelength range, in meters.
+    samples_per_interval : int, optional
+        Number of samples in each interval between resonances used to bracket
+        the zero crossings. Defaults to 16.
+    pole_margin : float, optional
+        Fractional distance to a resonance excluded from the search.
+        Defaults to 1e-9.
+    xtol : float, optional
+        Absolute tolerance on the magic wavelengths, in meters.
+        Defaults to 1e-16.
+
+    Returns
+    -------
+    magic_wavelengths : np.ndarray
+        Sorted magic wavelengths in the range, in meters.
+    """
+    def diff_alpha(wavelength):
+        return (shifter1.get_state_polarizability(wavelength) -
+                shifter2.get_state_polarizability(wavelength))
+
+    poles = np.concatenate([shifter1.get_resonance_wavelengths(),
+                            shifter2.get_resonance_wavelengths()])
+    poles = np.unique(poles[(poles > wavelength_min) &
+                            (poles < wavelength_max)])
+    edges = np.concatenate([[wavelength_min], poles, [wavelength_max]])
+
+    magic_wavelengths = []
+    for lower, upper in zip(edges[:-1], edges[1:]):
+        # stay clear of the poles at the interval boundaries
+        if lower in poles:
+            lower = lower * (1 + pole_margin)
+        if upper in poles:
+            upper = upper * (1 - pole_margin)
+        if lower >= upper:
+            continue
+        # polarizability poles are evenly spread in frequency
+        samples = C_c / np.linspace(C_c / upper, C_c / lower,
+                                    samples_per_interval)[::-1]
+        values = diff_alpha(samples)
+        for k in np.nonzero(np.sign(values[:-1]) *
+                            np.sign(values[1:]) <= 0)[0]:
+            if values[k] == 0:
+                magic_wavelengths.append(samples[k])
+            elif values[k + 1] != 0:
+                magic_wavelengths.append(
+                    brentq(lambda x: diff_alpha(x)[0], samples[k],
+                           samples[k + 1], xtol=xtol))
+
+    return np.unique(magic_wavelengths)
+
+
+def tweezer_light_shift_map(shifters, wavelength, intensity_map, sites=None,
+                            n_points=256):
+    """
+    Compute the light shift map of a tweezer array for several states.
+
+    Parameters
+    ----------
+    shifters : list[ACStarkShift]
+        The states for which the light shifts are computed.
+    wavelength : float
+        The wavelength of the tweezer light, in meters.
+    intensity_map : array_like
+        2-D or 3-D intensity map of the tweezer array (e.g. from an SLM
+        hologram simulation or a calibrated camera image), in W/m^2.
+    sites : array_like, optional
+        Integer pixel indices of the tweezer sites, with shape
+        (num_sites, intensity_map.ndim). Defaults to None, in which case no
+        per-site shifts are returned.
+    n_points : int, optional
+        Number of intensities in the shift tables. Defaults to 256.
+
+    Returns
+    -------
+    shift_maps : np.ndarray
+        The light shift at each pixel for each state, in Hz, with shape
+        (len(shifters), *intensity_map.shape).
+    site_shifts : np.ndarray or None
+        The light shift at each site for each state, in Hz, with shape
+        (len(shifters), num_sites), or None if `sites` is None.
+    """
+    shift_maps = np.asarray([shifter.light_shift_map(wavelength,
+                                                     intensity_map,
+                                                     n_points=n_points)
+                             for shifter in shifters])
+    if sites is None:
+        return shift_maps, None
+
+    site_index = tuple(np.asarray(sites, dtype=int).T)
+    site_shifts = shift_maps[(slice(None),) + site_index]
+    return shift_maps, site_shifts
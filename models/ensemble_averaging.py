@@ -0,0 +1,321 @@
+import numpy as np
+import scipy.constants as const
+from numba import njit
+
+
+@njit('float64[:,:,:](float64[:,:], float64[:,:], complex128[:,:], '
+      'complex128[:,:], float64[:], complex128[:,:], float64)')
+def _evolve_taylor(couplings12, couplings23, energies_e, energies_r, deltaT,
+                   psi0, tol):
+    """
+    Populations of the ground, 7P and Rydberg states under the tridiagonal
+    Hamiltonians of `evolve_batch`, of shape (n, len(deltaT) + 1, 3).
+    """
+    num_atoms, num_times = couplings12.shape
+    populations = np.empty((num_atoms, num_times, 3))
+    for n in range(num_atoms):
+        g, e, r = psi0[n, 0], psi0[n, 1], psi0[n, 2]
+        populations[n, 0] = abs(g)**2, abs(e)**2, abs(r)**2
+        for i in range(num_times - 1):
+            c12, c23 = couplings12[n, i], couplings23[n, i]
+            Ee, Er = energies_e[n, i], energies_r[n, i]
+            # substeps with a 1-norm of H tau of at most 1/2
+            norm = abs(c12) + abs(c23) + max(abs(Ee), abs(Er))
+            num_substeps = max(1, int(np.ceil(2 * norm * deltaT[i])))
+            tau = deltaT[i] / num_substeps
+            for _ in range(num_substeps):
+                tg, te, tr = g, e, r
+                k = 0
+                while abs(tg) + abs(te) + abs(tr) > tol:
+                    k += 1
+                    factor = -1j * tau / k
+                    tg, te, tr = (factor * c12 * te,
+                                  factor * (c12 * tg + Ee * te + c23 * tr),
+                                  factor * (c23 * te + Er * tr))
+                    g, e, r = g + tg, e + te, r + tr
+            populations[n, i + 1] = abs(g)**2, abs(e)**2, abs(r)**2
+    return populations
+
+
+def evolve_batch(time_array, Omega12, Omega23, Delta, delta, gamma2=0.0,
+                 gamma3=0.0, psi0=None, tol: float = 1e-15):
+    """
+    Evolve a batch of three-level atoms (ground, 7P and Rydberg states) with
+    different parameters at once.
+
+    Every parameter broadcasts against the shape (n, len(time_array)), so
+    constants per atom are passed with shape (n, 1) and pulses shared by all
+    atoms with shape (len(time_array),). The Hamiltonian is that of
+    `LossyRydberg.get_hamiltonian` and piecewise constant on `time_array`, as
+    in `UnitaryRydberg.evolve_state`. Since the loss state of `LossyRydberg`
+    is only fed by the decay of the 7P and Rydberg states, the Lindblad
+    equation of `LossyRydberg.probe_pulse_lindblad` reduces to the state
+    vector evolution under H - i/2 (gamma2 |e><e| + gamma3 |r><r|), whose
+    loss of norm is the loss population.
+
+    Every time step applies the truncated Taylor series of the propagator
+    to the state (as `scipy.sparse.linalg.expm_multiply` does), using the
+    tridiagonal structure of H instead of computing a matrix exponential per
+    atom and time step.
+
+    Parameters
+    ----------
+    time_array : np.ndarray
+        Time points in seconds.
+    Omega12, Omega23 : float or np.ndarray
+        Probe and coupling Rabi angular frequencies.
+    Delta, delta : float or np.ndarray
+        Detunings of the 7P and Rydberg states.
+    gamma2, gamma3 : float or np.ndarray, optional
+        Linewidths of the 7P and Rydberg states, default to 0 for unitary
+        dynamics.
+    psi0 : np.ndarray, optional
+        Initial state of shape (3,) or (n, 3), defaults to the ground state.
+    tol : float, optional
+        Truncation tolerance of the Taylor series, defaults to 1e-15.
+
+    Returns
+    -------
+    np.ndarray
+        Populations of the ground, 7P, Rydberg and loss states of shape
+        (n, len(time_array), 4).
+    """
+    time_array = np.asarray(time_array, dtype=float)
+    psi0 = np.array([1, 0, 0]) if psi0 is None else np.asarray(psi0)
+    Omega12, Omega23, Delta, delta, gamma2, gamma3, _ = np.broadcast_arrays(
+        *[np.asarray(p, dtype=float) for p in (
+            Omega12, Omega23, Delta, delta, gamma2, gamma3)],
+        np.zeros((np.atleast_2d(psi0).shape[0], len(time_array))))
+    psi = np.array(np.broadcast_to(psi0, (Omega12.shape[0], 3)),
+                   dtype=np.complex128)
+    populations = np.empty(Omega12.shape + (4,))
+    populations[..., :3] = _evolve_taylor(
+        np.ascontiguousarray(Omega12 / 2), np.ascontiguousarray(Omega23 / 2),
+        np.ascontiguousarray(Delta - 0.5j * gamma2),
+        np.ascontiguousarray(delta - 0.5j * gamma3), np.diff(time_array),
+        psi, tol)
+    populations[..., 3] = 1 - np.sum(populations[..., :3], axis=-1)
+    return populations
+
+
+def get_doppler_nodes(temperature, num_nodes: int = 8,
+                      probe_direction=(0, 0, 1), couple_direction=(0, 0, -1),
+                      probe_wavelength=456e-9, couple_wavelength=1064e-9,
+                      mass=None, tol=1e-9):
+    """
+    Gauss-Hermite quadrature of the Doppler shifts of thermal atoms.
+
+    An atom with velocity v sees the probe and coupling lasers shifted by
+    -k1.v and -k2.v, i.e. the detunings of `LossyRydberg.get_hamiltonian`
+    become Delta + k1.v and delta + (k1 + k2).v. The velocity components
+    are normal with standard deviation sqrt(kB T / m), as in
+    `recapture_monte_carlo.monte_carlo_3d`, and only their projections onto
+    the span of k1 and k2 matter: co- or counter-propagating beams need
+    `num_nodes` nodes, other geometries a grid of num_nodes^2.
+
+    Parameters
+    ----------
+    temperature : float
+        Temperature of the atoms in K.
+    num_nodes : int, optional
+        Number of quadrature nodes per dimension, defaults to 8.
+    probe_direction, couple_direction : array_like, optional
+        Propagation directions of the probe and coupling beams, default to
+        counter-propagating beams along z.
+    probe_wavelength, couple_wavelength : float, optional
+        Wavelengths of the probe and coupling lasers in meters, default to
+        456 nm and 1064 nm.
+    mass : float, optional
+        Mass of the atoms in kg, defaults to the mass of caesium.
+    tol : float, optional
+        Relative tolerance below which a direction of the beam geometry is
+        dropped, defaults to 1e-9.
+
+    Returns
+    -------
+    Delta_shifts : np.ndarray
+        Shifts of the 7P detuning at the nodes, in rad/s.
+    delta_shifts : np.ndarray
+        Shifts of the Rydberg detuning at the nodes, in rad/s.
+    weights : np.ndarray
+        Quadrature weights, which sum to one.
+    """
+    if mass is None:
+        from arc import Caesium
+        mass = Caesium().mass
+    wavevectors = np.array([
+        2 * np.pi / wavelength * np.asarray(direction, dtype=float) /
+        np.linalg.norm(direction) for direction, wavelength in (
+            (probe_direction, probe_wavelength),
+            (couple_direction, couple_wavelength))]).T
+    # the shifts K^T v of an isotropic normal velocity are V S x, with x
+    # standard normal in the rank of K = U S V^T
+    _, singular_values, Vt = np.linalg.svd(wavevectors,
+                                           full_matrices=False)
+    rank = int(np.sum(singular_values > tol * singular_values[0]))
+    x, w = np.polynomial.hermite_e.hermegauss(num_nodes)
+    grid = np.array(np.meshgrid(*[x] * rank, indexing='ij')).reshape(rank, -1)
+    weights = np.prod(np.array(np.meshgrid(*[w] * rank, indexing='ij')),
+                      axis=0).ravel() / (2 * np.pi)**(rank / 2)
+    sigma_v = np.sqrt(const.k * temperature / mass)
+    shifts = sigma_v * (Vt[:rank].T * singular_values[:rank]) @ grid
+    return shifts[0], shifts[0] + shifts[1], weights
+
+
+def get_intensity_noise_nodes(probe_rin=0.0, couple_rin=0.0,
+                              probe_pointing=0.0, couple_pointing=0.0,
+                              laserWaist=25e-6, num_nodes: int = 5,
+                              num_samples: int = None, seed=None):
+    """
+    Quadrature nodes (or random draws) of the Rabi frequency fluctuations
+    caused by laser intensity noise and beam pointing jitter.
+
+    The power of each beam fluctuates as P (1 + RIN x), with x standard
+    normal, and the beam center is displaced from the atom by a transverse
+    offset with normal components of standard deviation `pointing`. The
+    Rabi frequency scales with the field at the atom,
+    Omega ~ sqrt(P) exp(-r^2 / w^2), and r^2 / (2 pointing^2) follows an
+    exponential distribution, which is integrated with Gauss-Laguerre
+    quadrature. The nodes are a tensor grid over the fluctuating quantities
+    only.
+
+    Parameters
+    ----------
+    probe_rin, couple_rin : float, optional
+        Relative rms power fluctuations of the probe and coupling lasers,
+        default to 0.
+    probe_pointing, couple_pointing : float, optional
+        Rms beam displacement along each transverse axis in meters, default
+        to 0.
+    laserWaist : float, optional
+        The waist of the lasers in meters. Defaults to 25e-6.
+    num_nodes : int, optional
+        Number of quadrature nodes per fluctuating quantity, defaults to 5.
+    num_samples : int, optional
+        Number of random draws replacing the quadrature. Defaults to None,
+        for quadrature nodes.
+    seed : int, optional
+        Seed of the random draws.
+
+    Returns
+    -------
+    probe_scales : np.ndarray
+        Factors of the probe Rabi frequency at the nodes.
+    couple_scales : np.ndarray
+        Factors of the coupling Rabi frequency at the nodes.
+    weights : np.ndarray
+        Weights of the nodes, which sum to one.
+    """
+    noise = np.array([probe_rin, probe_pointing, couple_rin, couple_pointing],
+                     dtype=float)
+    active = np.nonzero(noise > 0)[0]
+    # power noise is normal and squared displacements exponential
+    normal = active % 2 == 0
+    if num_samples is None:
+        rules = [np.polynomial.hermite_e.hermegauss(num_nodes) if is_normal
+                 else np.polynomial.laguerre.laggauss(num_nodes)
+                 for is_normal in normal]
+        weights = np.prod(np.array(np.meshgrid(
+            *[w for _, w in rules], indexing='ij')), axis=0).ravel()
+        values = np.array(np.meshgrid(*[x for x, _ in rules], indexing='ij')
+                          ).reshape(len(active), len(weights))
+        weights /= np.sqrt(2 * np.pi)**np.sum(normal)
+    else:
+        rng = np.random.default_rng(seed)
+        values = np.array([rng.standard_normal(num_samples) if is_normal else
+                           rng.standard_exponential(num_samples)
+                           for is_normal in normal]).reshape(len(active),
+                                                             num_samples)
+        weights = np.full(num_samples, 1 / num_samples)
+
+    variables = np.zeros((4, len(weights)))
+    variables[active] = values
+    probe_scales, couple_scales = [
+        np.sqrt(np.maximum(1 + rin * x, 0)) *
+        np.exp(-2 * pointing**2 * u / laserWaist**2)
+        for rin, pointing, x, u in ((probe_rin, probe_pointing, *variables[:2]),
+                                    (couple_rin, couple_pointing,
+                                     *variables[2:]))]
+    return probe_scales, couple_scales, weights
+
+
+def _weighted_statistics(populations, weights):
+    mean = np.tensordot(weights, populations, axes=1)
+    variance = np.tensordot(weights, (populations - mean)**2, axes=1)
+    return {"populations": mean, "variance": variance, "weights": weights,
+            "node_populations": populations}
+
+
+def doppler_average(time_array, Omega12, Omega23, Delta, delta, temperature,
+                    gamma2=0.0, gamma3=0.0, num_nodes: int = 8, **geometry):
+    """
+    Average the dynamics of `evolve_batch` over the thermal velocity
+    distribution with the Gauss-Hermite nodes of `get_doppler_nodes`, which
+    are propagated as one batch.
+
+    Parameters
+    ----------
+    time_array, Omega12, Omega23, Delta, delta, gamma2, gamma3
+        See `evolve_batch`, for the atoms at rest.
+    temperature : float
+        Temperature of the atoms in K.
+    num_nodes : int, optional
+        Number of quadrature nodes per dimension, defaults to 8.
+    **geometry
+        Beam directions, wavelengths and atomic mass of
+        `get_doppler_nodes`.
+
+    Returns
+    -------
+    dict
+        The mean 'populations' of the ground, 7P, Rydberg and loss states of
+        shape (len(time_array), 4), their 'variance' over the velocity
+        distribution, the quadrature 'weights' and the 'node_populations' of
+        shape (num_nodes, len(time_array), 4).
+    """
+    Delta_shifts, delta_shifts, weights = get_doppler_nodes(
+        temperature, num_nodes, **geometry)
+    populations = evolve_batch(
+        time_array, Omega12, Omega23,
+        np.asarray(Delta) + Delta_shifts[:, np.newaxis],
+        np.asarray(delta) + delta_shifts[:, np.newaxis], gamma2, gamma3)
+    return _weighted_statistics(populations, weights)
+
+
+def intensity_noise_average(time_array, Omega12, Omega23, Delta, delta,
+                            gamma2=0.0, gamma3=0.0, num_nodes: int = 5,
+                            num_samples: int = None, seed=None, **noise):
+    """
+    Average the dynamics of `evolve_batch` over laser intensity noise and
+    pointing jitter, with the nodes (or random draws) of
+    `get_intensity_noise_nodes` propagated as one batch.
+
+    Parameters
+    ----------
+    time_array, Omega12, Omega23, Delta, delta, gamma2, gamma3
+        See `evolve_batch`, at the nominal powers.
+    num_nodes : int, optional
+        Number of quadrature nodes per fluctuating quantity, defaults to 5.
+    num_samples : int, optional
+        Number of random draws replacing the quadrature. Defaults to None,
+        for quadrature nodes.
+    seed : int, optional
+        Seed of the random draws.
+    **noise
+        Intensity noise, pointing jitter and waist of
+        `get_intensity_noise_nodes`.
+
+    Returns
+    -------
+    dict
+        The mean 'populations' of the ground, 7P, Rydberg and loss states of
+        shape (len(time_array), 4), their 'variance' over the noise, the
+        'weights' and the 'node_populations' of every node.
+    """
+    probe_scales, couple_scales, weights = get_intensity_noise_nodes(
+        num_nodes=num_nodes, num_samples=num_samples, seed=seed, **noise)
+    populations = evolve_batch(
+        time_array, probe_scales[:, np.newaxis] * np.asarray(Omega12),
+        couple_scales[:, np.newaxis] * np.asarray(Omega23), Delta, delta,
+        gamma2, gamma3)
+    return _weighted_statistics(populations, weights)
@@ -0,0 +1,268 @@
+import numpy as np
+from scipy.linalg import logm
+from scipy.optimize import minimize
+
+
+class FloquetOptimizer:
+    def __init__(self, engine, params: list[float or str], target,
+                 couplings: list[str] = None, optimize_durations: bool = True,
+                 ignore_global_phase: bool = False, sector: dict = None):
+        """
+        Initialize a gradient-based optimizer of Floquet sequences.
+
+        The sequence applies the Hamiltonians of `engine` at the step labels
+        `params` for durations dt_list (dt=0 marks a delta pulse of unit
+        area, which does not count towards the period, as in
+        `DiagonEngine.get_quspin_floquet_hamiltonian`). Optionally, the
+        contribution of every coupling (operator string) to every step is
+        multiplied by a scale factor. The loss is the squared distance
+        ||U_F - exp(-i H_target T)||_F^2 between the Floquet unitary and the
+        evolution under the target over one period T, whose analytic
+        gradients with respect to the durations and scales are computed from
+        the eigendecompositions of the step Hamiltonians (Daleckii-Krein
+        formula).
+
+        Parameters
+        ----------
+        engine : DiagonEngine
+            Engine providing the (cached) step Hamiltonians, e.g. a
+            DiagonEngine or SparseEngine.
+        params : list[float or str]
+            Step labels of the sequence.
+        target : float, str, quspin hamiltonian, sparse matrix or np.ndarray
+            Target Hamiltonian, or the label of the target Hamiltonian of
+            `engine`.
+        couplings : list[str], optional
+            Operator strings whose strengths are optimized with a scale
+            factor per step. Hermitian conjugate strings ('+-' and '-+') share
+            their scale. Defaults to None, for no coupling scales.
+        optimize_durations : bool, optional
+            Optimize the durations of the finite steps, defaults to True.
+        ignore_global_phase : bool, optional
+            Minimize 2 N - 2 |Tr(U_target^dagger U_F)| instead, which is
+            insensitive to a global phase (i.e. an energy offset), defaults
+            to False.
+        sector : dict, optional
+            Symmetry sector of `engine`. Defaults to the full space.
+        """
+        self.engine = engine
+        self.params = list(params)
+        self.optimize_durations = optimize_durations
+        self.ignore_global_phase = ignore_global_phase
+        self.sector = sector
+        self.num_evaluations = 0
+
+        if isinstance(target, (str, int, float)):
+            target = engine.get_sparse_hamiltonian(target, sector)
+        target = engine._as_matrix(target)
+        target = target.toarray() if hasattr(target, "toarray") else target
+        self.target_energies, self.target_vectors = np.linalg.eigh(target)
+        self.target = target
+
+        # group Hermitian conjugate operator strings
+        conjugate = str.maketrans('+-', '-+')
+        self.couplings = list(dict.fromkeys(
+            min(op, op.translate(conjugate)) for op in couplings or []))
+        self._coupling_hamiltonians = []
+        for t in self.params:
+            parts = {op: H.toarray() for op, H in
+                     engine.get_operator_hamiltonians(t, sector).items()}
+            grouped = {coupling: 0 for coupling in self.couplings}
+            rest = 0
+            for op, H in parts.items():
+                key = min(op, op.translate(conjugate))
+                if key in grouped:
+                    grouped[key] = grouped[key] + H
+                else:
+                    rest = rest + H
+            self._coupling_hamiltonians.append((rest, grouped))
+
+    @property
+    def num_states(self):
+        return len(self.target_energies)
+
+    def get_step_hamiltonians(self, scales=None):
+        """
+        Assemble the (dense) Hamiltonian of every step for the given
+        coupling scales, an array of shape (num_steps, num_couplings).
+        """
+        scales = self._default_scales(scales)
+        hamiltonians = []
+        for (rest, grouped), step_scales in zip(self._coupling_hamiltonians,
+                                                scales):
+            H = np.zeros((self.num_states, self.num_states),
+                         dtype=np.complex128) + rest
+            for coupling, scale in zip(self.couplings, step_scales):
+                H = H + scale * grouped[coupling]
+            hamiltonians.append(H)
+        return hamiltonians
+
+    def _default_scales(self, scales):
+        if scales is None:
+            return np.ones((len(self.params), len(self.couplings)))
+        return np.reshape(scales, (len(self.params), len(self.couplings)))
+
+    def loss_and_gradient(self, dt_list: list[float], scales=None):
+        """
+        Compute the loss and its gradients with respect to the durations and
+        the coupling scales.
+
+        Parameters
+        ----------
+        dt_list : list[float]
+            Durations of the steps; dt=0 marks a delta pulse.
+        scales : np.ndarray, optional
+            Coupling scales of shape (num_steps, num_couplings), defaults to
+            ones.
+
+        Returns
+        -------
+        loss : float
+            The loss.
+        grad_dt : np.ndarray
+            Gradient with respect to the durations (zero for delta pulses).
+        grad_scales : np.ndarray
+            Gradient with respect to the scales, shape of `scales`.
+        """
+        if len(dt_list) != len(self.params):
+            raise ValueError("paramList and dtList must have the same length")
+        self.num_evaluations += 1
+        scales = self._default_scales(scales)
+        finite = np.asarray(dt_list) > 0
+        taus = np.where(finite, dt_list, 1.0)
+        period = np.sum(np.asarray(dt_list)[finite])
+
+        steps = []
+        for H, tau in zip(self.get_step_hamiltonians(scales), taus):
+            energies, vectors = np.linalg.eigh(H)
+            phases = np.exp(-1j * tau * energies)
+            steps.append((energies, vectors, phases,
+                          (vectors * phases) @ vectors.conj().T))
+
+        # partial products right[k] = U_{k-1} ... U_1 and
+        # left[k] = U_n ... U_{k+1}
+        identity = np.identity(self.num_states, dtype=np.complex128)
+        right = [identity]
+        for *_, unitary in steps[:-1]:
+            right.append(unitary @ right[-1])
+        left = [identity]
+        for *_, unitary in steps[:0:-1]:
+            left.append(left[-1] @ unitary)
+        left = left[::-1]
+        floquet_unitary = steps[-1][3] @ right[-1]
+
+        target_unitary = (self.target_vectors *
+                          np.exp(-1j * period * self.target_energies)) @ \
+            self.target_vectors.conj().T
+        overlap = np.vdot(target_unitary, floquet_unitary)
+        if self.ignore_global_phase:
+            weight = np.conj(overlap) / max(np.abs(overlap), 1e-300)
+        else:
+            weight = 1.0
+        loss = 2 * self.num_states - 2 * np.real(weight * overlap)
+
+        # derivative of the target unitary with respect to the period
+        d_overlap_period = 1j * np.vdot(target_unitary,
+                                        self.target @ floquet_unitary)
+
+        grad_dt = np.zeros(len(steps))
+        grad_scales = np.zeros_like(scales)
+        for k, (energies, vectors, phases, _) in enumerate(steps):
+            tau = taus[k]
+            # Tr(W^dagger left dU right) = sum_ij B_ij (V^dagger G V)_ij
+            X = vectors.conj().T @ (right[k] @ target_unitary.conj().T @
+                                    left[k]) @ vectors
+            B = X.T * self._divided_differences(tau * energies, phases)
+            if finite[k]:
+                d_overlap = np.sum(np.diag(B) * energies) + d_overlap_period
+                grad_dt[k] = -2 * np.real(weight * d_overlap)
+            rest, grouped = self._coupling_hamiltonians[k]
+            for j, coupling in enumerate(self.couplings):
+                G = vectors.conj().T @ grouped[coupling] @ vectors
+                grad_scales[k, j] = -2 * np.real(weight * tau *
+                                                 np.sum(B * G))
+        return loss, grad_dt, grad_scales
+
+    @staticmethod
+    def _divided_differences(eigenvalues, phases):
+        """
+        First divided differences of exp(-i x) at the eigenvalues, with the
+        derivative -i exp(-i x) on the diagonal and for degenerate pairs.
+        """
+        difference = eigenvalues[:, None] - eigenvalues[None, :]
+        degenerate = np.abs(difference) < 1e-10
+        gamma = (phases[:, None] - phases[None, :]) / np.where(
+            degenerate, 1, difference)
+        derivative = -0.5j * (phases[:, None] + phases[None, :])
+        return np.where(degenerate, derivative, gamma)
+
+    def optimize(self, dt_list: list[float], scales=None,
+                 dt_bounds: tuple = (0, None),
+                 scale_bounds: tuple = (None, None), maxiter: int = 200,
+                 tol: float = 1e-12):
+        """
+        Minimize the loss with L-BFGS-B, starting from the given sequence.
+
+        Parameters
+        ----------
+        dt_list : list[float]
+            Initial durations; delta pulses (dt=0) stay delta pulses.
+        scales : np.ndarray, optional
+            Initial coupling scales, defaults to ones.
+        dt_bounds : tuple, optional
+            (min, max) bounds of the finite durations, defaults to (0, None).
+        scale_bounds : tuple, optional
+            (min, max) bounds of the coupling scales, defaults to no bounds.
+        maxiter : int, optional
+            Maximum number of iterations, defaults to 200.
+        tol : float, optional
+            Tolerance of the optimizer, defaults to 1e-12.
+
+        Returns
+        -------
+        dict
+            'dt_list' and 'scales' of the optimized sequence, its 'loss', the
+            number of loss evaluations 'num_evaluations' and the scipy
+            'result'.
+        """
+        dt_list = np.asarray(dt_list, dtype=float)
+        finite = dt_list > 0 if self.optimize_durations else \
+            np.zeros(len(dt_list), dtype=bool)
+        scales = self._default_scales(scales).astype(float)
+        num_dt = int(np.sum(finite))
+
+        def unpack(x):
+            durations = dt_list.copy()
+            durations[finite] = x[:num_dt]
+            return durations, x[num_dt:].reshape(scales.shape)
+
+        def fun(x):
+            loss, grad_dt, grad_scales = self.loss_and_gradient(*unpack(x))
+            return loss, np.concatenate([grad_dt[finite],
+                                         grad_scales.ravel()])
+
+        x0 = np.concatenate([dt_list[finite], scales.ravel()])
+        bounds = [dt_bounds] * num_dt + [scale_bounds] * scales.size
+        start = self.num_evaluations
+        result = minimize(fun, x0, jac=True, method="L-BFGS-B",
+                          bounds=bounds, tol=tol,
+                          options={"maxiter": maxiter})
+        durations, optimized_scales = unpack(result.x)
+        return {"dt_list": durations, "scales": optimized_scales,
+                "loss": result.fun,
+                "num_evaluations": self.num_evaluations - start,
+                "result": result}
+
+    def get_floquet_hamiltonian(self, dt_list: list[float], scales=None):
+        """
+        Compute the Floquet Hamiltonian i / T logm(U_F) of a sequence, e.g.
+        the result of `optimize`.
+        """
+        finite = np.asarray(dt_list) > 0
+        taus = np.where(finite, dt_list, 1.0)
+        unitary = np.identity(self.num_states, dtype=np.complex128)
+        for H, tau in zip(self.get_step_hamiltonians(scales), taus):
+            energies, vectors = np.linalg.eigh(H)
+            unitary = (vectors * np.exp(-1j * tau * energies)) @ (
+                vectors.conj().T @ unitary)
+        return 1j / np.sum(np.asarray(dt_list)[finite]) * logm(unitary)
@@ -0,0 +1,422 @@
+import numpy as np
+import scipy.constants as const
+import scipy.sparse as sp
+from scipy.sparse.linalg import expm_multiply
+import models.rydberg_calcs as ryd
+import models.pulse_calcs as pulses
+
+
+class HyperfineRydberg:
+    def __init__(self, n1=6, l1=0, j1=0.5, f1=4, mf1=4, q1=1, n2=7, l2=1,
+                 j2=1.5, f2=5, q2=1, n3=47, l3=2, j3=2.5, ground_f=None,
+                 excited_f=None, polarization1=None, polarization2=None,
+                 magnetic_field=0.0, transition=None):
+        """
+        Initialize a model of the ground-7P-Rydberg ladder of `UnitaryRydberg`
+        that resolves all magnetic sublevels of the three manifolds.
+
+        The ground and 7P manifolds are represented by their hyperfine states
+        |F, mF>, the Rydberg manifold, whose hyperfine splitting is
+        negligible, by the uncoupled states |mJ, mI>. The couplings are the
+        dipole matrix elements of ARC for the given polarizations, relative to
+        the reference transitions of `RydbergTransition`, so Omega12 and
+        Omega23 keep their meaning (and their lookup from the laser powers).
+        For pure polarizations q1 and q2 starting in the stretched state, the
+        model reduces to the three-level ladder; otherwise population leaks
+        to other sublevels. Hyperfine splittings of the 7P manifold (relative
+        to F' = f2) and of the ground manifold (relative to F = f1), and a
+        linear Zeeman shift along the quantization axis z, are included.
+
+        The Hamiltonian is built from cached sparse operators, block
+        structured by manifold, so every time step only sums a few sparse
+        matrices.
+
+        Parameters
+        ----------
+        n1, l1, j1 : int, int, float, optional
+            Quantum numbers of the ground state, default to 6S1/2.
+        f1, mf1 : int, optional
+            Hyperfine state of the reference transition, defaults to the
+            stretched state |F=4, mF=4>.
+        q1 : int, optional
+            Polarization of the probe laser of the reference transition,
+            defaults to 1 (sigma+).
+        n2, l2, j2 : int, int, float, optional
+            Quantum numbers of the intermediate state, default to 7P3/2.
+        f2 : int, optional
+            Hyperfine level of the reference transition, defaults to 5.
+        q2 : int, optional
+            Polarization of the coupling laser of the reference transition,
+            defaults to 1 (sigma+).
+        n3, l3, j3 : int, int, float, optional
+            Quantum numbers of the Rydberg state, default to 47D5/2.
+        ground_f : tuple, optional
+            Hyperfine levels of the ground manifold, defaults to (f1,).
+        excited_f : tuple, optional
+            Hyperfine levels of the 7P manifold, defaults to all levels.
+        polarization1, polarization2 : array_like, optional
+            Amplitudes of the (sigma-, pi, sigma+) components of the probe
+            and coupling lasers, normalized internally. Default to the pure
+            polarizations q1 and q2.
+        magnetic_field : float, optional
+            Magnetic field along z in T. Defaults to 0.
+        transition : RydbergTransition, optional
+            Transition providing the Rabi frequencies from the laser powers
+            for the pulse methods. Defaults to None, in which case a
+            `RydbergTransition` with the same quantum numbers is created when
+            first needed.
+
+        Attributes
+        ----------
+        labels : list[tuple]
+            Label of every basis state: ('g', F, mF) and ('e', F, mF) for the
+            ground and 7P states, ('r', mJ, mI) for the Rydberg states.
+        reference_states : np.ndarray
+            Basis indices of the ground, 7P and Rydberg states of the
+            reference ladder.
+        """
+        from arc import Cesium
+        self.atom = Cesium()
+        self.nuclear_spin = self.atom.I
+        self.ground = (n1, l1, j1)
+        self.excited = (n2, l2, j2)
+        self.rydberg = (n3, l3, j3)
+        self.f1, self.mf1, self.q1 = f1, mf1, q1
+        self.f2, self.q2 = f2, q2
+        self.magnetic_field = magnetic_field
+        self._transition = transition
+        I = self.nuclear_spin
+        self.ground_f = tuple(ground_f or (f1,))
+        self.excited_f = tuple(excited_f or
+                               np.arange(abs(j2 - I), j2 + I + 1))
+        self.polarization1 = self._polarization(polarization1, q1)
+        self.polarization2 = self._polarization(polarization2, q2)
+
+        # basis, block structured by manifold
+        self.labels = [(manifold, float(a), float(b)) for manifold, a, b in (
+            [('g', f, mf) for f in self.ground_f
+             for mf in np.arange(-f, f + 1)]
+            + [('e', f, mf) for f in self.excited_f
+               for mf in np.arange(-f, f + 1)]
+            + [('r', mj, mi) for mj in np.arange(-j3, j3 + 1)
+               for mi in np.arange(-I, I + 1)])]
+        self.manifolds = np.array([label[0] for label in self.labels])
+        self._indices = {label: i for i, label in enumerate(self.labels)}
+        mf2, mf3 = mf1 + q1, mf1 + q1 + q2
+        mj3 = self.reference_mj(j3, mf3)
+        self.reference_states = np.array([
+            self.index('g', f1, mf1), self.index('e', f2, mf2),
+            self.index('r', mj3, mf3 - mj3)])
+
+        self._operators = None
+
+    @property
+    def transition(self):
+        if self._transition is None:
+            (n1, l1, j1), (n2, l2, j2), (n3, l3, j3) = (
+                self.ground, self.excited, self.rydberg)
+            mj1 = self.reference_mj(j1, self.mf1)
+            self._transition = ryd.RydbergTransition(
+                n1=n1, l1=l1, j1=j1, mj1=mj1, f1=self.f1, q1=self.q1, n2=n2,
+                l2=l2, j2=j2, mj2=mj1 + self.q1, f2=self.f2, q2=self.q2,
+                n3=n3, l3=l3, j3=j3, mj3=mj1 + self.q1 + self.q2)
+        return self._transition
+
+    @property
+    def num_states(self):
+        return len(self.labels)
+
+    @staticmethod
+    def _polarization(polarization, q):
+        if polarization is None:
+            polarization = np.zeros(3)
+            polarization[q + 1] = 1
+        polarization = np.asarray(polarization, dtype=np.complex128)
+        return polarization / np.linalg.norm(polarization)
+
+    def reference_mj(self, j, mf):
+        """
+        mJ of the stretched component of a hyperfine state with projection
+        mf, the fine-structure state of the reference transitions of ARC.
+        """
+        return np.clip(mf - self.nuclear_spin, -j, j)
+
+    def index(self, manifold: str, a, b):
+        """
+        Basis index of the state ('g', F, mF), ('e', F, mF) or ('r', mJ, mI).
+        """
+        try:
+            return self._indices[(manifold, float(a), float(b))]
+        except KeyError:
+            raise ValueError(f"State {(manifold, a, b)} is not in the "
+                             f"basis") from None
+
+    def _uncoupled_transform(self, manifold: str, j):
+        """
+        Matrix of the Clebsch-Gordan coefficients <mJ, mI | F, mF> from the
+        basis states of `manifold` to its uncoupled states |mJ, mI>.
+        """
+        from arc.wigner import CG
+
+        I = self.nuclear_spin
+        uncoupled = [(mj, mi) for mj in np.arange(-j, j + 1)
+                     for mi in np.arange(-I, I + 1)]
+        states = [label for label in self.labels if label[0] == manifold]
+        transform = np.zeros((len(uncoupled), len(states)))
+        for k, (_, f, mf) in enumerate(states):
+            for u, (mj, mi) in enumerate(uncoupled):
+                if np.isclose(mj + mi, mf):
+                    transform[u, k] = CG(j, mj, I, mi, f, mf)
+        return transform
+
+    def _fine_structure_dipole(self, lower, upper, polarization):
+        """
+        Dipole operator sum_q eps_q d_q from the uncoupled states of the
+        `lower` to those of the `upper` fine-structure level, in a0 e.
+        """
+        (n1, l1, j1), (n2, l2, j2) = lower, upper
+        I = self.nuclear_spin
+        num_spin = int(round(2 * I + 1))
+        dipole = np.zeros((int(round(2 * j2 + 1)), int(round(2 * j1 + 1))),
+                          dtype=np.complex128)
+        for a, mj1 in enumerate(np.arange(-j1, j1 + 1)):
+            for q, amplitude in zip((-1, 0, 1), polarization):
+                if amplitude != 0 and abs(mj1 + q) <= j2:
+                    b = int(round(mj1 + q + j2))
+                    dipole[b, a] += amplitude * \
+                        self.atom.getDipoleMatrixElement(
+                            n1, l1, j1, mj1, n2, l2, j2, mj1 + q, q)
+        return np.kron(dipole, np.identity(num_spin))
+
+    def _coupling_operator(self, lower: str, upper: str):
+        """
+        Sparse coupling D + D^dagger between two manifolds, relative to the
+        dipole matrix element of the reference transition.
+        """
+        levels = {'g': self.ground, 'e': self.excited, 'r': self.rydberg}
+        polarization, q, mf = ((self.polarization1, self.q1, self.mf1)
+                               if lower == 'g' else
+                               (self.polarization2, self.q2,
+                                self.mf1 + self.q1))
+        (n1, l1, j1), (n2, l2, j2) = levels[lower], levels[upper]
+        mj = self.reference_mj(j1, mf)
+        reference = self.atom.getDipoleMatrixElement(n1, l1, j1, mj, n2, l2,
+                                                     j2, mj + q, q)
+
+        dipole = self._fine_structure_dipole(levels[lower], levels[upper],
+                                             polarization)
+        # the Rydberg manifold is represented in the uncoupled basis
+        if lower != 'r':
+            dipole = dipole @ self._uncoupled_transform(lower, j1)
+        if upper != 'r':
+            dipole = self._uncoupled_transform(upper, j2).T @ dipole
+        rows, cols = np.meshgrid(np.nonzero(self.manifolds == upper)[0],
+                                 np.nonzero(self.manifolds == lower)[0],
+                                 indexing='ij')
+        coupling = sp.csr_matrix(
+            (np.ravel(dipole / reference).astype(np.complex128),
+             (rows.ravel(), cols.ravel())),
+            shape=(self.num_states, self.num_states))
+        coupling.eliminate_zeros()
+        return (coupling + coupling.conj().T).tocsr()
+
+    def get_hyperfine_shifts(self):
+        """
+        Hyperfine energies of the basis states in rad/s, relative to the
+        levels F = f1 and F' = f2 of the reference transition.
+        """
+        shifts = np.zeros(self.num_states)
+        for manifold, (n, l, j), f_ref in (('g', self.ground, self.f1),
+                                           ('e', self.excited, self.f2)):
+            A, B = self.atom.getHFSCoefficients(n, l, j)
+            reference = self.atom.getHFSEnergyShift(j, f_ref, A, B)
+            for i, label in enumerate(self.labels):
+                if label[0] == manifold:
+                    shifts[i] = 2 * np.pi * (
+                        self.atom.getHFSEnergyShift(j, label[1], A, B) -
+                        reference)
+        return shifts
+
+    def get_zeeman_shifts(self):
+        """
+        Linear Zeeman shifts of the basis states in rad/s, with the Lande
+        factors gF of the hyperfine states and gJ of the Rydberg states
+        (neglecting the nuclear magnetic moment).
+        """
+        bohr_magneton = const.physical_constants['Bohr magneton'][0]
+        shifts = np.zeros(self.num_states)
+        levels = {'g': self.ground, 'e': self.excited}
+        for i, (manifold, a, b) in enumerate(self.labels):
+            if manifold == 'r':
+                _, l, j = self.rydberg
+                energy = self.atom.getZeemanEnergyShift(l, j, a,
+                                                        self.magnetic_field)
+            else:
+                _, l, j = levels[manifold]
+                energy = (self.atom.getLandegf(l, j, a) * b * bohr_magneton *
+                          self.magnetic_field)
+            shifts[i] = energy / const.hbar
+        return shifts
+
+    def get_operators(self):
+        """
+        Get the (cached) time-independent parts of the Hamiltonian.
+
+        Returns
+        -------
+        dict
+            Sparse matrices 'ge' and 'er' (the dipole couplings relative to
+            the reference transitions, plus their Hermitian conjugates), 'e'
+            and 'r' (projectors onto the 7P and Rydberg manifolds), and the
+            diagonal 'hfs' and 'zeeman' shifts.
+        """
+        if self._operators is None:
+            self._operators = {
+                'ge': self._coupling_operator('g', 'e'),
+                'er': self._coupling_operator('e', 'r'),
+                'e': sp.diags((self.manifolds == 'e').astype(float),
+                              format='csr'),
+                'r': sp.diags((self.manifolds == 'r').astype(float),
+                              format='csr'),
+                'hfs': sp.diags(self.get_hyperfine_shifts(), format='csr'),
+                'zeeman': sp.diags(self.get_zeeman_shifts(), format='csr')}
+        return self._operators
+
+    def get_hamiltonian(self, Omega12, Omega23, Delta, delta):
+        """
+        Construct the Hamiltonian for given Rabi frequencies and detunings of
+        the reference transitions,
+
+        H = Omega12 / 2 (D1 + h.c.) + Omega23 / 2 (D2 + h.c.)
+            + Delta P_e + delta P_r + H_hfs + H_zeeman,
+
+        which is `UnitaryRydberg.get_hamiltonian` on the reference ladder.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The Hamiltonian in rad/s.
+        """
+        operators = self.get_operators()
+        return (Omega12 / 2 * operators['ge'] + Omega23 / 2 * operators['er']
+                + Delta * operators['e'] + delta * operators['r'] +
+                operators['hfs'] + operators['zeeman'])
+
+    def get_level_populations(self, psi):
+        """
+        Compute the populations of the ground, 7P and Rydberg manifolds and
+        the leakage, i.e. the population outside the reference states.
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            State of shape (num_states,), or states of shape (num_states, n).
+
+        Returns
+        -------
+        np.ndarray
+            Populations of shape (4,), or (n, 4).
+        """
+        populations = np.abs(psi)**2
+        levels = [populations[self.manifolds == manifold].sum(axis=0)
+                  for manifold in ('g', 'e', 'r')]
+        leakage = (populations.sum(axis=0) -
+                   populations[self.reference_states].sum(axis=0))
+        return np.moveaxis(np.array(levels + [leakage]), 0, -1)
+
+    def get_state(self, manifold: str = 'g', a=None, b=None):
+        """
+        Basis state ('g', F, mF), ('e', F, mF) or ('r', mJ, mI), defaulting
+        to the ground state of the reference ladder.
+        """
+        psi = np.zeros(self.num_states, dtype=np.complex128)
+        if a is None:
+            psi[self.reference_states['ger'.index(manifold)]] = 1
+        else:
+            psi[self.index(manifold, a, b)] = 1
+        return psi
+
+    def evolve(self, psi0, time_array, Omega12, Omega23, Delta, delta):
+        """
+        Propagate states through piecewise-constant Hamiltonians, sampled on
+        `time_array` as in `UnitaryRydberg.evolve_state`, with the action of
+        the matrix exponential on the sparse Hamiltonian.
+
+        Parameters
+        ----------
+        psi0 : np.ndarray
+            Initial state of shape (num_states,), or states of shape
+            (num_states, n) which are propagated together.
+        time_array : np.ndarray
+            Time points in seconds.
+        Omega12, Omega23 : float or np.ndarray
+            Probe and coupling Rabi angular frequencies of the reference
+            transitions, constant or at every time point.
+        Delta, delta : float or np.ndarray
+            Detunings of the 7P and Rydberg states, constant or at every time
+            point.
+
+        Returns
+        -------
+        psi : np.ndarray
+            The final states.
+        populations : np.ndarray
+            Populations of every basis state at every time point, of shape
+            (len(time_array), num_states) or (len(time_array), num_states,
+            n); see `get_level_populations` for the manifolds and leakage.
+        """
+        time_array = np.asarray(time_array, dtype=float)
+        parameters = np.broadcast_arrays(*[np.broadcast_to(
+            np.asarray(p, dtype=float), time_array.shape) for p in
+            (Omega12, Omega23, Delta, delta)])
+        psi = np.asarray(psi0, dtype=np.complex128)
+        populations = [np.abs(psi)**2]
+        for i, deltaT in enumerate(np.diff(time_array)):
+            H = self.get_hamiltonian(*[p[i] for p in parameters])
+            psi = expm_multiply(-1j * deltaT * H, psi)
+            populations.append(np.abs(psi)**2)
+        return psi, np.array(populations)
+
+    def probe_pulse_unitary(self, duration, delay, hold,
+                            probe_peak_power=10e-3, couple_power=1,
+                            Delta=None, delta=0.0, psi0=None):
+        """
+        Simulate a Blackman probe pulse and a constant coupling laser, as
+        `UnitaryRydberg.probe_pulse_unitary` for the three-level ladder.
+
+        Parameters
+        ----------
+        duration, delay, hold : float
+            Duration, delay and flat top of the probe pulse.
+        probe_peak_power : float, optional
+            The peak power of the probe pulse, default is 10e-3 W.
+        couple_power : float, optional
+            The power of the coupling laser, default is 1 W.
+        Delta : float, optional
+            The detuning of the 7P state. If None, the optimal detuning is
+            calculated.
+        delta : float, optional
+            The detuning of the Rydberg state. Defaults to 0.
+        psi0 : np.ndarray, optional
+            Initial state(s), defaults to the reference ground state.
+
+        Returns
+        -------
+        psi : np.ndarray
+            The final state(s).
+        populations : np.ndarray
+            Populations of the basis states over time, see `evolve`.
+        probe_power : np.ndarray
+            Probe pulse power over time.
+        time_array : np.ndarray
+            Time array used for the simulation.
+        """
+        time_array, probe_power, Omega12, Omega23, Delta = \
+            pulses.get_pulse_parameters(self.transition, duration, delay,
+                                        hold, probe_peak_power, couple_power,
+                                        Delta)
+        if psi0 is None:
+            psi0 = self.get_state('g')
+        psi, populations = self.evolve(psi0, time_array, Omega12, Omega23,
+                                       Delta, delta)
+        return psi, populations, probe_power, time_array
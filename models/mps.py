@@ -0,0 +1,573 @@
+import numpy as np
+from scipy.linalg import expm
+from scipy.sparse.linalg import LinearOperator, eigsh
+
+# Pauli operators in the local basis (up, down), matching QuSpin's spin-1/2
+# operator strings with pauli=1 (where '+' and '-' are sigma^x +- i sigma^y).
+# With this ordering and site 0 as the most significant index,
+# `MPS.to_vector` and `mpo_to_matrix` use the ordering of QuSpin's (full)
+# spin_basis_1d.
+PAULI = {'I': np.identity(2, dtype=np.complex128),
+         'x': np.array([[0, 1], [1, 0]], dtype=np.complex128),
+         'y': np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+         'z': np.array([[1, 0], [0, -1]], dtype=np.complex128),
+         '+': np.array([[0, 2], [0, 0]], dtype=np.complex128),
+         '-': np.array([[0, 0], [2, 0]], dtype=np.complex128)}
+
+SWAP = np.identity(4, dtype=np.complex128)[[0, 2, 1, 3]].reshape(2, 2, 2, 2)
+
+
+def local_operator(op: str):
+    """
+    Get the matrix of a single-site operator string, e.g. 'x' or 'xy' (the
+    product of the operators, applied right to left).
+    """
+    matrix = PAULI['I']
+    for char in op:
+        if char not in PAULI:
+            raise ValueError(f"Invalid spin-1/2 operator: {char}")
+        matrix = matrix @ PAULI[char]
+    return matrix
+
+
+def local_terms(graph, t):
+    """
+    Collect the non-zero terms of a LatticeGraph at time t.
+
+    Parameters
+    ----------
+    graph : LatticeGraph
+        The graph containing the interaction terms.
+    t : float or str
+        Time or step label at which to evaluate the interactions.
+
+    Returns
+    -------
+    terms : list[tuple]
+        List of (coefficient, operator, sites) with one or two (increasing)
+        sites. Two-site operators acting on the same site are merged into a
+        one-site operator.
+    """
+    terms = []
+    coefficients = graph.coefficients(t)
+    for op, (sites, _) in graph.compile().items():
+        for c, site in zip(np.reshape(coefficients[op], -1).tolist(),
+                           sites.tolist()):
+            if c == 0:
+                continue
+            op_lower = op.lower().replace('i', 'I')
+            if len(site) == 1 or len(set(site)) == 1:
+                terms.append((c, op_lower, (site[0],)))
+            elif len(site) == 2:
+                if site[0] > site[1]:
+                    op_lower, site = op_lower[::-1], site[::-1]
+                terms.append((c, op_lower, tuple(site)))
+            else:
+                raise ValueError(f"Only one- and two-site terms are supported "
+                                 f"by the MPS backend: {op}")
+    return terms
+
+
+def build_mpo(terms, num_sites: int):
+    """
+    Build the matrix product operator of a sum of one- and two-site terms.
+
+    The MPO is the finite state machine of the Hamiltonian: besides the
+    'start' and 'final' channels, every (operator, site) that begins a
+    two-site term opens a channel which is carried by identities up to its
+    last partner site. Nearest- and next-nearest-neighbor terms thus give a
+    bond dimension of a few times the number of operator types, independent
+    of the chain length.
+
+    Parameters
+    ----------
+    terms : list[tuple]
+        Terms as returned by `local_terms`.
+    num_sites : int
+        Number of sites of the chain.
+
+    Returns
+    -------
+    mpo : list[np.ndarray]
+        One tensor per site, with indices (left, right, bra, ket).
+    """
+    one_site = {}
+    starts = {}
+    for c, op, sites in terms:
+        if len(sites) == 1:
+            one_site[sites[0]] = (one_site.get(sites[0], 0) +
+                                  c * local_operator(op))
+        else:
+            starts.setdefault((op[0], sites[0]), []).append(
+                (c, op[1], sites[1]))
+    last = {channel: max(j for _, _, j in partners)
+            for channel, partners in starts.items()}
+
+    # channels on the bond left of site k
+    bonds = [{'start': 0}]
+    for k in range(1, num_sites):
+        channels = [channel for channel in starts
+                    if channel[1] < k <= last[channel]]
+        bond = {'start': 0, 'final': len(channels) + 1}
+        bond.update({channel: n + 1 for n, channel in enumerate(channels)})
+        bonds.append(bond)
+    bonds.append({'final': 0})
+
+    mpo = []
+    for k in range(num_sites):
+        W = np.zeros((len(bonds[k]), len(bonds[k + 1]), 2, 2),
+                     dtype=np.complex128)
+
+        def put(left, right, op):
+            if left in bonds[k] and right in bonds[k + 1]:
+                W[bonds[k][left], bonds[k + 1][right]] += op
+
+        put('start', 'start', PAULI['I'])
+        put('final', 'final', PAULI['I'])
+        if k in one_site:
+            put('start', 'final', one_site[k])
+        for channel, partners in starts.items():
+            op, i = channel
+            if i == k:
+                put('start', channel, PAULI[op])
+            elif i < k <= last[channel]:
+                ending = [c * PAULI[op_j] for c, op_j, j in partners
+                          if j == k]
+                if ending:
+                    put(channel, 'final', sum(ending))
+                if k < last[channel]:
+                    put(channel, channel, PAULI['I'])
+        mpo.append(W)
+    return mpo
+
+
+def mpo_to_matrix(mpo):
+    """
+    Contract an MPO into a dense matrix (for small chains).
+    """
+    matrix = mpo[0][0]
+    for W in mpo[1:]:
+        # (right, s, t) x (right, right', s', t')
+        matrix = np.einsum('ast,abuv->bsutv', matrix, W)
+        dim = matrix.shape[1] * matrix.shape[2]
+        matrix = matrix.reshape(matrix.shape[0], dim, dim)
+    return matrix[0]
+
+
+def mpo_overlap(mpo1, mpo2):
+    """
+    Compute the trace Tr(A^dagger B) of two MPOs.
+    """
+    env = np.ones((1, 1), dtype=np.complex128)
+    for W1, W2 in zip(mpo1, mpo2):
+        env = np.einsum('ab,acst,bdst->cd', env, W1.conj(), W2)
+    return env[0, 0]
+
+
+class MPS:
+    def __init__(self, tensors: list, center: int = 0):
+        """
+        Initialize a matrix product state.
+
+        Parameters
+        ----------
+        tensors : list[np.ndarray]
+            One tensor per site, with indices (left, physical, right).
+        center : int, optional
+            Orthogonality center: tensors to its left are left-isometric and
+            tensors to its right are right-isometric. Defaults to 0.
+        """
+        self.tensors = [np.asarray(A, dtype=np.complex128) for A in tensors]
+        self.center = center
+
+    @property
+    def num_sites(self):
+        return len(self.tensors)
+
+    @classmethod
+    def product_state(cls, local_states):
+        """
+        Build a product state from normalized single-site states, given as
+        vectors in the (up, down) basis.
+        """
+        return cls([np.reshape(state, (1, 2, 1)) for state in local_states])
+
+    @classmethod
+    def random_product_state(cls, num_sites: int, rng=None):
+        """
+        Build a product of Haar-random single-site states.
+        """
+        rng = np.random.default_rng(rng)
+        states = rng.standard_normal((num_sites, 2)) + \
+            1j * rng.standard_normal((num_sites, 2))
+        states /= np.linalg.norm(states, axis=1, keepdims=True)
+        return cls.product_state(states)
+
+    @classmethod
+    def random(cls, num_sites: int, chi: int, rng=None):
+        """
+        Build a normalized random MPS of bond dimension at most `chi`.
+        """
+        rng = np.random.default_rng(rng)
+        dims = [min(chi, 2 ** k, 2 ** (num_sites - k))
+                for k in range(num_sites + 1)]
+        tensors = [rng.standard_normal((dims[k], 2, dims[k + 1])) +
+                   1j * rng.standard_normal((dims[k], 2, dims[k + 1]))
+                   for k in range(num_sites)]
+        mps = cls(tensors, center=num_sites - 1)
+        mps.move_center(0)
+        mps.tensors[0] /= np.linalg.norm(mps.tensors[0])
+        return mps
+
+    def copy(self):
+        return MPS([A.copy() for A in self.tensors], self.center)
+
+    def move_center(self, site: int):
+        """
+        Move the orthogonality center to `site` with QR decompositions.
+        """
+        while self.center < site:
+            A = self.tensors[self.center]
+            Q, R = np.linalg.qr(A.reshape(-1, A.shape[2]))
+            self.tensors[self.center] = Q.reshape(A.shape[0], 2, -1)
+            self.tensors[self.center + 1] = np.tensordot(
+                R, self.tensors[self.center + 1], axes=(1, 0))
+            self.center += 1
+        while self.center > site:
+            A = self.tensors[self.center]
+            Q, R = np.linalg.qr(A.reshape(A.shape[0], -1).T)
+            self.tensors[self.center] = Q.T.reshape(-1, 2, A.shape[2])
+            self.tensors[self.center - 1] = np.tensordot(
+                self.tensors[self.center - 1], R.T, axes=(2, 0))
+            self.center -= 1
+
+    def apply_one_site(self, op, site: int):
+        """
+        Apply a single-site operator. The canonical form is only kept for
+        unitary operators or if `site` is the orthogonality center.
+        """
+        self.tensors[site] = np.einsum('st,atb->asb', op, self.tensors[site])
+
+    def apply_two_site(self, gate, site: int, chi_max: int = None,
+                       cutoff: float = 1e-12, move_right: bool = True):
+        """
+        Apply a two-site operator to sites (site, site + 1) and split the
+        result with a truncated SVD.
+
+        Parameters
+        ----------
+        gate : np.ndarray
+            Operator with indices (bra1, bra2, ket1, ket2), or as a 4x4
+            matrix.
+        site : int
+            The left site.
+        chi_max : int, optional
+            Maximum bond dimension, defaults to no limit.
+        cutoff : float, optional
+            Singular values below `cutoff` times the largest one are
+            discarded, defaults to 1e-12.
+        move_right : bool, optional
+            Leave the orthogonality center on the right site (True, default)
+            or on the left site.
+
+        Returns
+        -------
+        float
+            The discarded weight (sum of the squared discarded singular
+            values).
+        """
+        self.move_center(site)
+        theta = np.einsum('asb,btc->astc', self.tensors[site],
+                          self.tensors[site + 1])
+        theta = np.einsum('uvst,astc->auvc', np.reshape(gate, (2, 2, 2, 2)),
+                          theta)
+        return self._split(theta, site, chi_max, cutoff, move_right)
+
+    def _split(self, theta, site, chi_max, cutoff, move_right):
+        """
+        Split a two-site tensor (left, s1, s2, right) back into two sites.
+        """
+        chi_left, chi_right = theta.shape[0], theta.shape[3]
+        U, S, V = np.linalg.svd(theta.reshape(chi_left * 2, 2 * chi_right),
+                                full_matrices=False)
+        keep = max(1, int(np.sum(S > cutoff * S[0])) if S[0] > 0 else 1)
+        if chi_max is not None:
+            keep = min(keep, chi_max)
+        discarded = np.sum(S[keep:] ** 2)
+        U, S, V = U[:, :keep], S[:keep], V[:keep]
+        if move_right:
+            V = S[:, None] * V
+            self.center = site + 1
+        else:
+            U = U * S[None, :]
+            self.center = site
+        self.tensors[site] = U.reshape(chi_left, 2, keep)
+        self.tensors[site + 1] = V.reshape(keep, 2, chi_right)
+        return discarded
+
+    def overlap(self, other):
+        """
+        Compute the overlap <self|other>.
+        """
+        env = np.ones((1, 1), dtype=np.complex128)
+        for A, B in zip(self.tensors, other.tensors):
+            env = np.einsum('ab,asc,bsd->cd', env, A.conj(), B)
+        return env[0, 0]
+
+    def norm(self):
+        return np.sqrt(np.abs(self.overlap(self)))
+
+    def to_vector(self):
+        """
+        Contract the MPS into a state vector (for small chains).
+        """
+        psi = self.tensors[0]
+        for A in self.tensors[1:]:
+            psi = np.tensordot(psi, A, axes=(psi.ndim - 1, 0))
+        return psi.reshape(-1)
+
+    def expectation_value(self, op, site: int):
+        """
+        Compute <op> at `site` for a normalized state.
+        """
+        self.move_center(site)
+        A = self.tensors[site]
+        return np.einsum('asb,st,atb->', A.conj(), op, A)
+
+    def entanglement_entropy(self, bond: int):
+        """
+        Compute the von Neumann entanglement entropy of the cut between
+        sites bond - 1 and bond, for a normalized state.
+        """
+        self.move_center(bond)
+        A = self.tensors[bond]
+        S = np.linalg.svd(A.reshape(A.shape[0], -1), compute_uv=False)
+        p = S[S > 0] ** 2
+        p /= np.sum(p)
+        return -np.sum(p * np.log(p))
+
+
+def _environment_left(env, A, W):
+    # (bra, mpo, ket) -> (bra', mpo', ket')
+    env = np.tensordot(env, A, axes=(2, 0))
+    env = np.tensordot(env, W, axes=([1, 2], [0, 3]))
+    env = np.tensordot(env, A.conj(), axes=([0, 3], [0, 1]))
+    return env.transpose(2, 1, 0)
+
+
+def _environment_right(env, A, W):
+    env = np.tensordot(A, env, axes=(2, 2))
+    env = np.tensordot(env, W, axes=([3, 1], [1, 3]))
+    env = np.tensordot(env, A.conj(), axes=([3, 1], [1, 2]))
+    return env.transpose(2, 1, 0)
+
+
+def dmrg(mpo, mps: MPS, num_sweeps: int = 10, chi_max: int = 64,
+         cutoff: float = 1e-10, tol: float = 1e-10):
+    """
+    Find the ground state of an MPO with two-site DMRG.
+
+    Parameters
+    ----------
+    mpo : list[np.ndarray]
+        The Hamiltonian, see `build_mpo`.
+    mps : MPS
+        Initial state, modified in place. A random MPS (`MPS.random`) avoids
+        getting stuck in the sector of conserved quantities of a product
+        state.
+    num_sweeps : int, optional
+        Maximum number of (right and left) sweeps, defaults to 10.
+    chi_max : int, optional
+        Maximum bond dimension, defaults to 64.
+    cutoff : float, optional
+        Relative singular value cutoff, defaults to 1e-10.
+    tol : float, optional
+        Convergence tolerance on the energy between sweeps, defaults to
+        1e-10.
+
+    Returns
+    -------
+    energy : float
+        The ground state energy.
+    mps : MPS
+        The ground state.
+    """
+    num_sites = mps.num_sites
+    if num_sites < 2:
+        raise ValueError("DMRG requires at least two sites")
+    mps.move_center(0)
+    mps.tensors[0] /= np.linalg.norm(mps.tensors[0])
+
+    left = [None] * (num_sites + 1)
+    right = [None] * (num_sites + 1)
+    left[0] = np.ones((1, 1, 1), dtype=np.complex128)
+    right[num_sites] = np.ones((1, 1, 1), dtype=np.complex128)
+    for k in range(num_sites - 1, 0, -1):
+        right[k] = _environment_right(right[k + 1], mps.tensors[k], mpo[k])
+
+    def optimize(site, move_right):
+        theta = np.einsum('asb,btc->astc', mps.tensors[site],
+                          mps.tensors[site + 1])
+        L, W1, W2, R = left[site], mpo[site], mpo[site + 1], right[site + 2]
+
+        def matvec(x):
+            y = np.tensordot(L, x.reshape(theta.shape), axes=(2, 0))
+            y = np.tensordot(y, W1, axes=([1, 2], [0, 3]))
+            y = np.tensordot(y, W2, axes=([3, 1], [0, 3]))
+            y = np.tensordot(y, R, axes=([1, 3], [2, 1]))
+            return y.reshape(-1)
+
+        dim = theta.size
+        if dim <= 64:
+            H = np.stack([matvec(e) for e in np.identity(dim)], axis=1)
+            energies, vectors = np.linalg.eigh((H + H.conj().T) / 2)
+        else:
+            operator = LinearOperator((dim, dim), matvec=matvec,
+                                      dtype=np.complex128)
+            energies, vectors = eigsh(operator, k=1, which='SA',
+                                      v0=theta.reshape(-1), tol=tol / 10)
+        theta = vectors[:, 0].reshape(theta.shape)
+        mps._split(theta, site, chi_max, cutoff, move_right)
+        # keep the state normalized after truncation
+        center = mps.center
+        mps.tensors[center] /= np.linalg.norm(mps.tensors[center])
+        return energies[0]
+
+    energy = np.inf
+    for _ in range(num_sweeps):
+        for site in range(num_sites - 1):
+            new_energy = optimize(site, True)
+            left[site + 1] = _environment_left(left[site], mps.tensors[site],
+                                               mpo[site])
+        for site in range(num_sites - 2, -1, -1):
+            new_energy = optimize(site, False)
+            right[site + 1] = _environment_right(
+                right[site + 2], mps.tensors[site + 1], mpo[site + 1])
+        if abs(new_energy - energy) < tol:
+            energy = new_energy
+            break
+        energy = new_energy
+    return float(np.real(energy)), mps
+
+
+def bond_hamiltonians(terms):
+    """
+    Sum the terms of `local_terms` into one matrix per site and per pair of
+    sites.
+
+    Returns
+    -------
+    one_site : dict
+        Dictionary mapping a site to its 2x2 Hamiltonian.
+    two_site : dict
+        Dictionary mapping a pair of sites (i < j) to its 4x4 Hamiltonian.
+    """
+    one_site, two_site = {}, {}
+    for c, op, sites in terms:
+        if len(sites) == 1:
+            one_site[sites] = one_site.get(sites, 0) + c * local_operator(op)
+        else:
+            two_site[sites] = two_site.get(sites, 0) + c * np.kron(
+                PAULI[op[0]], PAULI[op[1]])
+    return {site[0]: h for site, h in one_site.items()}, two_site
+
+
+def trotter_gates(terms, dt: float):
+    """
+    Build the gates of half a Trotter step of length `dt`.
+
+    Parameters
+    ----------
+    terms : list[tuple]
+        Terms as returned by `local_terms`.
+    dt : float
+        Trotter step; the gates evolve for dt / 2.
+
+    Returns
+    -------
+    gates : list[tuple]
+        List of (site, gate) for one-site gates and ((i, j), gate) for
+        two-site gates with indices (bra1, bra2, ket1, ket2), in increasing
+        order of the sites.
+    """
+    one_site, two_site = bond_hamiltonians(terms)
+    gates = [(site, expm(-0.5j * dt * h)) for site, h in
+             sorted(one_site.items())]
+    gates += [(sites, expm(-0.5j * dt * h).reshape(2, 2, 2, 2)) for sites, h in
+              sorted(two_site.items())]
+    return gates
+
+
+def apply_trotter_steps(mps: MPS, gates, num_steps: int,
+                        chi_max: int = None, cutoff: float = 1e-12):
+    """
+    Apply second-order (symmetric) Trotter steps to an MPS.
+
+    Each step applies the half-step gates of `trotter_gates` in increasing
+    order and then in decreasing order. Gates between non-adjacent sites
+    (next-nearest neighbor or periodic boundary terms) are applied by
+    swapping the right site next to the left one and back.
+
+    Parameters
+    ----------
+    mps : MPS
+        The state, modified in place.
+    gates : list[tuple]
+        Gates as returned by `trotter_gates`.
+    num_steps : int
+        Number of Trotter steps.
+    chi_max : int, optional
+        Maximum bond dimension, defaults to no limit.
+    cutoff : float, optional
+        Relative singular value cutoff, defaults to 1e-12.
+
+    Returns
+    -------
+    float
+        The total discarded weight.
+    """
+    discarded = 0.0
+    for _ in range(num_steps):
+        for sequence in (gates, gates[::-1]):
+            for site, gate in sequence:
+                if np.ndim(site) == 0:
+                    mps.apply_one_site(gate, site)
+                    continue
+                i, j = site
+                for k in range(j - 1, i, -1):
+                    discarded += mps.apply_two_site(SWAP, k, chi_max, cutoff,
+                                                    move_right=False)
+                discarded += mps.apply_two_site(gate, i, chi_max, cutoff)
+                for k in range(i + 1, j):
+                    discarded += mps.apply_two_site(SWAP, k, chi_max, cutoff)
+    return discarded
+
+
+def tebd_evolve(mps: MPS, terms, time: float, num_steps: int,
+                chi_max: int = None, cutoff: float = 1e-12):
+    """
+    Evolve an MPS under a time-independent Hamiltonian with second-order
+    Trotter steps (see `apply_trotter_steps`).
+
+    Parameters
+    ----------
+    mps : MPS
+        The state, modified in place.
+    terms : list[tuple]
+        Terms as returned by `local_terms`.
+    time : float
+        Evolution time.
+    num_steps : int
+        Number of Trotter steps.
+    chi_max : int, optional
+        Maximum bond dimension, defaults to no limit.
+    cutoff : float, optional
+        Relative singular value cutoff, defaults to 1e-12.
+
+    Returns
+    -------
+    float
+        The total discarded weight.
+    """
+    return apply_trotter_steps(mps, trotter_gates(terms, time / num_steps),
+                               num_steps, chi_max=chi_max, cutoff=cutoff)
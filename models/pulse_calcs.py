@@ -76,3 +76,60 @@ def get_vectorized_blackman_pulse(t, duration, delay, hold=0):
                                           delay=delay, hold=hold)
 
     return pulse_pts
+
+
+def get_pulse_parameters(transition, duration, delay, hold,
+                         probe_peak_power=10e-3, couple_power=1, Delta=None,
+                         evolve_time=0):
+    """
+    Time array and Rabi angular frequencies of a Blackman probe pulse and a
+    constant coupling laser, shared by the `probe_pulse_unitary` methods of
+    the Rydberg models.
+
+    The time step is about 1 / (2 max(Omega12, Omega23, Delta)), from the
+    peak Rabi angular frequencies and the detuning.
+
+    Parameters
+    ----------
+    transition : RydbergTransition
+        The transition, providing the Rabi angular frequencies.
+    duration, delay, hold : float
+        Duration, delay and flat top of the probe pulse.
+    probe_peak_power : float, optional
+        The peak power of the probe pulse, default is 10e-3 W.
+    couple_power : float, optional
+        The power of the coupling laser, default is 1 W.
+    Delta : float, optional
+        The detuning of the 7P state. If None, the optimal detuning is
+        calculated.
+    evolve_time : float, optional
+        Additional time to evolve the system after the probe pulse.
+
+    Returns
+    -------
+    time_array : np.ndarray
+        Time array used for the simulation.
+    probe_power : np.ndarray
+        Probe pulse power over time.
+    Omega12 : np.ndarray
+        Probe Rabi angular frequency over time.
+    Omega23 : float
+        Coupling Rabi angular frequency.
+    Delta : float
+        The detuning of the 7P state.
+    """
+    t1, t2 = transition.transition1, transition.transition2
+    max_Omega12 = t1.RabiAngularFreq_from_Power(probe_peak_power)
+    Omega23 = t2.RabiAngularFreq_from_Power(couple_power).item()
+    if Delta is None:
+        Delta = transition.get_optimal_detuning(rabiFreq1=max_Omega12,
+                                                rabiFreq2=Omega23)
+    max_freq = np.max([max_Omega12, Omega23, Delta])
+    stop_time = delay + duration + hold + 10e-9 + evolve_time
+    time_array = np.linspace(0, stop_time, int(2 * stop_time * max_freq) + 1)
+
+    probe_power = get_vectorized_blackman_pulse(
+        time_array, duration, delay, hold) * probe_peak_power
+    probe_power[probe_power < 0] = 0
+    Omega12 = t1.RabiAngularFreq_from_Power(probe_power)
+    return time_array, probe_power, Omega12, Omega23, Delta
@@ -0,0 +1,327 @@
+import os
+import numpy as np
+import scipy.linalg
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse.linalg import expm_multiply
+
+
+# solver of a worker process, set once by `_init_worker` so that its
+# propagator cache persists across batches
+_worker_solver = None
+
+
+def _init_worker(solver):
+    global _worker_solver
+    _worker_solver = solver
+
+
+def _run_batch(psi0, num_trajectories, seed, solver=None):
+    solver = _worker_solver if solver is None else solver
+    return solver.run_batch(psi0, num_trajectories,
+                            rng=np.random.default_rng(seed))
+
+
+class TrajectorySolver:
+    def __init__(self, terms: list[tuple], jump_operators: list,
+                 time_array, projector=None, max_cache_bytes: int = 2**26):
+        """
+        Initialize a quantum-jump (Monte Carlo wavefunction) solver of the
+        Lindblad master equation
+
+        d/dt rho = -i [H, rho] + sum_k (L_k rho L_k^dagger
+                   - 1/2 {L_k^dagger L_k, rho}),
+
+        which propagates state vectors of dimension d instead of d x d density
+        matrices. The Hamiltonian is piecewise constant on `time_array`, as in
+        `UnitaryRydberg.evolve_state`.
+
+        Trajectories evolve under the effective Hamiltonian
+        H - i/2 sum_k L_k^dagger L_k until their squared norm drops below a
+        random threshold, at which point a jump L_k is applied with
+        probability proportional to ||L_k psi||^2 (with the time resolution of
+        `time_array`). Batches of trajectories are propagated together as the
+        columns of one matrix.
+
+        Parameters
+        ----------
+        terms : list[tuple]
+            Terms (operator, coefficient) of the Hamiltonian H(t) = sum_k
+            c_k(t) O_k, with (sparse) matrices O_k and coefficients that are
+            constant or given at every time point.
+        jump_operators : list
+            The (sparse) jump operators L_k, including the square roots of the
+            decay rates.
+        time_array : np.ndarray
+            Time points in seconds.
+        projector : scipy.sparse matrix or np.ndarray, optional
+            Matrix mapping the populations of the basis states to the
+            recorded populations, e.g. `RydbergBlockade.get_level_projector`.
+            Defaults to None, for the populations of the basis states.
+        max_cache_bytes : int, optional
+            Memory budget of the dense step propagators cached for small
+            systems (d <= 128), keyed on the coefficients and duration of the
+            step, so constant Hamiltonians share one propagator. Steps beyond
+            the budget use `expm_multiply`. Defaults to 64 MiB.
+        """
+        self.time_array = np.asarray(time_array, dtype=float)
+        # step durations, snapped to one value on uniform grids
+        self._durations = np.diff(self.time_array)
+        if np.allclose(self._durations, np.mean(self._durations), rtol=1e-9,
+                       atol=0):
+            self._durations[:] = np.mean(self._durations)
+        self.operators = [sp.csr_matrix(operator, dtype=np.complex128)
+                          for operator, _ in terms]
+        self.coefficients = np.array([np.broadcast_to(
+            np.asarray(c, dtype=float), self.time_array.shape)
+            for _, c in terms])
+        self.jump_operators = [sp.csr_matrix(L, dtype=np.complex128)
+                               for L in jump_operators]
+        self.projector = projector
+        self.dim = self.operators[0].shape[0]
+        decay = sum((L.conj().T @ L for L in self.jump_operators),
+                    sp.csr_matrix((self.dim, self.dim)))
+        self._anti_hermitian = (-0.5j * decay).tocsr()
+        # small systems reuse dense step propagators across batches
+        self.max_cache_bytes = max_cache_bytes
+        self._propagators = {}
+
+    def __getstate__(self):
+        # worker processes build their own propagator caches
+        state = self.__dict__.copy()
+        state['_propagators'] = {}
+        return state
+
+    @classmethod
+    def from_lossy_rydberg(cls, time_array, Omega12, Omega23, Delta, delta,
+                           gamma2, gamma3):
+        """
+        Construct the solver of the four-level model of `LossyRydberg`:
+        ground, 7P, Rydberg and loss states, with the decay channels gamma2
+        (7P to loss) and gamma3 (Rydberg to loss).
+
+        Parameters
+        ----------
+        time_array : np.ndarray
+            Time points in seconds.
+        Omega12, Omega23 : float or np.ndarray
+            Probe and coupling Rabi angular frequencies, constant or at every
+            time point.
+        Delta, delta : float or np.ndarray
+            Detunings of the 7P and Rydberg states.
+        gamma2 : float
+            The linewidth of the intermediate state, in Hz.
+        gamma3 : float
+            The linewidth of the Rydberg state, in Hz.
+
+        Returns
+        -------
+        TrajectorySolver
+            Solver whose populations are those of the ground, 7P, Rydberg
+            and loss states.
+        """
+        from models.rydberg_dynamics import LossyRydberg
+
+        # unit terms of the Hamiltonian of LossyRydberg
+        terms = [(LossyRydberg.get_hamiltonian(*p), c) for p, c in
+                 zip(np.identity(4), (Omega12, Omega23, Delta, delta))]
+        loss_e, loss_r = np.zeros((4, 4)), np.zeros((4, 4))
+        loss_e[3, 1] = np.sqrt(gamma2)
+        loss_r[3, 2] = np.sqrt(gamma3)
+        return cls(terms, [loss_e, loss_r], time_array)
+
+    @classmethod
+    def from_blockade(cls, atoms, time_array, Omega12, Omega23, Delta, delta,
+                      gamma2, gamma3):
+        """
+        Construct the solver of a `RydbergBlockade` with loss states, whose
+        7P and Rydberg states decay with the rates gamma2 and gamma3.
+
+        Parameters
+        ----------
+        atoms : RydbergBlockade
+            The atoms, with loss_state=True.
+        time_array, Omega12, Omega23, Delta, delta, gamma2, gamma3
+            See `from_lossy_rydberg`.
+
+        Returns
+        -------
+        TrajectorySolver
+            Solver whose populations are the level populations of every atom,
+            of shape (N * len(atoms.levels),) at every time point.
+        """
+        operators = atoms.get_operators()
+        terms = [(operators['ge'], np.asarray(Omega12) / 2),
+                 (operators['er'], np.asarray(Omega23) / 2),
+                 (operators['e'], Delta), (operators['r'], delta),
+                 (operators['vdw'], 1.0)]
+        return cls(terms, atoms.get_jump_operators(gamma2, gamma3),
+                   time_array, projector=atoms.get_level_projector())
+
+    def get_effective_hamiltonian(self, i: int):
+        """
+        Effective (non-Hermitian) Hamiltonian H(t_i) - i/2 sum_k L_k^dagger
+        L_k at the time point `i`.
+        """
+        H = self._anti_hermitian.copy()
+        for operator, c in zip(self.operators, self.coefficients[:, i]):
+            if c != 0:
+                H = H + c * operator
+        return H
+
+    def propagate(self, i: int, psi):
+        """
+        Propagate states with the effective Hamiltonian over the time step
+        starting at the time point `i`.
+        """
+        deltaT = self._durations[i]
+        key = (deltaT,) + tuple(self.coefficients[:, i])
+        if key in self._propagators:
+            return self._propagators[key] @ psi
+        H = self.get_effective_hamiltonian(i)
+        size = 16 * self.dim**2
+        if (self.dim > 128 or size * (len(self._propagators) + 1) >
+                self.max_cache_bytes):
+            return expm_multiply(-1j * deltaT * H, psi)
+        self._propagators[key] = scipy.linalg.expm(-1j * deltaT *
+                                                   H.toarray())
+        return self._propagators[key] @ psi
+
+    def _record(self, psi):
+        populations = np.abs(psi)**2
+        populations /= np.sum(populations, axis=0)
+        if self.projector is not None:
+            populations = self.projector @ populations
+        return populations
+
+    def run_batch(self, psi0, num_trajectories: int, rng=None):
+        """
+        Propagate a batch of trajectories together.
+
+        Parameters
+        ----------
+        psi0 : np.ndarray
+            Initial state of shape (d,).
+        num_trajectories : int
+            Number of trajectories.
+        rng : np.random.Generator, optional
+            Random number generator, defaults to a new unseeded one.
+
+        Returns
+        -------
+        total : np.ndarray
+            Sum over the trajectories of the recorded populations, of shape
+            (len(time_array), m).
+        total_squares : np.ndarray
+            Sum of the squared populations, of the same shape.
+        num_jumps : int
+            Total number of jumps.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        psi = np.repeat(np.asarray(psi0, dtype=np.complex128)[:, np.newaxis],
+                        num_trajectories, axis=1)
+        psi /= np.linalg.norm(psi, axis=0)
+        thresholds = rng.random(num_trajectories)
+        num_jumps = 0
+
+        populations = self._record(psi)
+        total = np.zeros((len(self.time_array),) + populations.shape[:1])
+        total_squares = np.zeros_like(total)
+        total[0] = populations.sum(axis=1)
+        total_squares[0] = (populations**2).sum(axis=1)
+        for i in range(len(self.time_array) - 1):
+            psi = self.propagate(i, psi)
+            jumped = np.nonzero(np.sum(np.abs(psi)**2, axis=0) <
+                                thresholds)[0]
+            if len(jumped) > 0 and self.jump_operators:
+                candidates = np.array([L @ psi[:, jumped] for L in
+                                       self.jump_operators])
+                weights = np.sum(np.abs(candidates)**2, axis=1)
+                cumulative = np.cumsum(weights, axis=0)
+                channel = np.sum(cumulative < rng.random(len(jumped)) *
+                                 cumulative[-1], axis=0)
+                channel = np.minimum(channel, len(self.jump_operators) - 1)
+                new = candidates[channel, :, np.arange(len(jumped))].T
+                psi[:, jumped] = new / np.linalg.norm(new, axis=0)
+                thresholds[jumped] = rng.random(len(jumped))
+                num_jumps += len(jumped)
+            populations = self._record(psi)
+            total[i + 1] = populations.sum(axis=1)
+            total_squares[i + 1] = (populations**2).sum(axis=1)
+        return total, total_squares, num_jumps
+
+    def run(self, psi0, num_trajectories: int = 1000, batch_size: int = 100,
+            n_jobs: int = 1, tol: float = None, seed=None):
+        """
+        Average trajectories in batches until `num_trajectories` have been
+        run or the populations have converged.
+
+        Parameters
+        ----------
+        psi0 : np.ndarray
+            Initial state of shape (d,).
+        num_trajectories : int, optional
+            Maximum number of trajectories, defaults to 1000.
+        batch_size : int, optional
+            Number of trajectories propagated together, defaults to 100.
+        n_jobs : int, optional
+            Number of worker processes running batches in parallel, -1 for
+            all CPUs. Defaults to 1, which runs in the current process.
+        tol : float, optional
+            Stop once the standard error of every population (at every time
+            point) is below `tol`. Defaults to None, for a fixed number of
+            trajectories.
+        seed : int, optional
+            Seed of the random numbers; every batch draws from an independent
+            stream, so results do not depend on `n_jobs`.
+
+        Returns
+        -------
+        dict
+            'populations' (the mean recorded populations, of shape
+            (len(time_array), m)), their 'std_error', the
+            'num_trajectories' run, the 'num_jumps', and the 'history' of
+            (num_trajectories, max std_error) after every round of batches.
+        """
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        num_batches = -(-num_trajectories // batch_size)
+        sizes = [min(batch_size, num_trajectories - k * batch_size)
+                 for k in range(num_batches)]
+        seeds = np.random.SeedSequence(seed).spawn(num_batches)
+
+        total = total_squares = 0
+        count = num_jumps = 0
+        history = []
+        executor = (ProcessPoolExecutor(max_workers=n_jobs,
+                                        initializer=_init_worker,
+                                        initargs=(self,))
+                    if n_jobs > 1 else None)
+        try:
+            for start in range(0, num_batches, n_jobs):
+                batches = list(zip(sizes[start:start + n_jobs],
+                                   seeds[start:start + n_jobs]))
+                if executor is None:
+                    results = [_run_batch(psi0, size, s, self)
+                               for size, s in batches]
+                else:
+                    results = list(executor.map(
+                        _run_batch, *zip(*[(psi0, size, s)
+                                           for size, s in batches])))
+                for (batch_total, batch_squares, jumps), (size, _) in zip(
+                        results, batches):
+                    total = total + batch_total
+                    total_squares = total_squares + batch_squares
+                    count += size
+                    num_jumps += jumps
+                mean = total / count
+                variance = np.maximum(total_squares / count - mean**2, 0)
+                std_error = np.sqrt(variance / max(count - 1, 1))
+                history.append((count, np.max(std_error)))
+                if tol is not None and count > 1 and np.max(std_error) < tol:
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return {"populations": mean, "std_error": std_error,
+                "num_trajectories": count, "num_jumps": num_jumps,
+                "history": history}
@@ -0,0 +1,441 @@
+import itertools
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import expm_multiply
+import models.rydberg_calcs as ryd
+import models.pulse_calcs as pulses
+
+
+class RydbergBlockade:
+    def __init__(self, positions, C6=None, transition=None,
+                 max_rydberg=None, dark_state=True, loss_state=False):
+        """
+        Initialize a simulator of N atoms, each driven on the same
+        ground-7P-Rydberg ladder as `UnitaryRydberg`, with van der Waals
+        interactions between atoms in the Rydberg state.
+
+        The Hamiltonian is built as a sparse matrix in the product basis of
+        the atoms, optionally truncated to states with at most `max_rydberg`
+        Rydberg excitations (the blockade subspace for max_rydberg=1), which
+        keeps 2-10 atoms tractable. Its time-independent parts are cached, so
+        that every time step only sums four sparse matrices.
+
+        Parameters
+        ----------
+        positions : array_like
+            Positions of the atoms in meters, of shape (N, dim) or (N,).
+        C6 : float, optional
+            van der Waals coefficient in rad/s m^6 (angular frequency, like
+            the Rabi frequencies). Defaults to None, in which case it is
+            computed with ARC for the Rydberg state of `transition`.
+        transition : RydbergTransition, optional
+            Transition providing the Rabi frequencies from the laser powers
+            and the Rydberg state. Defaults to None, in which case a default
+            `RydbergTransition` is created when first needed.
+        max_rydberg : int, optional
+            Maximum number of atoms in the Rydberg state. Defaults to None,
+            for the full product space.
+        dark_state : bool, optional
+            Include the uncoupled qubit state |0> of each atom, needed to
+            simulate gates. Defaults to True.
+        loss_state : bool, optional
+            Include a loss state of each atom, the target of the decay of the
+            7P and Rydberg states as in `LossyRydberg` (see
+            `get_jump_operators`). Defaults to False.
+
+        Attributes
+        ----------
+        levels : tuple[str]
+            Labels of the levels of each atom: '0' (if `dark_state`), 'g'
+            (the coupled ground state, i.e. the qubit state |1>), 'e' (7P),
+            'r' (Rydberg) and 'l' (loss, if `loss_state`).
+        states : np.ndarray
+            Level index of every atom in every basis state, of shape
+            (num_states, N).
+        interactions : np.ndarray
+            Pair interaction energies C6 / r^6 in rad/s, of shape (N, N).
+        """
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim == 1:
+            positions = positions[:, np.newaxis]
+        self.positions = positions
+        self.num_atoms = len(positions)
+        self.levels = (('0',) * dark_state + ('g', 'e', 'r') +
+                       ('l',) * loss_state)
+        self.max_rydberg = max_rydberg
+        self._transition = transition
+
+        if C6 is None:
+            t2 = self.transition.transition2
+            C6 = self.get_c6(t2.n2, t2.l2, t2.j2, t2.mj2)
+        self.C6 = C6
+        distance = np.linalg.norm(positions[:, np.newaxis] -
+                                  positions[np.newaxis], axis=-1)
+        self.interactions = np.divide(C6, distance**6,
+                                      out=np.zeros_like(distance),
+                                      where=distance > 0)
+
+        # product basis, encoded as integers in base len(levels)
+        d, N = len(self.levels), self.num_atoms
+        self._place_values = d ** np.arange(N - 1, -1, -1)
+        if max_rydberg is None:
+            codes = np.arange(d**N)
+            states = ((codes[:, np.newaxis] // self._place_values) %
+                      d).astype(np.int8)
+        else:
+            states = self._truncated_states(d, N, self.level('r'),
+                                            max_rydberg)
+            codes = states @ self._place_values
+            order = np.argsort(codes)
+            codes, states = codes[order], states[order]
+        self.codes = codes
+        self.states = states
+
+        self._operators = None
+        self._level_projector = None
+
+    @property
+    def transition(self):
+        if self._transition is None:
+            self._transition = ryd.RydbergTransition()
+        return self._transition
+
+    @property
+    def num_states(self):
+        return len(self.codes)
+
+    def level(self, label: str):
+        """
+        Index of the level `label` in `levels`.
+        """
+        return self.levels.index(label)
+
+    @staticmethod
+    def get_c6(n, l, j, mj, theta=0.0, phi=0.0, nRange=5, energyDelta=25e9):
+        """
+        Compute the van der Waals coefficient of two Cs atoms in the same
+        Rydberg state with ARC (second order perturbation theory).
+
+        Parameters
+        ----------
+        n, l, j, mj : int or float
+            Quantum numbers of the Rydberg state.
+        theta, phi : float, optional
+            Orientation of the interatomic axis relative to the quantization
+            axis, defaults to 0.
+        nRange : int, optional
+            Range of principal quantum numbers of the pair states, defaults
+            to 5.
+        energyDelta : float, optional
+            Maximum energy defect of the pair states in Hz, defaults to 25e9.
+
+        Returns
+        -------
+        float
+            C6 in rad/s m^6.
+        """
+        from arc import Caesium, PairStateInteractions
+
+        pair = PairStateInteractions(Caesium(), n, l, j, n, l, j, mj, mj)
+        C6 = pair.getC6perturbatively(theta, phi, nRange, energyDelta)
+        return 2 * np.pi * C6 * 1e9 * 1e-36  # GHz um^6 to rad/s m^6
+
+    @staticmethod
+    def _truncated_states(d: int, N: int, rydberg: int, max_rydberg: int):
+        """
+        Enumerate the states of N atoms with d levels and at most
+        `max_rydberg` atoms in the level `rydberg`, without building the full
+        product space: for every choice of the excited atoms, the others run
+        over the d - 1 remaining levels.
+
+        Returns
+        -------
+        np.ndarray
+            Level indices of shape (num_states, N), of dtype int8.
+        """
+        others = np.array([level for level in range(d) if level != rydberg],
+                          dtype=np.int8)
+        blocks = []
+        for k in range(min(max_rydberg, N) + 1):
+            # all fillings of the N - k unexcited atoms
+            fillings = others[(np.arange((d - 1)**(N - k))[:, np.newaxis] //
+                               (d - 1)**np.arange(N - k - 1, -1, -1)) %
+                              (d - 1)]
+            for excited in itertools.combinations(range(N), k):
+                block = np.empty((len(fillings), N), dtype=np.int8)
+                block[:, list(excited)] = rydberg
+                block[:, np.setdiff1d(np.arange(N), excited)] = fillings
+                blocks.append(block)
+        return np.concatenate(blocks)
+
+    def index(self, states):
+        """
+        Find the basis indices of states given as arrays of level indices of
+        shape (..., N), or -1 for states outside the (truncated) basis.
+        """
+        codes = np.asarray(states) @ self._place_values
+        position = np.minimum(np.searchsorted(self.codes, codes),
+                              self.num_states - 1)
+        return np.where(self.codes[position] == codes, position, -1)
+
+    def get_transition_operator(self, lower: str, upper: str, atom: int):
+        """
+        Single-atom operator |upper><lower| of atom `atom`, as a sparse
+        matrix in the (truncated) basis.
+        """
+        lower, upper = self.level(lower), self.level(upper)
+        source = np.nonzero(self.states[:, atom] == lower)[0]
+        target = self.states[source].copy()
+        target[:, atom] = upper
+        target = self.index(target)
+        valid = target >= 0
+        return sp.csr_matrix((np.ones(np.sum(valid)),
+                              (target[valid], source[valid])),
+                             shape=(self.num_states, self.num_states))
+
+    def _coupling_operator(self, lower: str, upper: str):
+        """
+        Sum over the atoms of |upper><lower| + |lower><upper|, as a sparse
+        matrix in the (truncated) basis.
+        """
+        operator = sum(self.get_transition_operator(lower, upper, k)
+                       for k in range(self.num_atoms))
+        return (operator + operator.T).tocsr()
+
+    def get_jump_operators(self, gamma2, gamma3):
+        """
+        Jump operators of the decay of the 7P and Rydberg states of every
+        atom into its loss state, sqrt(gamma2) |l><e| and sqrt(gamma3) |l><r|,
+        the channels of `LossyRydberg`. Requires loss_state=True.
+
+        Parameters
+        ----------
+        gamma2 : float
+            The linewidth of the intermediate state, in Hz.
+        gamma3 : float
+            The linewidth of the Rydberg state, in Hz.
+
+        Returns
+        -------
+        list[scipy.sparse.csr_matrix]
+            The jump operators, two per atom.
+        """
+        if 'l' not in self.levels:
+            raise ValueError("Jump operators require loss_state=True")
+        return [np.sqrt(gamma) * self.get_transition_operator(level, 'l', k)
+                for k in range(self.num_atoms)
+                for gamma, level in ((gamma2, 'e'), (gamma3, 'r'))]
+
+    def get_operators(self):
+        """
+        Get the (cached) time-independent parts of the Hamiltonian.
+
+        Returns
+        -------
+        dict
+            Sparse matrices 'ge' and 'er' (sums of the single-atom couplings
+            |e><g| + h.c. and |r><e| + h.c.), 'e' and 'r' (numbers of atoms in
+            the 7P and Rydberg states) and 'vdw' (the van der Waals
+            interaction).
+        """
+        if self._operators is None:
+            excited = (self.states == self.level('e')).astype(float)
+            rydberg = (self.states == self.level('r')).astype(float)
+            vdw = 0.5 * np.sum((rydberg @ self.interactions) * rydberg, axis=1)
+            self._operators = {
+                'ge': self._coupling_operator('g', 'e'),
+                'er': self._coupling_operator('e', 'r'),
+                'e': sp.diags(excited.sum(axis=1), format='csr'),
+                'r': sp.diags(rydberg.sum(axis=1), format='csr'),
+                'vdw': sp.diags(vdw, format='csr')}
+        return self._operators
+
+    def get_hamiltonian(self, Omega12, Omega23, Delta, delta):
+        """
+        Construct the Hamiltonian for given Rabi frequencies and detunings,
+
+        H = sum_k [Omega12 / 2 (|e><g| + h.c.) + Omega23 / 2 (|r><e| + h.c.)
+            + Delta |e><e| + delta |r><r|]_k + sum_{k<l} C6 / r_kl^6 |rr><rr|,
+
+        which is `UnitaryRydberg.get_hamiltonian` on every atom plus the van
+        der Waals interaction.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The Hamiltonian in rad/s.
+        """
+        operators = self.get_operators()
+        return (Omega12 / 2 * operators['ge'] + Omega23 / 2 * operators['er']
+                + Delta * operators['e'] + delta * operators['r'] +
+                operators['vdw'])
+
+    def get_level_populations(self, psi):
+        """
+        Compute the population of every level of every atom.
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            State of shape (num_states,), or states of shape (num_states, n).
+
+        Returns
+        -------
+        np.ndarray
+            Populations of shape (N, len(levels)), or (n, N, len(levels)).
+        """
+        populations = (self.get_level_projector() @ np.abs(psi)**2).T
+        return populations.reshape(np.shape(psi)[1:] +
+                                   (self.num_atoms, len(self.levels)))
+
+    def get_level_projector(self):
+        """
+        Get the (cached) sparse matrix of shape (N * len(levels),
+        num_states) that maps the populations of the basis states to the
+        level populations of every atom, atom by atom.
+        """
+        if self._level_projector is None:
+            d = len(self.levels)
+            rows = (np.arange(self.num_atoms) * d + self.states).ravel()
+            cols = np.repeat(np.arange(self.num_states), self.num_atoms)
+            self._level_projector = sp.csr_matrix(
+                (np.ones(len(rows)), (rows, cols)),
+                shape=(self.num_atoms * d, self.num_states))
+        return self._level_projector
+
+    def product_state(self, labels):
+        """
+        Basis state with atom k in level labels[k], e.g. 'gg0'.
+        """
+        index = self.index([self.level(label) for label in labels])
+        if index < 0:
+            raise ValueError(f"State {labels} is not in the basis")
+        psi = np.zeros(self.num_states, dtype=np.complex128)
+        psi[index] = 1
+        return psi
+
+    def get_computational_states(self):
+        """
+        Basis indices of the computational states, with every atom in '0' or
+        'g' (= |1>), in binary order (atom 0 is the most significant qubit).
+        """
+        if '0' not in self.levels:
+            raise ValueError("Computational states require dark_state=True")
+        bits = (np.arange(2**self.num_atoms)[:, np.newaxis] >>
+                np.arange(self.num_atoms - 1, -1, -1)) & 1
+        return self.index(np.where(bits, self.level('g'), self.level('0')))
+
+    def evolve(self, psi0, time_array, Omega12, Omega23, Delta, delta):
+        """
+        Propagate states through piecewise-constant Hamiltonians, sampled on
+        `time_array` as in `UnitaryRydberg.evolve_state`, with the action of
+        the matrix exponential on the sparse Hamiltonian.
+
+        Parameters
+        ----------
+        psi0 : np.ndarray
+            Initial state of shape (num_states,), or states of shape
+            (num_states, n) which are propagated together.
+        time_array : np.ndarray
+            Time points in seconds.
+        Omega12, Omega23 : float or np.ndarray
+            Probe and coupling Rabi angular frequencies, constant or at every
+            time point.
+        Delta, delta : float or np.ndarray
+            Detunings of the 7P and Rydberg states, constant or at every time
+            point.
+
+        Returns
+        -------
+        psi : np.ndarray
+            The final states.
+        populations : np.ndarray
+            Level populations of every atom at every time point, see
+            `get_level_populations`, with a leading time axis.
+        """
+        time_array = np.asarray(time_array, dtype=float)
+        parameters = np.broadcast_arrays(*[np.broadcast_to(
+            np.asarray(p, dtype=float), time_array.shape) for p in
+            (Omega12, Omega23, Delta, delta)])
+        psi = np.asarray(psi0, dtype=np.complex128)
+        populations = [self.get_level_populations(psi)]
+        for i, deltaT in enumerate(np.diff(time_array)):
+            H = self.get_hamiltonian(*[p[i] for p in parameters])
+            psi = expm_multiply(-1j * deltaT * H, psi)
+            populations.append(self.get_level_populations(psi))
+        return psi, np.array(populations)
+
+    def probe_pulse_unitary(self, duration, delay, hold,
+                            probe_peak_power=10e-3, couple_power=1,
+                            Delta=None, delta=0.0, psi0=None):
+        """
+        Simulate the atoms under a Blackman probe pulse and a constant
+        coupling laser, as `UnitaryRydberg.probe_pulse_unitary` for a single
+        atom.
+
+        Parameters
+        ----------
+        duration : float
+            The duration of the probe pulse.
+        delay : float
+            The delay before the probe pulse starts.
+        hold : float
+            The duration of the flat top of the probe pulse.
+        probe_peak_power : float, optional
+            The peak power of the probe pulse, default is 10e-3 W.
+        couple_power : float, optional
+            The power of the coupling laser, default is 1 W.
+        Delta : float, optional
+            The detuning of the 7P state. If None, the optimal detuning is
+            calculated.
+        delta : float, optional
+            The detuning of the Rydberg state, e.g. to compensate the AC
+            Stark shift. Defaults to 0.
+        psi0 : np.ndarray, optional
+            Initial state(s), defaults to all atoms in 'g'.
+
+        Returns
+        -------
+        psi : np.ndarray
+            The final state(s).
+        populations : np.ndarray
+            Level populations of every atom over time, see `evolve`.
+        probe_power : np.ndarray
+            Probe pulse power over time.
+        time_array : np.ndarray
+            Time array used for the simulation.
+        """
+        time_array, probe_power, Omega12_array, Omega23, Delta = \
+            pulses.get_pulse_parameters(self.transition, duration, delay,
+                                        hold, probe_peak_power, couple_power,
+                                        Delta)
+
+        if psi0 is None:
+            psi0 = self.product_state('g' * self.num_atoms)
+        psi, populations = self.evolve(psi0, time_array, Omega12_array,
+                                       Omega23, Delta, delta)
+        return psi, populations, probe_power, time_array
+
+    def gate_unitary(self, time_array, Omega12, Omega23, Delta, delta):
+        """
+        Evolve all computational states as one batch and project the result
+        onto the computational subspace, e.g. to design CZ gates.
+
+        Parameters
+        ----------
+        time_array, Omega12, Omega23, Delta, delta
+            Time grid and parameters of the pulse, see `evolve`.
+
+        Returns
+        -------
+        np.ndarray
+            Matrix of shape (2^N, 2^N) of the evolution in the computational
+            subspace, in binary order (see `get_computational_states`); its
+            deviation from unitarity is the population left outside.
+        """
+        computational = self.get_computational_states()
+        psi0 = np.zeros((self.num_states, len(computational)),
+                        dtype=np.complex128)
+        psi0[computational, np.arange(len(computational))] = 1
+        psi, _ = self.evolve(psi0, time_array, Omega12, Omega23, Delta, delta)
+        return psi[computational]
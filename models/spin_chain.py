@@ -1,12 +1,20 @@
+import os
 import numpy as np
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from functools import partial
+from itertools import cycle
+from multiprocessing import shared_memory
 from typing import Any
-import quspin
-from scipy.linalg import expm
-from quspin.basis import spin_basis_1d
-from quspin.tools.Floquet import Floquet
-from quspin.tools.misc import matvec
+import scipy.sparse as sp
+from scipy.linalg import logm
+from scipy.sparse.linalg import expm_multiply
 from models.utility import HiddenPrints
+from models import mps
+
+# QuSpin is imported where it is used (DiagonEngine), so that the module and
+# the QuSpin-free engines load quickly, e.g. in worker processes.
 
 
 class LatticeGraph:
@@ -31,10 +39,29 @@ class LatticeGraph:
             Number of sites in the lattice.
         interaction_dict : dict
             Dictionary specifying the interactions between sites.
+        positions : np.ndarray or None
+            Coordinates of the sites, shape (num_sites, dim), for graphs built
+            with `from_positions` or `from_lattice`.
         """
         self.num_sites = num_sites  # number of sites
-        self.interaction_dict: dict[str, list[list[Any]]] = (interaction_dict
-                                                             or {})
+        self.positions = None
+        # compiled (array) form of the interactions, see `compile`
+        self._term_groups = None
+        self._compiled = None
+        self._coefficient_cache = {}
+        self.interaction_dict = interaction_dict or {}
+
+    @property
+    def interaction_dict(self) -> dict[str, list[list[Any]]]:
+        return self._interaction_dict
+
+    @interaction_dict.setter
+    def interaction_dict(self, interaction_dict: dict):
+        # a new dictionary invalidates the compiled terms and the memoized
+        # coefficients, which would otherwise keep returning the old values
+        self._interaction_dict = interaction_dict
+        self._term_groups = None
+        self.clear_cache()
 
     def __call__(self, t):
         """
@@ -53,9 +80,207 @@ class LatticeGraph:
             The inner lists contain the site indices and the interaction
             strength at time t.
         """
-        return {op: [[f(t) if callable(f) else f for f in interaction] for
-                     interaction in interactions] for op, interactions in
-                self.interaction_dict.items()}
+        compiled = self.compile()
+        coefficients = self.coefficients(t)
+        return {op: [[c] + list(sites) for c, sites in
+                     zip(coefficients[op].tolist(), compiled[op][0].tolist())]
+                for op in compiled}
+
+    def compile(self):
+        """
+        Compile the interactions into array form.
+
+        Each operator string is mapped to an integer array of site indices,
+        with shape (num_terms, len(operator)), and to a function that
+        evaluates the coefficients of all of its terms at once. Graphs built
+        with `from_interactions` evaluate callable strengths vectorized over
+        the site indices; graphs built from a raw `interaction_dict` fall back
+        to calling each term. Assigning a new `interaction_dict` recompiles
+        automatically; call `clear_cache` after modifying it in place.
+
+        Returns
+        -------
+        compiled : dict
+            Dictionary mapping each operator string to a tuple
+            (sites, coefficient_function).
+        """
+        if self._compiled is not None:
+            return self._compiled
+
+        groups = self._term_groups
+        if groups is None:
+            groups = []
+            for op, interactions in self.interaction_dict.items():
+                sites = np.array([interaction[1:] for interaction in
+                                  interactions], dtype=int).reshape(
+                    len(interactions), len(op))
+                strengths = [interaction[0] for interaction in interactions]
+                groups.append((op, sites, lambda t, f=strengths: np.array(
+                    [g(t) if callable(g) else g for g in f])))
+
+        compiled = {}
+        for op, sites, coefficient_fn in groups:
+            compiled.setdefault(op, []).append((sites, coefficient_fn))
+        self._compiled = {
+            op: (np.concatenate([sites for sites, _ in parts]).reshape(
+                -1, len(op)),
+                 lambda t, parts=parts: np.concatenate(
+                     [np.reshape(fn(t), -1) for _, fn in parts]))
+            for op, parts in compiled.items()}
+        return self._compiled
+
+    def coefficients(self, t):
+        """
+        Evaluate the coefficients of all interaction terms at time t.
+
+        Results are memoized per time or step label, so repeated evaluations
+        (e.g. over many Floquet periods) do not call the strength functions
+        again. The memo is reset whenever `interaction_dict` is reassigned or
+        `clear_cache` is called, so it never outlives the strengths that
+        produced it.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the coefficients.
+
+        Returns
+        -------
+        coefficients : dict
+            Dictionary mapping each operator string to an array of the
+            coefficients of its terms, ordered as the sites in `compile`.
+        """
+        try:
+            return self._coefficient_cache[t]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable label, evaluate without memoization
+            return {op: coefficient_fn(t) for op, (_, coefficient_fn) in
+                    self.compile().items()}
+
+        coefficients = {op: coefficient_fn(t) for op, (_, coefficient_fn) in
+                        self.compile().items()}
+        if len(self._coefficient_cache) >= 1024:
+            self._coefficient_cache.clear()
+        self._coefficient_cache[t] = coefficients
+        return coefficients
+
+    def clear_cache(self):
+        """
+        Clear the compiled interactions and the memoized coefficients.
+        """
+        self._compiled = None
+        self._coefficient_cache = {}
+
+    @staticmethod
+    def _vectorize_strength(strength, t, *sites):
+        """
+        Evaluate a strength function for arrays of site indices.
+
+        The function is first called with the full index arrays; if it does
+        not support arrays it is called once per term.
+        """
+        num_terms = len(sites[0])
+        try:
+            values = np.asarray(strength(t, *sites))
+            return np.broadcast_to(values, (num_terms,)).copy()
+        except (TypeError, ValueError):
+            return np.array([strength(t, *site) for site in zip(*sites)])
+
+    def _canonical_terms(self, t, shift: int = 0, tol: float = 1e-12):
+        """
+        Collect the non-zero terms at time t in a canonical form.
+
+        Sites are translated by `shift` (modulo `num_sites`) and two-site terms
+        are ordered so that the first site has the lower index, with the
+        operator string reversed accordingly. Coefficients of identical terms
+        are summed.
+
+        Returns
+        -------
+        terms : dict
+            Dictionary mapping (operator, *sites) to the total coefficient.
+        """
+        terms = {}
+        coefficients = self.coefficients(t)
+        for op, (sites, _) in self.compile().items():
+            sites = (sites + shift) % self.num_sites
+            c_op = coefficients[op]
+            op = op.lower()
+            for c, site in zip(np.reshape(c_op, -1), sites.tolist()):
+                if len(site) == 2 and site[0] > site[1]:
+                    key = (op[::-1], site[1], site[0])
+                else:
+                    key = (op, *site)
+                terms[key] = terms.get(key, 0) + c
+        return {key: c for key, c in terms.items() if abs(c) > tol}
+
+    def conserves_magnetization(self, t, tol: float = 1e-12):
+        """
+        Check whether the Hamiltonian at time t conserves total Sz.
+
+        Terms built from 'z' and 'I' always conserve the magnetization, as do
+        terms with equal numbers of '+' and '-'. Two-site 'x'/'y' terms conserve
+        it only in the combination J (xx + yy) + D (xy - yx) on every bond.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the interactions.
+        tol : float, optional
+            Absolute tolerance on the coefficients, defaults to 1e-12.
+
+        Returns
+        -------
+        bool
+            True if the total magnetization is conserved.
+        """
+        bonds = {}
+        for (op, *sites), c in self._canonical_terms(t, tol=tol).items():
+            if set(op) <= set('zi'):
+                continue
+            if set(op) <= set('zi+-'):
+                if op.count('+') != op.count('-'):
+                    return False
+                continue
+            if len(op) == 2 and set(op) <= set('xy'):
+                bonds.setdefault(tuple(sites), {})[op] = c
+                continue
+            return False
+        for bond in bonds.values():
+            if (abs(bond.get('xx', 0) - bond.get('yy', 0)) > tol or
+                    abs(bond.get('xy', 0) + bond.get('yx', 0)) > tol):
+                return False
+        return True
+
+    def is_translation_invariant(self, t, shift: int = 1,
+                                 tol: float = 1e-12):
+        """
+        Check whether the Hamiltonian at time t is invariant under a periodic
+        translation of all sites by `shift`.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the interactions.
+        shift : int, optional
+            Number of sites to translate by, defaults to 1.
+        tol : float, optional
+            Absolute tolerance on the coefficients, defaults to 1e-12.
+
+        Returns
+        -------
+        bool
+            True if the translated Hamiltonian equals the original one.
+        """
+        if self.num_sites % shift != 0:
+            return False
+        terms = self._canonical_terms(t, tol=tol)
+        shifted = self._canonical_terms(t, shift=shift, tol=tol)
+        if terms.keys() != shifted.keys():
+            return False
+        return all(abs(terms[key] - shifted[key]) <= tol for key in terms)
 
     @classmethod
     def from_interactions(cls, num_sites: int, terms: list[list[Any]],
@@ -99,8 +324,8 @@ class LatticeGraph:
             a valid string or number.
         """
 
-        # Create a fresh interaction dictionary
-        new_interaction_dict = {}
+        # Vectorized form of the terms, (operator, sites, coefficients)
+        term_groups = []
 
         for term in terms:
             # Unpack term: operator, strength, interaction range
@@ -113,10 +338,7 @@ class LatticeGraph:
             # Normalize operator to lowercase for consistency
             operator = operator.lower()
 
-            # Initialize list for this operator if not exists
-            if operator not in new_interaction_dict:
-                new_interaction_dict[operator] = []
-
+            decay = None
             if isinstance(alpha, str):
                 if len(operator) != 2:
                     raise ValueError(f"Two-site operation requires two-site "
@@ -124,33 +346,18 @@ class LatticeGraph:
 
                 # Nearest Neighbor (NN) interactions
                 if alpha == 'nn':
-                    if callable(strength):
-                        graph = [[lambda t, s=strength, i=i:
-                                  s(t, i, (i + 1) % num_sites), i,
-                                  (i + 1) % num_sites] for i
-                                 in range(num_sites - 1 + int(pbc))]
-                    else:
-                        graph = [[lambda t, s=strength: s, i,
-                                  (i + 1) % num_sites]
-                                 for i in range(num_sites - 1 + int(pbc))]
+                    i = np.arange(num_sites - 1 + int(pbc))
+                    j = (i + 1) % num_sites
 
                 # Next-Nearest Neighbor (NNN) interactions
                 elif alpha == 'nnn':
-                    if callable(strength):
-                        graph = [[lambda t, s=strength, i=i:
-                                  s(t, i, (i + 2) % num_sites), i,
-                                  (i + 2) % num_sites]
-                                 for i in range(num_sites - 2 + int(pbc))]
-                    else:
-                        graph = [[lambda t, s=strength: s, i,
-                                  (i + 2) % num_sites]
-                                 for i in range(num_sites - 2 + int(pbc))]
+                    i = np.arange(num_sites - 2 + 2 * int(pbc))
+                    j = (i + 2) % num_sites
 
                 else:
                     raise ValueError(f"Invalid range cutoff string: {alpha}")
 
-                # Add to the dictionary for this operator
-                new_interaction_dict[operator].extend(graph)
+                sites = np.stack([i, j], axis=1)
 
             elif alpha == np.inf:
                 if len(operator) != 1:
@@ -158,42 +365,277 @@ class LatticeGraph:
                                      f"operator: {operator}")
 
                 # On-site interaction
-                if callable(strength):
-                    # Time-dependent or site-specific on-site term
-                    graph = [[lambda t, s=strength, i=i: s(t, i), i]
-                             for i in range(num_sites)]
-                else:
-                    # Constant on-site term
-                    graph = [[lambda t, s=strength: s, i]
-                             for i in range(num_sites)]
-
-                # Add to the dictionary for this operator
-                new_interaction_dict[operator].extend(graph)
+                sites = np.arange(num_sites)[:, np.newaxis]
 
             else:
                 if len(operator) != 2:
                     raise ValueError(f"Two-site operation requires two-site "
                                      f"operator: {operator}")
 
-                # General long-range interaction
-                if callable(strength):
-                    # Time and site-dependent strength, inverse range alpha
-                    graph = [[lambda t, s=strength, i=i, j=j:
-                              s(t, i, j)/(np.abs(i - j)**alpha), i, j]
-                             for i in range(num_sites) for j in
-                             range(num_sites)]
+                # General long-range interaction between all pairs of
+                # distinct sites, decaying with inverse range alpha
+                i, j = np.nonzero(~np.eye(num_sites, dtype=bool))
+                decay = 1 / np.abs(i - j)**alpha
+                sites = np.stack([i, j], axis=1)
+
+            term_groups.append((operator, sites, cls._coefficient_function(
+                strength, sites, decay)))
+
+        return cls._from_term_groups(num_sites, term_groups)
+
+    @classmethod
+    def _coefficient_function(cls, strength, sites, decay=None):
+        """
+        Build the function evaluating the coefficients of a group of terms at
+        time t, vectorized over the site indices of shape (num_terms,
+        num_sites) and optionally multiplied by a decay factor per term.
+        """
+        if callable(strength):
+            # Time and site-dependent strength
+            columns = tuple(sites.T)
+            if decay is None:
+                return lambda t: cls._vectorize_strength(strength, t, *columns)
+            return lambda t: cls._vectorize_strength(strength, t,
+                                                     *columns) * decay
+        # Constant strength
+        if decay is None:
+            return lambda t, n=len(sites): np.full(n, strength)
+        return lambda t: strength * decay
+
+    @classmethod
+    def _from_term_groups(cls, num_sites: int, term_groups: list[tuple]):
+        """
+        Create a graph from (operator, sites, coefficient_function) groups,
+        with an interaction dictionary holding one callable per term.
+        """
+        new_interaction_dict = {}
+        for operator, sites, coefficient_fn in term_groups:
+            new_interaction_dict.setdefault(operator, []).extend(
+                [[lambda t, f=coefficient_fn, k=k: f(t)[k], *site]
+                 for k, site in enumerate(sites.tolist())])
+        graph = cls(num_sites, new_interaction_dict)
+        graph._term_groups = term_groups
+        return graph
+
+    @classmethod
+    def from_positions(cls, positions, terms: list[list[Any]],
+                       box: list[float] = None, cutoff: float = None,
+                       tol: float = 1e-8):
+        """
+        Construct a LatticeGraph from the coordinates of the sites, with
+        interactions that depend on the distance between them.
+
+        Neighbors are found with a KD-tree (scipy.spatial.cKDTree), so that
+        the graph of N sites (e.g. a tweezer array) is built in O(N log N)
+        for neighbor shells or a finite cutoff, instead of looping over all
+        pairs. Numeric ranges without a `cutoff` couple all N (N - 1) ordered
+        pairs, so their time and memory grow as O(N^2).
+
+        Parameters
+        ----------
+        positions : array_like
+            Coordinates of the sites, of shape (num_sites, dim) or
+            (num_sites,) for a chain.
+        terms : list[list[Any]]
+            List of interaction terms [operator, strength, range], see
+            `from_interactions`. Callable strengths receive the site indices.
+            The range 'nn' ('nnn') couples all pairs of sites at the smallest
+            (second smallest) distance and np.inf gives on-site terms. A
+            number alpha couples all pairs within `cutoff` with strength
+            1/r^alpha (e.g. 3 for dipolar and 6 for van der Waals
+            interactions), listing both orders of every pair as
+            `from_interactions` does.
+        box : list[float], optional
+            Lengths of the periodic box along each dimension, None for an
+            open dimension. Distances are then measured with the minimum
+            image convention. Defaults to None, for open boundaries.
+        cutoff : float, optional
+            Maximum distance of the interactions with a numeric range.
+            Defaults to None, for all pairs (O(N^2) terms); set a cutoff for
+            large arrays.
+        tol : float, optional
+            Absolute tolerance on the distances that identify the neighbor
+            shells, defaults to 1e-8.
+
+        Returns
+        -------
+        LatticeGraph
+            A new LatticeGraph object with the given positions.
+
+        Raises
+        ------
+        ValueError
+            If a term is invalid, if the box does not match the dimension of
+            the positions, or if a neighbor shell does not exist.
+        """
+        from scipy.spatial import cKDTree
+
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim == 1:
+            positions = positions[:, np.newaxis]
+        num_sites, dim = positions.shape
+
+        periodic = np.zeros(dim, dtype=bool)
+        boxsize = None
+        tree_positions = positions
+        if box is not None:
+            if len(box) != dim:
+                raise ValueError(f"The box must have one length per "
+                                 f"dimension: {box}")
+            periodic = np.array([length is not None for length in box])
+            # open dimensions are made wide enough that no pair wraps around
+            origin = positions.min(axis=0) if num_sites else np.zeros(dim)
+            extent = positions.max(axis=0) - origin if num_sites else origin
+            boxsize = np.array([2 * e + 1 if length is None else length
+                                for length, e in zip(box, extent)])
+            wrapped = np.mod(positions, boxsize)
+            wrapped = np.where(wrapped >= boxsize, wrapped - boxsize, wrapped)
+            tree_positions = np.where(periodic, wrapped, positions - origin)
+        tree = cKDTree(tree_positions, boxsize=boxsize)
+
+        def distances(pairs):
+            difference = positions[pairs[:, 0]] - positions[pairs[:, 1]]
+            if boxsize is not None:
+                difference = np.where(periodic, difference - boxsize * np.round(
+                    difference / boxsize), difference)
+            return np.linalg.norm(difference, axis=1)
+
+        def sorted_pairs(pairs):
+            pairs = np.reshape(pairs, (-1, 2)).astype(int)
+            return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+        shells = None
+        term_groups = []
+        for operator, strength, alpha in terms:
+            if not isinstance(operator, str):
+                raise ValueError(f"Invalid interaction operator, "
+                                 f"expected string: {operator}")
+            operator = operator.lower()
+
+            decay = None
+            if isinstance(alpha, str):
+                if len(operator) != 2:
+                    raise ValueError(f"Two-site operation requires two-site "
+                                     f"operator: {operator}")
+                if alpha not in ('nn', 'nnn'):
+                    raise ValueError(f"Invalid range cutoff string: {alpha}")
+                if shells is None:
+                    shells = cls._neighbor_shells(tree, tol)
+                shell = 0 if alpha == 'nn' else 1
+                if len(shells) <= shell:
+                    raise ValueError(f"No {alpha} shell in the positions")
+                sites = sorted_pairs(tree.query_pairs(
+                    shells[shell] + tol, output_type='ndarray'))
+                sites = sites[np.abs(distances(sites) - shells[shell]) <= tol]
+
+            elif alpha == np.inf:
+                if len(operator) != 1:
+                    raise ValueError(f"One-site operation requires one-site "
+                                     f"operator: {operator}")
+                sites = np.arange(num_sites)[:, np.newaxis]
+
+            else:
+                if len(operator) != 2:
+                    raise ValueError(f"Two-site operation requires two-site "
+                                     f"operator: {operator}")
+                if cutoff is None:
+                    pairs = np.stack(np.triu_indices(num_sites, k=1), axis=1)
                 else:
-                    # Constant interaction strength, inverse range alpha
-                    graph = [[lambda t, s=strength:
-                              s/(np.abs(i - j)**alpha), i, j]
-                             for i in range(num_sites) for j in
-                             range(num_sites)]
+                    pairs = tree.query_pairs(cutoff, output_type='ndarray')
+                sites = sorted_pairs(np.concatenate([pairs, pairs[:, ::-1]]))
+                decay = 1 / distances(sites)**alpha
+
+            term_groups.append((operator, sites, cls._coefficient_function(
+                strength, sites, decay)))
+
+        graph = cls._from_term_groups(num_sites, term_groups)
+        graph.positions = positions
+        return graph
+
+    @staticmethod
+    def _neighbor_shells(tree, tol: float = 1e-8, num_neighbors: int = 12):
+        """
+        Find the distinct distances between neighboring sites of a KD-tree,
+        in increasing order, from the `num_neighbors` nearest neighbors of
+        every site.
+        """
+        k = min(num_neighbors + 1, tree.n)
+        if k < 2:
+            return []
+        distance, _ = tree.query(tree.data, k=k)
+        distance = np.sort(distance[:, 1:][np.isfinite(distance[:, 1:])])
+        return distance[np.concatenate([[True],
+                                        np.diff(distance) > tol])].tolist()
+
+    @classmethod
+    def from_lattice(cls, geometry: str, shape, terms: list[list[Any]],
+                     pbc: bool = False, spacing: float = 1.0,
+                     cutoff: float = None):
+        """
+        Construct a LatticeGraph on a regular lattice, see `from_positions`.
+
+        Sites are numbered with the second coordinate running fastest, i.e.
+        site x * Ly + y, so that the rungs of a ladder are consecutive sites.
+
+        Parameters
+        ----------
+        geometry : str
+            'chain' (shape L), 'square' or 'triangular' (shape (Lx, Ly)), or
+            'ladder' (shape L, the number of rungs). The rows of the
+            triangular lattice are shifted by half a lattice spacing in
+            alternation, so that it fits in a rectangular periodic box.
+        shape : int or tuple[int]
+            Number of sites along each dimension.
+        terms : list[list[Any]]
+            List of interaction terms, see `from_positions`.
+        pbc : bool, optional
+            Whether to use periodic boundary conditions, along the legs only
+            for a ladder. Requires an even Ly for a triangular lattice.
+            Default is False.
+        spacing : float, optional
+            Lattice spacing, defaults to 1.
+        cutoff : float, optional
+            Maximum distance of the interactions with a numeric range, see
+            `from_positions`.
 
-                # Add to the dictionary for this operator
-                new_interaction_dict[operator].extend(graph)
+        Returns
+        -------
+        LatticeGraph
+            A new LatticeGraph object with the positions of the lattice.
+        """
+        shape = tuple(int(n) for n in np.atleast_1d(shape))
+        if geometry in ('chain', 'ladder'):
+            if len(shape) != 1:
+                raise ValueError(f"A {geometry} has a shape of one length: "
+                                 f"{shape}")
+            shape = shape + ((1,) if geometry == 'chain' else (2,))
+        elif geometry in ('square', 'triangular'):
+            if len(shape) != 2:
+                raise ValueError(f"A {geometry} lattice has a shape of two "
+                                 f"lengths: {shape}")
+        else:
+            raise ValueError(f"Invalid geometry: {geometry}")
+
+        Lx, Ly = shape
+        x, y = np.divmod(np.arange(Lx * Ly), Ly)
+        if geometry == 'chain':
+            positions = x[:, np.newaxis].astype(float)
+            box = [Lx]
+        elif geometry == 'triangular':
+            if pbc and Ly % 2:
+                raise ValueError("A periodic triangular lattice requires an "
+                                 "even number of rows")
+            positions = np.stack([x + 0.5 * (y % 2), np.sqrt(3) / 2 * y],
+                                 axis=1)
+            box = [Lx, np.sqrt(3) / 2 * Ly]
+        else:
+            positions = np.stack([x, y], axis=1).astype(float)
+            box = [Lx, None if geometry == 'ladder' else Ly]
 
-        # Create a new graph with the constructed interaction dictionary
-        return cls(num_sites, new_interaction_dict)
+        box = [None if length is None else spacing * length for length in box]
+        return cls.from_positions(spacing * positions, terms,
+                                  box=box if pbc else None,
+                                  cutoff=cutoff, tol=1e-8 * spacing)
 
 
 class ComputationStrategy(ABC):
@@ -214,6 +656,9 @@ class ComputationStrategy(ABC):
         self.graph = graph
         self.spin = spin
         self.unit_cell_length = unit_cell_length
+        # unitaries of the last few matrices passed to `norm_identity_loss`,
+        # keyed by id, see `get_unitary`
+        self._unitary_cache = {}
 
     @abstractmethod
     def run_calculation(self, t: float = 0.0):
@@ -270,10 +715,67 @@ class ComputationStrategy(ABC):
         float
             The Frobenius norm of the overlap between the two matrices.
         """
-        conj_matrix1 = np.matrix(matrix1).getH()
-        product = matvec(conj_matrix1, matrix2)
-        overlap = np.abs(np.trace(product))
-        return np.sqrt(overlap)
+        return np.sqrt(np.abs(self._trace_overlap(matrix1, matrix2)))
+
+    @staticmethod
+    def _as_matrix(matrix):
+        """
+        Convert a QuSpin hamiltonian to a sparse matrix; sparse matrices are
+        returned unchanged and anything else as an array.
+        """
+        if sp.issparse(matrix):
+            return matrix
+        if hasattr(matrix, "tocsr"):
+            # quspin.operators.hamiltonian
+            return matrix.tocsr()
+        return np.asarray(matrix)
+
+    def _trace_overlap(self, matrix1, matrix2):
+        """
+        Compute Tr(matrix1^dagger matrix2) elementwise, without forming the
+        product (or densifying sparse matrices).
+        """
+        matrix1, matrix2 = self._as_matrix(matrix1), self._as_matrix(matrix2)
+        if sp.issparse(matrix1):
+            return matrix1.conj().multiply(matrix2).sum()
+        if sp.issparse(matrix2):
+            return matrix2.multiply(matrix1.conj()).sum()
+        return np.vdot(matrix1, matrix2)
+
+    def get_unitary(self, matrix):
+        """
+        Compute exp(-i matrix) of a Hermitian matrix from its
+        eigendecomposition.
+
+        The unitaries of the last few matrices are cached by identity (the
+        cache keeps a reference to each matrix), so a fixed target is only
+        decomposed once across repeated loss evaluations. Matrices must not
+        be modified in place after being passed.
+
+        Parameters
+        ----------
+        matrix : quspin hamiltonian, sparse matrix or np.ndarray
+            A Hamiltonian times evolution time.
+
+        Returns
+        -------
+        np.ndarray
+            The unitary exp(-i matrix).
+        """
+        key = id(matrix)
+        cached = self._unitary_cache.pop(key, None)
+        if cached is None or cached[0] is not matrix:
+            dense = self._as_matrix(matrix)
+            if sp.issparse(dense):
+                dense = dense.toarray()
+            energies, vectors = np.linalg.eigh(dense)
+            cached = (matrix, (vectors * np.exp(-1j * energies)) @
+                      vectors.conj().T)
+            if len(self._unitary_cache) >= 8:
+                # least recently used
+                self._unitary_cache.pop(next(iter(self._unitary_cache)))
+        self._unitary_cache[key] = cached
+        return cached[1]
 
     def norm_identity_loss(self, matrix1: list[list[Any]],
                            matrix2: list[list[Any]]):
@@ -294,33 +796,257 @@ class ComputationStrategy(ABC):
         float
             The norm difference between the product of the two unitaries and the
             identity.
+
+        Notes
+        -----
+        The unitaries are computed with `get_unitary` (one eigendecomposition
+        per Hermitian matrix, cached for repeated arguments such as a fixed
+        target), and ||U1^dagger U2 - 1||_F is evaluated as the equal
+        ||U2 - U1||_F, which avoids the matrix product.
         """
-        unitary1 = expm(-1j * matrix1)
-        unitary2 = expm(-1j * matrix2)
-        conj_unitary1 = np.matrix(unitary1).getH()
-        product = matvec(conj_unitary1, unitary2)
-        identity = np.identity(product.shape[0])
-        diff = product - identity
-        conj_diff = np.matrix(diff).getH()
-        norm = np.sqrt(np.abs(np.trace(matvec(conj_diff, diff))))
-        return norm
+        return np.linalg.norm(self.get_unitary(matrix2) -
+                              self.get_unitary(matrix1))
+
+
+# arrays shared with the worker processes of `DiagonEngine.sweep_floquet`
+_SWEEP_ARRAYS = {}
+
+
+def _attach_sweep_arrays(specs: dict):
+    """
+    Attach the shared memory blocks of a Floquet sweep in a worker process.
+    """
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _SWEEP_ARRAYS[key] = (block, np.ndarray(shape, dtype=dtype,
+                                                buffer=block.buf))
+
+
+def _sweep_losses(loss: str, matrix, target):
+    """
+    Compute a loss of `DiagonEngine` between two dense Hermitian matrices.
+    """
+    if loss == "frobenius_loss":
+        overlap = np.sqrt(np.abs(np.vdot(matrix, target)))
+        norm = np.sqrt(np.sqrt(np.abs(np.vdot(matrix, matrix))) *
+                       np.sqrt(np.abs(np.vdot(target, target))))
+        return 1 - overlap / norm
+    if loss == "norm_identity_loss":
+        unitaries = []
+        for hermitian in (matrix, target):
+            energies, vectors = np.linalg.eigh(hermitian)
+            unitaries.append((vectors * np.exp(-1j * energies)) @
+                             vectors.conj().T)
+        return np.linalg.norm(unitaries[1] - unitaries[0])
+    raise ValueError(f"Invalid loss: {loss}")
+
+
+def _sweep_floquet_chunk(chunk: list, loss: str = None,
+                         return_hamiltonians: bool = False):
+    """
+    Evaluate the Floquet Hamiltonians (and losses) of a chunk of candidate
+    sequences from the shared step eigendecompositions.
+    """
+    energies = _SWEEP_ARRAYS["energies"][1]
+    vectors = _SWEEP_ARRAYS["vectors"][1]
+    target = _SWEEP_ARRAYS["target"][1] if "target" in _SWEEP_ARRAYS else None
+    results = []
+    for steps, durations, period in chunk:
+        unitary = np.identity(energies.shape[1], dtype=np.complex128)
+        for k, tau in zip(steps, durations):
+            unitary = (vectors[k] * np.exp(-1j * tau * energies[k])) @ (
+                vectors[k].conj().T @ unitary)
+        HF = 1j / period * logm(unitary)
+        results.append((None if target is None else
+                        _sweep_losses(loss, HF, target),
+                        HF if return_hamiltonians else None))
+    return results
 
 
 class DiagonEngine(ComputationStrategy):
-    def get_quspin_hamiltonian(self, t: float):
+    def __init__(self, graph: LatticeGraph, spin='1/2',
+                 unit_cell_length: int = 1):
+        """
+        Initialize the DiagonEngine. The QuSpin basis and the sparse operator
+        of every interaction term are built on first use and cached, so that
+        Hamiltonians at any time or step label are assembled as a
+        coefficient-weighted sum of cached matrices.
+
+        Parameters
+        ----------
+        graph : LatticeGraph
+            The graph containing the interaction terms and lattice structure.
+        spin : str, optional
+            The spin of the particles in the lattice, defaults to '1/2'.
+        unit_cell_length : int, optional
+            The number of lattice sites in the unit cell, defaults to 1.
+        """
+        super().__init__(graph, spin=spin, unit_cell_length=unit_cell_length)
+        self.basis = None
+        # bases and term operators per symmetry sector, keyed by
+        # `sector_key`; the full space has the key ()
+        self._bases = {}
+        self._term_operators = {}
+        self._step_eigensystems = {}
+
+    @staticmethod
+    def sector_key(sector: dict = None):
+        """
+        Hashable key of a symmetry sector, e.g. (('Nup', 2), ('kblock', 0)).
+        """
+        return tuple(sorted((sector or {}).items()))
+
+    def get_basis(self, sector: dict = None):
+        """
+        Get the QuSpin basis of the spin chain, building it on first use.
+
+        Parameters
+        ----------
+        sector : dict, optional
+            Symmetry sector as keyword arguments of `spin_basis_1d`, e.g.
+            {'Nup': 2, 'kblock': 0}. Defaults to the full Hilbert space.
+
+        Returns
+        -------
+        quspin.basis.spin_basis_1d
+            The basis of states for the spin chain.
+        """
+        from quspin.basis import spin_basis_1d
+
+        key = self.sector_key(sector)
+        if key not in self._bases:
+            # Declare a basis of states for the spin chain
+            self._bases[key] = spin_basis_1d(L=self.graph.num_sites,
+                                             a=self.unit_cell_length,
+                                             S=self.spin, **dict(key))
+        if not key:
+            self.basis = self._bases[key]
+        return self._bases[key]
+
+    def get_term_operators(self, sector: dict = None):
+        """
+        Get the sparse operators of all interaction terms of the graph.
+
+        Every term of `graph.compile()` is converted once into its matrix
+        elements in the basis. The elements of all terms are concatenated in
+        coordinate format, with the index of the term each element belongs
+        to, so that a Hamiltonian is assembled with a single vectorized
+        weighting. In a translation sector the elements of a single term are
+        those of its symmetrized form, which is exact for the (invariant)
+        weighted sum.
+
+        Parameters
+        ----------
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        term_operators : tuple
+            (matrix_elements, rows, cols, term_index) arrays; term_index
+            refers to the terms of all operators in `graph.compile()` order.
+        """
+        key = self.sector_key(sector)
+        if key in self._term_operators:
+            return self._term_operators[key]
+
+        basis = self.get_basis(sector)
+        matrix_elements, rows, cols, term_index = [], [], [], []
+        offset = 0
+        for op, (sites, _) in self.graph.compile().items():
+            for k, site in enumerate(sites.tolist()):
+                ME, row, col = basis.Op(op, site, 1.0, np.complex128)
+                matrix_elements.append(ME)
+                rows.append(row)
+                cols.append(col)
+                term_index.append(np.full(len(ME), offset + k))
+            offset += len(sites)
+
+        self._term_operators[key] = tuple(
+            np.concatenate(arrays) if arrays else np.zeros(0)
+            for arrays in (matrix_elements, rows, cols, term_index))
+        return self._term_operators[key]
+
+    def get_sparse_hamiltonian(self, t: float, sector: dict = None):
+        """
+        Assemble the Hamiltonian at time `t` as a sparse matrix from the
+        cached term operators.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The Hamiltonian in the basis of `get_basis`.
+        """
+        matrix_elements, rows, cols, term_index = self.get_term_operators(
+            sector)
+        coefficients = self.graph.coefficients(t)
+        coefficients = np.concatenate(
+            [np.reshape(coefficients[op], -1) for op in
+             self.graph.compile()] or [np.zeros(0)])
+        num_states = self.get_basis(sector).Ns
+        return sp.coo_matrix(
+            (matrix_elements * coefficients[term_index.astype(int)],
+             (rows, cols)), shape=(num_states, num_states)).tocsr()
+
+    def get_operator_hamiltonians(self, t: float, sector: dict = None):
+        """
+        Split the Hamiltonian at time `t` into the contributions of each
+        operator string, from the cached term operators.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each operator string of `graph.compile()` to
+            a scipy.sparse.csr_matrix; the matrices sum to
+            `get_sparse_hamiltonian(t, sector)`.
+        """
+        matrix_elements, rows, cols, term_index = self.get_term_operators(
+            sector)
+        term_index = term_index.astype(int)
+        coefficients = self.graph.coefficients(t)
+        num_states = self.get_basis(sector).Ns
+        hamiltonians = {}
+        offset = 0
+        for op, (sites, _) in self.graph.compile().items():
+            mask = (term_index >= offset) & (term_index < offset + len(sites))
+            weights = np.reshape(coefficients[op], -1)[term_index[mask] -
+                                                       offset]
+            hamiltonians[op] = sp.coo_matrix(
+                (matrix_elements[mask] * weights, (rows[mask], cols[mask])),
+                shape=(num_states, num_states)).tocsr()
+            offset += len(sites)
+        return hamiltonians
+
+    def get_quspin_hamiltonian(self, t: float, sector: dict = None):
         """
         Construct the Hamiltonian for the spin chain using QuSpin.
 
         This method generates the Hamiltonian for the spin chain system
         at a given time `t`, formatted for use with the QuSpin library.
-        It utilizes the spin_basis_1d to declare the basis of states
-        and constructs the Hamiltonian using the interaction terms
-        provided by the graph at time `t`.
+        The matrix is assembled from the cached term operators (see
+        `get_sparse_hamiltonian`) and wrapped in a QuSpin hamiltonian on the
+        cached basis.
 
         Parameters
         ----------
         t : float
             Time at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
 
         Returns
         -------
@@ -328,24 +1054,82 @@ class DiagonEngine(ComputationStrategy):
             The Hamiltonian object in QuSpin format for the current
             spin chain configuration.
         """
-        # Declare a basis of states for the spin chain
-        self.basis = spin_basis_1d(L=self.graph.num_sites,
-                                   a=self.unit_cell_length,
-                                   S=self.spin)
-        # Put our Hamiltonian into QuSpin format
-        static = [[key, self.graph(t)[key]] for key in self.graph(t).keys()]
+        from quspin.operators import hamiltonian
+
         # Create QuSpin Hamiltonian, suppressing annoying print statements
-        # TODO: is this multiplying my operators by 2?
         with HiddenPrints():
-            H = quspin.operators.hamiltonian(static, [], basis=self.basis)
+            H = hamiltonian(
+                [self.get_sparse_hamiltonian(t, sector)], [],
+                basis=self.get_basis(sector))
 
         return H
 
+    def get_symmetry_sectors(self, params: list[float or str],
+                             tol: float = 1e-12):
+        """
+        Detect the symmetries shared by the Hamiltonians at all `params` and
+        enumerate the corresponding symmetry sectors.
+
+        Total magnetization is used if every Hamiltonian conserves it (see
+        `LatticeGraph.conserves_magnetization`), and lattice momentum if every
+        Hamiltonian is invariant under translation by `unit_cell_length`
+        sites (periodic chains only).
+
+        Parameters
+        ----------
+        params : list[float or str]
+            List of times or step labels of the Floquet sequence.
+        tol : float, optional
+            Absolute tolerance on the coefficients, defaults to 1e-12.
+
+        Returns
+        -------
+        list[dict]
+            Sectors as keyword arguments of `spin_basis_1d`. A single empty
+            sector (the full space) is returned if no symmetry is found.
+        """
+        num_sites = self.graph.num_sites
+        magnetization = all(self.graph.conserves_magnetization(t, tol=tol)
+                            for t in params)
+        translation = all(self.graph.is_translation_invariant(
+            t, shift=self.unit_cell_length, tol=tol) for t in params)
+
+        sectors = [{}]
+        if magnetization:
+            max_up = int(2 * Fraction(self.spin) * num_sites)
+            sectors = [dict(sector, Nup=n) for sector in sectors
+                       for n in range(max_up + 1)]
+        if translation:
+            sectors = [dict(sector, kblock=k) for sector in sectors
+                       for k in range(num_sites // self.unit_cell_length)]
+        return sectors
+
+    def get_block_hamiltonians(self, t: float, sectors: list[dict]):
+        """
+        Construct the Hamiltonian at time `t` in each symmetry sector.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+        sectors : list[dict]
+            Symmetry sectors, see `get_symmetry_sectors`.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping `sector_key(sector)` to the QuSpin Hamiltonian
+            of each non-empty sector.
+        """
+        return {self.sector_key(sector): self.get_quspin_hamiltonian(t, sector)
+                for sector in sectors if self.get_basis(sector).Ns > 0}
+
     def run_calculation(self, t: float = 0.0):
         raise NotImplementedError
 
     def get_quspin_floquet_hamiltonian(self, params: list[float or str],
-                                       dt_list: list[float]):
+                                       dt_list: list[float],
+                                       sector: dict = None):
         """
         Construct a Floquet Hamiltonian using QuSpin for the current graph.
 
@@ -357,16 +1141,20 @@ class DiagonEngine(ComputationStrategy):
             Durations of each time step in the Floquet period. Set dt=0 for a
             delta pulse (make sure you've integrated the Hamiltonian to
             accrue the proper amount of phase)
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
 
         Returns
         -------
         quspin.operators.floquet
             The Floquet Hamiltonian constructed using the given parameters.
         """
+        from quspin.tools.Floquet import Floquet
+
         if len(params) != len(dt_list):
             raise ValueError("paramList and dtList must have the same length")
 
-        H_list = [self.get_quspin_hamiltonian(t) for t in params]
+        H_list = [self.get_quspin_hamiltonian(t, sector) for t in params]
         floquet_period = sum(dt_list)
         # if there are elements value 0 in dtList (indicating a delta pulse),
         # replace them with 1 for QuSpin's integrator
@@ -379,83 +1167,1361 @@ class DiagonEngine(ComputationStrategy):
 
         return results.HF
 
-    def frobenius_loss(self, matrix1, matrix2):
+    def get_block_floquet_hamiltonians(self, params: list[float or str],
+                                       dt_list: list[float],
+                                       sectors: list[dict] = None):
         """
-        Compute the Frobenius loss between two matrices.
+        Construct the Floquet Hamiltonian block by block in the symmetry
+        sectors shared by all steps of the sequence.
+
+        Only the blocks are ever stored, so chains whose full Floquet
+        Hamiltonian does not fit in memory can still be treated as long as
+        the largest block does. The blocks can be passed directly to the loss
+        functions, e.g. together with `get_block_hamiltonians` for a target.
 
         Parameters
         ----------
-        matrix1 : quspin.operators.hamiltonian or np.ndarray
-            The first matrix.
-        matrix2 : quspin.operators.hamiltonian or np.ndarray
-            The second matrix.
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step in the Floquet period, see
+            `get_quspin_floquet_hamiltonian`.
+        sectors : list[dict], optional
+            Symmetry sectors to use. Defaults to the sectors detected by
+            `get_symmetry_sectors`.
 
         Returns
         -------
-        float
-            The Frobenius loss between the two matrices.
+        dict
+            Dictionary mapping `sector_key(sector)` to the Floquet Hamiltonian
+            of each non-empty sector.
         """
-        if isinstance(matrix1, quspin.operators.hamiltonian):
-            matrix1 = matrix1.todense()
-        if isinstance(matrix2, quspin.operators.hamiltonian):
-            matrix2 = matrix2.todense()
+        if sectors is None:
+            sectors = self.get_symmetry_sectors(params)
+        return {self.sector_key(sector): self.get_quspin_floquet_hamiltonian(
+            params, dt_list, sector) for sector in sectors
+            if self.get_basis(sector).Ns > 0}
 
-        return super().frobenius_loss(matrix1, matrix2)
-
-    def frobenius_norm(self, matrix1, matrix2):
+    def get_step_eigensystem(self, t: float, sector: dict = None):
         """
-        Compute the Frobenius norm between two matrices.
+        Get the (cached) eigendecomposition of the Hamiltonian at time `t`,
+        from which the unitary of a step of any duration follows as
+        V exp(-i E dt) V^dagger.
 
         Parameters
         ----------
-        matrix1 : quspin.operators.hamiltonian or np.ndarray
-            The first matrix.
-        matrix2 : quspin.operators.hamiltonian or np.ndarray
-            The second matrix.
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
 
         Returns
         -------
-        float
-            The Frobenius norm between the two matrices.
+        energies : np.ndarray
+            The eigenvalues of the Hamiltonian.
+        vectors : np.ndarray
+            The eigenvectors, in columns.
         """
-        if isinstance(matrix1, quspin.operators.hamiltonian):
-            matrix1 = matrix1.todense()
-        if isinstance(matrix2, quspin.operators.hamiltonian):
-            matrix2 = matrix2.todense()
-
-        return super().frobenius_norm(matrix1, matrix2)
-
-    def norm_identity_loss(self, matrix1, matrix2):
+        key = (t, self.sector_key(sector))
+        if key not in self._step_eigensystems:
+            self._step_eigensystems[key] = np.linalg.eigh(
+                self.get_sparse_hamiltonian(t, sector).toarray())
+        return self._step_eigensystems[key]
+
+    def sweep_floquet(self, params_list: list, dt_lists: list[list[float]],
+                      target=None, loss: str = "frobenius_loss",
+                      n_jobs: int = 1, chunk_size: int = 16,
+                      return_hamiltonians: bool = False,
+                      sector: dict = None):
         """
-        Compute the norm identity loss between two matrices.
+        Evaluate the Floquet Hamiltonians of many candidate sequences, and
+        optionally their losses with respect to a target Hamiltonian.
 
-        This method calculates a fidelity metric between two matrices using a
-        norm identity approach. It converts the matrices to dense format if they
-        are instances of `quspin.operators.hamiltonian` before computing the loss.
+        The Hamiltonian of every distinct step label is diagonalized once;
+        the eigendecompositions (and the target) are placed in shared memory
+        and the candidates are distributed in chunks over a process pool.
+        Each Floquet Hamiltonian is computed as i / T logm(U_F), as in
+        `get_quspin_floquet_hamiltonian`, with U_F the product of the step
+        unitaries.
 
         Parameters
         ----------
-        matrix1 : quspin.operators.hamiltonian or np.ndarray
-            The first matrix.
-        matrix2 : quspin.operators.hamiltonian or np.ndarray
-            The second matrix.
+        params_list : list
+            Step labels of the candidates: a list of labels shared by all
+            candidates, or one list of labels per candidate.
+        dt_lists : list[list[float]]
+            Durations of the steps of each candidate, see
+            `get_quspin_floquet_hamiltonian`.
+        target : quspin.operators.hamiltonian or np.ndarray, optional
+            Target Hamiltonian of the losses. Defaults to None, in which case
+            only the Floquet Hamiltonians are returned.
+        loss : str, optional
+            'frobenius_loss' (default) or 'norm_identity_loss', evaluated as
+            `loss(HF, target)`.
+        n_jobs : int, optional
+            Number of worker processes, -1 for all CPUs. Defaults to 1, which
+            evaluates the candidates in the current process.
+        chunk_size : int, optional
+            Number of candidates per task, defaults to 16.
+        return_hamiltonians : bool, optional
+            Also return the Floquet Hamiltonians when a target is given,
+            defaults to False.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
 
         Returns
         -------
-        float
-            The norm identity loss between the two matrices.
+        losses : np.ndarray or None
+            The loss of each candidate, None if no target is given.
+        hamiltonians : list[np.ndarray] or None
+            The Floquet Hamiltonian of each candidate, None if not requested.
+        """
+        if loss not in ("frobenius_loss", "norm_identity_loss"):
+            raise ValueError(f"Invalid loss: {loss}")
+        if len(params_list) > 0 and not isinstance(params_list[0],
+                                                   (list, tuple)):
+            params_list = [params_list] * len(dt_lists)
+        if len(params_list) != len(dt_lists):
+            raise ValueError("params_list and dt_lists must have the same "
+                             "length")
+
+        labels = list(dict.fromkeys(t for params in params_list
+                                    for t in params))
+        index = {t: k for k, t in enumerate(labels)}
+        candidates = []
+        for params, dt_list in zip(params_list, dt_lists):
+            if len(params) != len(dt_list):
+                raise ValueError("paramList and dtList must have the same "
+                                 "length")
+            candidates.append(([index[t] for t in params],
+                               [dt if dt > 0 else 1 for dt in dt_list],
+                               sum(dt_list)))
+        chunks = [candidates[i:i + chunk_size]
+                  for i in range(0, len(candidates), chunk_size)]
+
+        eigensystems = [self.get_step_eigensystem(t, sector) for t in labels]
+        arrays = {"energies": np.stack([e for e, _ in eigensystems]),
+                  "vectors": np.stack([v for _, v in eigensystems])}
+        if target is not None:
+            target = self._as_matrix(target)
+            arrays["target"] = (target.toarray() if sp.issparse(target) else
+                                target).astype(np.complex128)
+        return_hamiltonians = return_hamiltonians or target is None
+        evaluate = partial(_sweep_floquet_chunk, loss=loss,
+                           return_hamiltonians=return_hamiltonians)
+
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        if n_jobs == 1:
+            _SWEEP_ARRAYS.update({key: (None, array) for key, array in
+                                  arrays.items()})
+            try:
+                results = [evaluate(chunk) for chunk in chunks]
+            finally:
+                _SWEEP_ARRAYS.clear()
+        else:
+            blocks, specs = [], {}
+            try:
+                for key, array in arrays.items():
+                    block = shared_memory.SharedMemory(
+                        create=True, size=max(array.nbytes, 1))
+                    blocks.append(block)
+                    np.ndarray(array.shape, dtype=array.dtype,
+                               buffer=block.buf)[...] = array
+                    specs[key] = (block.name, array.shape, array.dtype)
+                with ProcessPoolExecutor(max_workers=n_jobs,
+                                         initializer=_attach_sweep_arrays,
+                                         initargs=(specs,)) as executor:
+                    results = list(executor.map(evaluate, chunks))
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+
+        results = [result for chunk in results for result in chunk]
+        losses = (np.array([result[0] for result in results])
+                  if target is not None else None)
+        hamiltonians = ([result[1] for result in results]
+                        if return_hamiltonians else None)
+        return losses, hamiltonians
+
+    def get_magnus_floquet_hamiltonian(self, params: list[float or str],
+                                       dt_list: list[float], order: int = 2,
+                                       sector: dict = None,
+                                       toggling_frame: bool = True):
         """
-        if isinstance(matrix1, quspin.operators.hamiltonian):
-            matrix1 = matrix1.todense()
-        if isinstance(matrix2, quspin.operators.hamiltonian):
-            matrix2 = matrix2.todense()
+        Approximate the Floquet Hamiltonian by its Magnus (average
+        Hamiltonian) expansion, computed from the sparse step Hamiltonians
+        with commutators only.
+
+        The exponents X_k = -i H_k dt_k of the steps are combined one by one
+        with the Baker-Campbell-Hausdorff series, truncated at `order` in
+        the durations. The zeroth, first and second order corrections are the
+        average Hamiltonian, the commutators [H_k, H_l] and the nested
+        commutators, so that the error of the result scales as
+        (||H|| T)^order / T. Only sparse matrix products are needed, which
+        makes the second order expansion suitable for sweeps over chains
+        that are too large for `get_quspin_floquet_hamiltonian`.
 
-        return super().norm_identity_loss(matrix1, matrix2)
+        Parameters
+        ----------
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step in the Floquet period, see
+            `get_quspin_floquet_hamiltonian`.
+        order : int, optional
+            Order of the expansion, 1, 2 (default) or 3.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+        toggling_frame : bool, optional
+            Treat the delta pulses (dt=0) exactly by expanding in the frame
+            rotating with the pulses, which requires them to multiply to the
+            identity (up to a global phase) over a period. Defaults to True;
+            if False, the pulses enter the expansion like any other step,
+            which is only accurate for small pulse areas.
 
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The approximate Floquet Hamiltonian.
+        """
+        from scipy.sparse.linalg import expm
 
-class DMRGEngine(ComputationStrategy):
-    def run_calculation(self, t: float = 0.0):
-        raise NotImplementedError
+        if len(params) != len(dt_list):
+            raise ValueError("paramList and dtList must have the same length")
+        if order not in (1, 2, 3):
+            raise ValueError(f"Invalid order: {order}")
+        floquet_period = sum(dt_list)
+        if floquet_period <= 0:
+            raise ValueError("The Floquet period must be positive")
+
+        def commutator(A, B):
+            return (A @ B - B @ A).tocsr()
+
+        num_states = self.get_basis(sector).Ns
+        frame = sp.identity(num_states, dtype=np.complex128, format="csr")
+        terms = [sp.csr_matrix((num_states, num_states), dtype=np.complex128)
+                 for _ in range(order)]
+        for t, dt in zip(params, dt_list):
+            H = self.get_sparse_hamiltonian(t, sector)
+            if dt <= 0 and toggling_frame:
+                # pulses of (diagonal) fields are exponentiated elementwise
+                if H.count_nonzero() == np.count_nonzero(H.diagonal()):
+                    pulse = sp.diags(np.exp(-1j * H.diagonal()))
+                else:
+                    pulse = expm(-1j * H.tocsc())
+                frame = (pulse @ frame).tocsr()
+                continue
+            X = -1j * (dt if dt > 0 else 1) * H
+            if dt > 0 and toggling_frame:
+                X = (frame.conj().T @ X @ frame).tocsr()
+            # BCH series of log(exp(X) exp(Z)), grouped by order
+            Z = terms
+            terms = [X + Z[0]]
+            if order > 1:
+                terms.append(Z[1] + commutator(X, Z[0]) / 2)
+            if order > 2:
+                terms.append(Z[2] + commutator(X, Z[1]) / 2 + (
+                    commutator(X, commutator(X, Z[0])) +
+                    commutator(Z[0], commutator(Z[0], X))) / 12)
+        # a global phase of the pulses only shifts the quasienergies
+        phase = frame.diagonal()[0] if num_states > 0 else 1
+        if np.abs((frame - phase * sp.identity(num_states)).data).max(
+                initial=0) > 1e-8:
+            raise ValueError("The delta pulses do not multiply to the "
+                             "identity, use toggling_frame=False")
+        return (1j / floquet_period * sum(terms) - np.angle(phase) /
+                floquet_period * sp.identity(num_states)).tocsr()
+
+    def get_magnus_errors(self, params: list[float or str],
+                          dt_list: list[float], orders: list[int] = (1, 2, 3),
+                          sector: dict = None, toggling_frame: bool = True):
+        """
+        Estimate the error of the Magnus expansion by comparing it with the
+        exact Floquet Hamiltonian, which requires diagonalizing the step
+        Hamiltonians and is therefore limited to small systems. The exact
+        Floquet Hamiltonian is only defined up to multiples of 2 pi / T in
+        its quasienergies, so the comparison is meaningful when the
+        expansion converges, i.e. for ||H|| T < pi.
+
+        Parameters
+        ----------
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step in the Floquet period, see
+            `get_quspin_floquet_hamiltonian`.
+        orders : list[int], optional
+            Orders of the expansion to compare, defaults to (1, 2, 3).
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+        toggling_frame : bool, optional
+            See `get_magnus_floquet_hamiltonian`.
+
+        Returns
+        -------
+        np.ndarray
+            The Frobenius norm of the difference between the expansion and
+            the exact Floquet Hamiltonian, for each order.
+        """
+        exact = self.sweep_floquet([params], [dt_list], sector=sector)[1][0]
+        return np.array([np.linalg.norm(
+            self.get_magnus_floquet_hamiltonian(
+                params, dt_list, order, sector, toggling_frame).toarray() -
+            exact) for order in orders])
+
+    @staticmethod
+    def _check_blocks(matrix1, matrix2):
+        """
+        Check that two block-diagonal matrices share the same sectors.
+        """
+        if not (isinstance(matrix1, dict) and isinstance(matrix2, dict)):
+            raise ValueError("both matrices must be given as blocks")
+        if matrix1.keys() != matrix2.keys():
+            raise ValueError("matrices must be given in the same sectors")
+
+    @staticmethod
+    def _gaussian_states(rng, num_states: int, num_samples: int):
+        """
+        Complex Gaussian states of unit variance per entry, one per column.
+        """
+        shape = (num_states, num_samples)
+        return (rng.standard_normal(shape) +
+                1j * rng.standard_normal(shape)) / np.sqrt(2)
+
+    def frobenius_loss(self, matrix1, matrix2):
+        """
+        Compute the Frobenius loss between two matrices.
+
+        Parameters
+        ----------
+        matrix1 : quspin.operators.hamiltonian, np.ndarray or dict
+            The first matrix, or its blocks per symmetry sector.
+        matrix2 : quspin.operators.hamiltonian, np.ndarray or dict
+            The second matrix, or its blocks in the same sectors.
+
+        Returns
+        -------
+        float
+            The Frobenius loss between the two matrices.
+        """
+        if not isinstance(matrix1, dict):
+            matrix1 = self._as_matrix(matrix1)
+        if not isinstance(matrix2, dict):
+            matrix2 = self._as_matrix(matrix2)
+
+        return super().frobenius_loss(matrix1, matrix2)
+
+    def frobenius_norm(self, matrix1, matrix2):
+        """
+        Compute the Frobenius norm between two matrices.
+
+        Parameters
+        ----------
+        matrix1 : quspin.operators.hamiltonian, np.ndarray or dict
+            The first matrix, or its blocks per symmetry sector.
+        matrix2 : quspin.operators.hamiltonian, np.ndarray or dict
+            The second matrix, or its blocks in the same sectors.
+
+        Returns
+        -------
+        float
+            The Frobenius norm between the two matrices.
+        """
+        if isinstance(matrix1, dict) or isinstance(matrix2, dict):
+            # the trace of a block-diagonal product is the sum over blocks
+            self._check_blocks(matrix1, matrix2)
+            overlap = sum(self._trace_overlap(matrix1[key], matrix2[key])
+                          for key in matrix1)
+            return np.sqrt(np.abs(overlap))
+
+        return super().frobenius_norm(matrix1, matrix2)
+
+    def norm_identity_loss(self, matrix1, matrix2, num_samples: int = None,
+                           seed=None):
+        """
+        Compute the norm identity loss between two matrices.
+
+        This method calculates a fidelity metric between two matrices using a
+        norm identity approach. By default the unitaries are computed exactly
+        (see `ComputationStrategy.norm_identity_loss`). For large dimensions,
+        `num_samples` switches to a trace estimator: the mean of
+        ||(U2 - U1) z||^2 over random states z, with the action of the
+        unitaries on z computed from the sparse matrices with
+        `expm_multiply` (Hutchinson estimator).
+
+        Parameters
+        ----------
+        matrix1 : quspin hamiltonian, sparse matrix, np.ndarray or dict
+            The first matrix, or its blocks per symmetry sector.
+        matrix2 : quspin hamiltonian, sparse matrix, np.ndarray or dict
+            The second matrix, or its blocks in the same sectors.
+        num_samples : int, optional
+            Number of random states of the trace estimator. Defaults to None,
+            for the exact loss.
+        seed : int or np.random.Generator, optional
+            Seed of the random states, defaults to None.
+
+        Returns
+        -------
+        float
+            The norm identity loss between the two matrices.
+        """
+        if isinstance(matrix1, dict) or isinstance(matrix2, dict):
+            self._check_blocks(matrix1, matrix2)
+            rng = np.random.default_rng(seed)
+            return np.sqrt(sum(self.norm_identity_loss(
+                matrix1[key], matrix2[key], num_samples, rng) ** 2
+                               for key in matrix1))
+        if num_samples is None:
+            return super().norm_identity_loss(matrix1, matrix2)
+
+        matrix1, matrix2 = self._as_matrix(matrix1), self._as_matrix(matrix2)
+        z = self._gaussian_states(np.random.default_rng(seed),
+                                  matrix1.shape[0], num_samples)
+        diff = (expm_multiply(-1j * matrix2, z) -
+                expm_multiply(-1j * matrix1, z))
+        return np.sqrt(np.mean(np.sum(np.abs(diff) ** 2, axis=0)))
+
+
+class PauliBasis:
+    def __init__(self, L: int, Nup: int = None):
+        """
+        Basis of spin-1/2 product states stored as integers, with the
+        ordering and operator conventions of QuSpin's spin_basis_1d: site i
+        is bit L - 1 - i (set for spin up), states are sorted in decreasing
+        order, and operator strings act with Pauli matrices.
+
+        Parameters
+        ----------
+        L : int
+            Number of sites.
+        Nup : int, optional
+            Restrict to states with `Nup` up spins. Defaults to None (all
+            states).
+        """
+        self.L = L
+        self.Nup = Nup
+        states = np.arange(2 ** L, dtype=np.int64)[::-1]
+        if Nup is not None:
+            counts = np.zeros(len(states), dtype=np.int64)
+            for bit in range(L):
+                counts += (states >> bit) & 1
+            states = states[counts == Nup]
+        self.states = states
+        self.Ns = len(states)
+
+    def index(self, states):
+        """
+        Get the basis indices of integer states; states outside the basis
+        get the index -1.
+        """
+        states = np.asarray(states, dtype=np.int64)
+        if self.Nup is None:
+            return 2 ** self.L - 1 - states
+        ascending = self.states[::-1]
+        position = np.searchsorted(ascending, states)
+        found = ascending[np.minimum(position, self.Ns - 1)] == states
+        return np.where(found, self.Ns - 1 - position, -1)
+
+    def Op(self, opstr: str, indx: list[int], J, dtype):
+        """
+        Compute the matrix elements of J times an operator string, in the
+        format of QuSpin's `basis.Op`.
+
+        Parameters
+        ----------
+        opstr : str
+            Operator string made of 'x', 'y', 'z', '+', '-' and 'I'.
+        indx : list[int]
+            Site of each operator.
+        J : float or complex
+            Coupling.
+        dtype : np.dtype
+            Data type of the matrix elements.
+
+        Returns
+        -------
+        ME : np.ndarray
+            The non-zero matrix elements.
+        row : np.ndarray
+            Their row indices.
+        col : np.ndarray
+            Their column indices.
+        """
+        if len(opstr) != len(indx):
+            raise ValueError(f"Operator string {opstr} requires "
+                             f"{len(opstr)} site indices")
+        states = self.states.copy()
+        ME = np.full(self.Ns, J, dtype=dtype)
+        # the rightmost operator acts first
+        for op, site in zip(opstr[::-1], indx[::-1]):
+            mask = np.int64(1) << (self.L - 1 - site)
+            up = (states & mask) != 0
+            if op == 'z':
+                ME *= np.where(up, 1, -1)
+            elif op == 'x':
+                states ^= mask
+            elif op == 'y':
+                ME *= np.where(up, 1j, -1j)
+                states ^= mask
+            elif op == '+':
+                # sigma^+ = sigma^x + i sigma^y
+                ME *= 2 * ~up
+                states |= mask
+            elif op == '-':
+                ME *= 2 * up
+                states &= ~mask
+            elif op != 'I':
+                raise ValueError(f"Invalid operator: {op}")
+        row = self.index(states)
+        keep = (ME != 0) & (row >= 0)
+        return ME[keep], row[keep], np.arange(self.Ns)[keep]
+
+
+class SparseEngine(DiagonEngine):
+    def __init__(self, graph: LatticeGraph, spin='1/2',
+                 unit_cell_length: int = 1):
+        """
+        Initialize the SparseEngine, a QuSpin-free version of `DiagonEngine`.
+        Term operators are computed by bit manipulation on the integer basis
+        states (see `PauliBasis`) in the ordering of QuSpin, so the sparse
+        Hamiltonians, step eigendecompositions, sweeps and losses of
+        `DiagonEngine` are available without importing QuSpin.
+
+        Parameters
+        ----------
+        graph : LatticeGraph
+            The graph containing the interaction terms and lattice structure.
+        spin : str, optional
+            The spin of the particles in the lattice, only '1/2' is
+            supported.
+        unit_cell_length : int, optional
+            The number of lattice sites in the unit cell, defaults to 1.
+        """
+        if spin != '1/2':
+            raise ValueError("SparseEngine only supports spin '1/2'")
+        super().__init__(graph, spin=spin, unit_cell_length=unit_cell_length)
+        # QuSpin bases of `get_quspin_hamiltonian`, built on first use
+        self._quspin_bases = {}
+
+    def get_basis(self, sector: dict = None):
+        """
+        Get the basis of the spin chain, building it on first use.
+
+        Parameters
+        ----------
+        sector : dict, optional
+            Magnetization sector {'Nup': n}. Defaults to the full Hilbert
+            space.
+
+        Returns
+        -------
+        PauliBasis
+            The basis of states for the spin chain.
+        """
+        key = self.sector_key(sector)
+        if key not in self._bases:
+            if set(dict(key)) - {'Nup'}:
+                raise ValueError(f"SparseEngine only supports 'Nup' sectors: "
+                                 f"{sector}")
+            self._bases[key] = PauliBasis(self.graph.num_sites, **dict(key))
+        if not key:
+            self.basis = self._bases[key]
+        return self._bases[key]
+
+    def get_symmetry_sectors(self, params: list[float or str],
+                             tol: float = 1e-12):
+        """
+        Enumerate the magnetization sectors if all Hamiltonians at `params`
+        conserve total Sz (translation sectors are not supported), see
+        `DiagonEngine.get_symmetry_sectors`.
+        """
+        if all(self.graph.conserves_magnetization(t, tol=tol)
+               for t in params):
+            return [{'Nup': n} for n in range(self.graph.num_sites + 1)]
+        return [{}]
+
+    def get_quspin_hamiltonian(self, t: float, sector: dict = None):
+        """
+        Wrap the sparse Hamiltonian at time `t` in a QuSpin hamiltonian, for
+        interoperability with QuSpin's tools (e.g. the inherited
+        `get_quspin_floquet_hamiltonian`). QuSpin is imported on first use;
+        its `spin_basis_1d` has the same ordering as `PauliBasis`.
+
+        Parameters
+        ----------
+        t : float
+            Time at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        quspin.operators.hamiltonian
+            The Hamiltonian object in QuSpin format.
+        """
+        from quspin.basis import spin_basis_1d
+        from quspin.operators import hamiltonian
+
+        H = self.get_sparse_hamiltonian(t, sector)
+        key = self.sector_key(sector)
+        if key not in self._quspin_bases:
+            self._quspin_bases[key] = spin_basis_1d(
+                L=self.graph.num_sites, a=self.unit_cell_length, **dict(key))
+        with HiddenPrints():
+            return hamiltonian([H], [], basis=self._quspin_bases[key])
+
+    def get_floquet_hamiltonian(self, params: list[float or str],
+                                dt_list: list[float], sector: dict = None):
+        """
+        Construct the Floquet Hamiltonian i / T logm(U_F) of a sequence,
+        with the conventions of `DiagonEngine.get_quspin_floquet_hamiltonian`.
+
+        Parameters
+        ----------
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step in the Floquet period. Set dt=0 for a
+            delta pulse.
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        np.ndarray
+            The Floquet Hamiltonian.
+        """
+        if len(params) != len(dt_list):
+            raise ValueError("paramList and dtList must have the same length")
+        return self.sweep_floquet([params], [dt_list], sector=sector)[1][0]
+
+    def get_block_hamiltonians(self, t: float, sectors: list[dict]):
+        """
+        Construct the (sparse) Hamiltonian at time `t` in each symmetry
+        sector, see `DiagonEngine.get_block_hamiltonians`.
+        """
+        return {self.sector_key(sector): self.get_sparse_hamiltonian(t, sector)
+                for sector in sectors if self.get_basis(sector).Ns > 0}
+
+    def get_block_floquet_hamiltonians(self, params: list[float or str],
+                                       dt_list: list[float],
+                                       sectors: list[dict] = None):
+        """
+        Construct the Floquet Hamiltonian block by block in the magnetization
+        sectors, see `DiagonEngine.get_block_floquet_hamiltonians`.
+        """
+        if sectors is None:
+            sectors = self.get_symmetry_sectors(params)
+        return {self.sector_key(sector): self.get_floquet_hamiltonian(
+            params, dt_list, sector) for sector in sectors
+            if self.get_basis(sector).Ns > 0}
+
+
+class KrylovEngine(DiagonEngine):
+    def __init__(self, graph: LatticeGraph, spin='1/2',
+                 unit_cell_length: int = 1, num_samples: int = 16,
+                 seed: int = None):
+        """
+        Initialize the KrylovEngine. Unitaries are never formed: states are
+        propagated through each step of a sequence with the action of the
+        matrix exponential on the (cached, sparse) step Hamiltonians, and
+        unitary distances are estimated from a set of random states.
+
+        Parameters
+        ----------
+        graph : LatticeGraph
+            The graph containing the interaction terms and lattice structure.
+        spin : str, optional
+            The spin of the particles in the lattice, defaults to '1/2'.
+        unit_cell_length : int, optional
+            The number of lattice sites in the unit cell, defaults to 1.
+        num_samples : int, optional
+            Number of random states used by the loss estimators, defaults to
+            16.
+        seed : int, optional
+            Seed of the random states, defaults to None.
+        """
+        super().__init__(graph, spin=spin, unit_cell_length=unit_cell_length)
+        self.num_samples = num_samples
+        self.rng = np.random.default_rng(seed)
+        self._step_hamiltonians = {}
+
+    def get_sparse_hamiltonian(self, t: float, sector: dict = None):
+        """
+        Assemble the Hamiltonian at time `t` as a sparse matrix.
+
+        Unlike `DiagonEngine`, the operators of the individual terms are not
+        cached (they would take a multiple of the memory of the Hamiltonian
+        on large chains); instead the assembled Hamiltonian of each step
+        label is cached.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            The Hamiltonian in the basis of `get_basis`.
+        """
+        try:
+            key = (t, self.sector_key(sector))
+            hash(key)
+        except TypeError:
+            key = None
+        if key in self._step_hamiltonians:
+            return self._step_hamiltonians[key]
+
+        basis = self.get_basis(sector)
+        coefficients = self.graph.coefficients(t)
+        matrix_elements, rows, cols = [], [], []
+        for op, (sites, _) in self.graph.compile().items():
+            for c, site in zip(np.reshape(coefficients[op], -1).tolist(),
+                               sites.tolist()):
+                if c == 0:
+                    continue
+                ME, row, col = basis.Op(op, site, c, np.complex128)
+                matrix_elements.append(ME)
+                rows.append(row)
+                cols.append(col)
+        # assemble once, duplicate entries are summed by the conversion
+        if matrix_elements:
+            matrix_elements, rows, cols = (
+                np.concatenate(arrays) for arrays in
+                (matrix_elements, rows, cols))
+        else:
+            matrix_elements = np.zeros(0, dtype=np.complex128)
+            rows = cols = np.zeros(0, dtype=int)
+        hamiltonian = sp.coo_matrix(
+            (matrix_elements, (rows, cols)),
+            shape=(basis.Ns, basis.Ns)).tocsr()
+
+        if key is not None:
+            if len(self._step_hamiltonians) >= 64:
+                self._step_hamiltonians.clear()
+            self._step_hamiltonians[key] = hamiltonian
+        return hamiltonian
+
+    def random_states(self, num_samples: int = None, sector: dict = None):
+        """
+        Draw random states with E[z z^dagger] = 1, i.e. complex Gaussian
+        entries of unit variance, for trace estimation.
+
+        Parameters
+        ----------
+        num_samples : int, optional
+            Number of states, defaults to `num_samples`.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (Ns, num_samples), one state per column.
+        """
+        return self._gaussian_states(self.rng, self.get_basis(sector).Ns,
+                                     num_samples or self.num_samples)
+
+    def evolve_state(self, psi, params: list[float or str],
+                     dt_list: list[float], num_periods: int = 1,
+                     sector: dict = None):
+        """
+        Propagate states through a sequence of piecewise-constant steps.
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            Initial state of shape (Ns,), or states of shape (Ns, n) which
+            are propagated together.
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step. Set dt=0 for a delta pulse, as in
+            `get_quspin_floquet_hamiltonian`.
+        num_periods : int, optional
+            Number of repetitions of the sequence, defaults to 1.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        np.ndarray
+            The propagated states, with the shape of `psi`.
+        """
+        if len(params) != len(dt_list):
+            raise ValueError("paramList and dtList must have the same length")
+
+        generators = [-1j * (dt if dt > 0 else 1) *
+                      self.get_sparse_hamiltonian(t, sector)
+                      for t, dt in zip(params, dt_list)]
+        psi = np.asarray(psi, dtype=np.complex128)
+        for _ in range(num_periods):
+            for generator in generators:
+                psi = expm_multiply(generator, psi)
+        return psi
+
+    def floquet_identity_loss(self, params1: list[float or str],
+                              dt_list1: list[float],
+                              params2: list[float or str],
+                              dt_list2: list[float],
+                              num_samples: int = None, sector: dict = None):
+        """
+        Estimate the norm identity loss between the Floquet unitaries of two
+        sequences, ||U1^dagger U2 - 1||_F = ||U2 - U1||_F.
+
+        The squared norm is the trace of (U2 - U1)^dagger (U2 - U1), which is
+        estimated as the mean of ||(U2 - U1) z||^2 over random states z
+        (Hutchinson estimator); the relative error decreases as
+        1 / sqrt(num_samples).
+
+        Parameters
+        ----------
+        params1, dt_list1 : list
+            Step labels and durations of the first sequence.
+        params2, dt_list2 : list
+            Step labels and durations of the second sequence.
+        num_samples : int, optional
+            Number of random states, defaults to `num_samples`.
+        sector : dict, optional
+            Symmetry sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        float
+            The estimated norm difference.
+        """
+        z = self.random_states(num_samples, sector)
+        diff = (self.evolve_state(z, params2, dt_list2, sector=sector) -
+                self.evolve_state(z, params1, dt_list1, sector=sector))
+        return np.sqrt(np.mean(np.sum(np.abs(diff) ** 2, axis=0)))
+
+    def norm_identity_loss(self, matrix1, matrix2, num_samples: int = None):
+        """
+        Estimate the norm identity loss between two matrices.
+
+        Same metric as `ComputationStrategy.norm_identity_loss`, estimated
+        from random states propagated with `expm_multiply` instead of dense
+        matrix exponentials (see `floquet_identity_loss`).
+
+        Parameters
+        ----------
+        matrix1 : quspin hamiltonian, sparse matrix or np.ndarray
+            The first matrix, representing a Hamiltonian times evolution time.
+        matrix2 : quspin hamiltonian, sparse matrix or np.ndarray
+            The second matrix, representing a Hamiltonian times evolution time.
+        num_samples : int, optional
+            Number of random states, defaults to `num_samples`.
+
+        Returns
+        -------
+        float
+            The estimated norm difference between the product of the two
+            unitaries and the identity.
+        """
+        return super().norm_identity_loss(
+            matrix1, matrix2, num_samples=num_samples or self.num_samples,
+            seed=self.rng)
+
+
+class QuenchEngine(KrylovEngine, SparseEngine):
+    def __init__(self, graph: LatticeGraph, spin='1/2',
+                 unit_cell_length: int = 1):
+        """
+        Initialize the QuenchEngine, which evolves (batches of) initial
+        states under a pulse sequence and records observables at requested
+        output times, without storing the history of the states.
+
+        The step Hamiltonians are the cached sparse Hamiltonians of
+        `KrylovEngine`, in the QuSpin-free basis of `SparseEngine`, so that
+        only magnetization sectors are supported.
+
+        Parameters
+        ----------
+        graph : LatticeGraph
+            The graph containing the interaction terms and lattice structure.
+        spin : str, optional
+            The spin of the particles in the lattice, only '1/2' is
+            supported.
+        unit_cell_length : int, optional
+            The number of lattice sites in the unit cell, defaults to 1.
+        """
+        super().__init__(graph, spin=spin, unit_cell_length=unit_cell_length)
+        self._spin_values = {}
+        self._observables = {}
+
+    def get_spin_values(self, sector: dict = None):
+        """
+        Get the (cached) eigenvalues of the Pauli z operator of every site in
+        every basis state, an array of shape (Ns, num_sites) with entries
+        +1 (spin up) and -1 (spin down).
+        """
+        key = self.sector_key(sector)
+        if key not in self._spin_values:
+            basis = self.get_basis(sector)
+            shifts = self.graph.num_sites - 1 - np.arange(self.graph.num_sites)
+            bits = (basis.states[:, np.newaxis] >> shifts) & 1
+            self._spin_values[key] = 2 * bits.astype(np.int8) - 1
+        return self._spin_values[key]
+
+    def product_state(self, spins, sector: dict = None):
+        """
+        Construct product states in the basis of `get_basis`.
+
+        Parameters
+        ----------
+        spins : str, array_like or list
+            Either a string of 'u' (up) and 'd' (down) per site, Bloch angles
+            (theta, phi) per site as an array of shape (num_sites, 2) for the
+            state cos(theta/2) |u> + exp(i phi) sin(theta/2) |d>, or a list
+            of these for a batch of states.
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        np.ndarray
+            The state of shape (Ns,), or the batch of shape (Ns, n) with one
+            state per column.
+
+        Raises
+        ------
+        ValueError
+            If a state is not contained in the sector.
+        """
+        if isinstance(spins, list) and (
+                len(spins) == 0 or isinstance(spins[0], str) or
+                np.ndim(spins[0]) == 2):
+            return np.stack([self.product_state(s, sector) for s in spins],
+                            axis=1)
+
+        L = self.graph.num_sites
+        if isinstance(spins, str):
+            if len(spins) != L or set(spins) - set('ud'):
+                raise ValueError(f"Invalid product state: {spins}")
+            angles = np.array([[0.0 if s == 'u' else np.pi, 0.0]
+                               for s in spins])
+        else:
+            angles = np.asarray(spins, dtype=float)
+            if angles.shape != (L, 2):
+                raise ValueError(f"Bloch angles must have shape ({L}, 2)")
+        theta, phi = angles.T
+        # amplitudes of up (+1) and down (-1) on every site
+        up, down = np.cos(theta / 2), np.exp(1j * phi) * np.sin(theta / 2)
+        spin_values = self.get_spin_values(sector)
+        psi = np.prod(np.where(spin_values > 0, up, down), axis=1)
+        if abs(np.linalg.norm(psi) - 1) > 1e-10:
+            raise ValueError(f"The product state is not in sector {sector}")
+        return psi
+
+    def get_observable(self, opstr: str, sites: list[int],
+                       sector: dict = None):
+        """
+        Get the (cached) sparse operator of an operator string, e.g.
+        get_observable('xx', [0, 1]) for sigma^x_0 sigma^x_1.
+        """
+        key = (opstr, tuple(sites), self.sector_key(sector))
+        if key not in self._observables:
+            basis = self.get_basis(sector)
+            ME, row, col = basis.Op(opstr, list(sites), 1.0, np.complex128)
+            self._observables[key] = sp.csr_matrix(
+                (ME, (row, col)), shape=(basis.Ns, basis.Ns))
+        return self._observables[key]
+
+    def entanglement_entropy(self, psi, cut: int = None,
+                             sector: dict = None):
+        """
+        Compute the von Neumann entanglement entropy between the sites
+        [0, cut) and [cut, num_sites).
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            State of shape (Ns,), or states of shape (Ns, n).
+        cut : int, optional
+            Position of the cut, defaults to the middle of the chain.
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        float or np.ndarray
+            The entropy of each state.
+        """
+        L = self.graph.num_sites
+        cut = L // 2 if cut is None else cut
+        states = self.get_basis(sector).states
+        psi = np.asarray(psi)
+        entropies = []
+        for state in psi.reshape(len(states), -1).T:
+            # site 0 is the most significant bit of the basis state
+            full = np.zeros(2**L, dtype=np.complex128)
+            full[states] = state
+            weights = np.linalg.svd(full.reshape(2**cut, 2**(L - cut)),
+                                    compute_uv=False)**2
+            weights = weights[weights > 1e-16]
+            entropies.append(-np.sum(weights * np.log(weights)))
+        return entropies[0] if psi.ndim == 1 else np.array(entropies)
+
+    def expectation_values(self, psi, observables: list = ('magnetization',),
+                           sector: dict = None):
+        """
+        Evaluate observables of (a batch of) states.
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            State of shape (Ns,), or states of shape (Ns, n).
+        observables : list, optional
+            Observables to evaluate: 'magnetization' for <sigma^z_i> of every
+            site, 'correlations' for <sigma^z_i sigma^z_j> of every pair,
+            'entropy' for the half-chain entanglement entropy, or tuples
+            (opstr, sites) for the expectation value of any operator string,
+            see `get_observable`. Defaults to ('magnetization',).
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each observable to its values, with a leading
+            axis of length n for a batch of states. Operator strings are keyed
+            by (opstr, tuple(sites)).
+        """
+        psi = np.asarray(psi)
+        batch = psi.reshape(psi.shape[0], -1)
+        probabilities = np.abs(batch)**2
+        values = {}
+        for observable in observables:
+            if observable == 'magnetization':
+                value = probabilities.T @ self.get_spin_values(sector)
+            elif observable == 'correlations':
+                spin_values = self.get_spin_values(sector)
+                value = np.stack([(spin_values * p[:, np.newaxis]).T @
+                                  spin_values for p in probabilities.T])
+            elif observable == 'entropy':
+                value = self.entanglement_entropy(batch, sector=sector)
+            elif isinstance(observable, tuple) and len(observable) == 2:
+                opstr, sites = observable
+                operator = self.get_observable(opstr, sites, sector=sector)
+                value = np.sum(batch.conj() * (operator @ batch), axis=0)
+                observable = (opstr, tuple(sites))
+            else:
+                raise ValueError(f"Invalid observable: {observable}")
+            values[observable] = value if psi.ndim > 1 else value[0]
+        return values
+
+    def quench(self, psi, params: list[float or str], dt_list: list[float],
+               times: list[float], observables: list = ('magnetization',),
+               sector: dict = None):
+        """
+        Evolve (a batch of) states under a pulse sequence, repeated
+        periodically, and record observables at the output times.
+
+        The sequence is applied from t=0 on, repeating until the last output
+        time. The observables at time t are evaluated after all steps that
+        end at or before t, including delta pulses (dt=0) at time t. Only the
+        current states are kept, so long evolutions of large chains need the
+        memory of a few states.
+
+        Parameters
+        ----------
+        psi : np.ndarray
+            Initial state of shape (Ns,), or states of shape (Ns, n) which
+            are evolved together, e.g. from `product_state`.
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step. Set dt=0 for a delta pulse, as in
+            `get_quspin_floquet_hamiltonian`.
+        times : list[float]
+            Output times.
+        observables : list, optional
+            Observables to record, see `expectation_values`. Defaults to
+            ('magnetization',).
+        sector : dict, optional
+            Magnetization sector, see `get_basis`. Defaults to the full space.
+
+        Returns
+        -------
+        dict
+            Dictionary mapping each observable to its values, with a leading
+            axis over the output times (in the order of `times`).
+        """
+        if len(params) != len(dt_list):
+            raise ValueError("paramList and dtList must have the same length")
+        times = np.asarray(times, dtype=float)
+        period = sum(dt_list)
+        if period <= 0:
+            raise ValueError("The sequence must have a positive duration")
+        if np.any(times < 0):
+            raise ValueError("Output times must be non-negative")
+
+        hamiltonians = [self.get_sparse_hamiltonian(t, sector)
+                        for t in params]
+        psi = np.asarray(psi, dtype=np.complex128)
+        order = np.argsort(times, kind='stable')
+        records = [None] * len(times)
+        tol = 1e-12 * period
+        now, k = 0.0, 0
+        for H, dt in cycle(zip(hamiltonians, dt_list)):
+            if k == len(order):
+                break
+            if dt <= 0:
+                psi = expm_multiply(-1j * H, psi)
+                continue
+            # record the output times reached before this step
+            while k < len(order) and times[order[k]] <= now + tol:
+                records[order[k]] = self.expectation_values(psi, observables,
+                                                            sector)
+                k += 1
+            end = now + dt
+            while k < len(order) and times[order[k]] < end - tol:
+                psi = expm_multiply(-1j * (times[order[k]] - now) * H, psi)
+                now = times[order[k]]
+                records[order[k]] = self.expectation_values(psi, observables,
+                                                            sector)
+                k += 1
+            if k < len(order):
+                psi = expm_multiply(-1j * (end - now) * H, psi)
+            now = end
+        return {observable: np.array([record[observable] for record in
+                                      records])
+                for observable in (records[0] if records else {})}
+
+
+class DMRGEngine(ComputationStrategy):
+    def __init__(self, graph: LatticeGraph, spin='1/2',
+                 unit_cell_length: int = 1, chi_max: int = 64,
+                 cutoff: float = 1e-10, max_dt: float = 0.05,
+                 num_samples: int = 16, seed: int = None):
+        """
+        Initialize the DMRGEngine, a matrix product state backend (see
+        `models.mps`) for chains too long for exact methods. Hamiltonians
+        are converted to MPOs for ground-state DMRG, and states are evolved
+        through pulse sequences with TEBD.
+
+        Parameters
+        ----------
+        graph : LatticeGraph
+            The graph containing the interaction terms and lattice structure.
+            Only one- and two-site terms are supported.
+        spin : str, optional
+            The spin of the particles in the lattice, only '1/2' is
+            supported.
+        unit_cell_length : int, optional
+            The number of lattice sites in the unit cell, defaults to 1.
+        chi_max : int, optional
+            Maximum bond dimension of the states, defaults to 64.
+        cutoff : float, optional
+            Relative singular value cutoff, defaults to 1e-10.
+        max_dt : float, optional
+            Maximum Trotter step of the time evolution, defaults to 0.05.
+        num_samples : int, optional
+            Number of random product states used by the loss estimators,
+            defaults to 16.
+        seed : int, optional
+            Seed of the random states, defaults to None.
+        """
+        if spin != '1/2':
+            raise ValueError("DMRGEngine only supports spin '1/2'")
+        super().__init__(graph, spin=spin, unit_cell_length=unit_cell_length)
+        self.chi_max = chi_max
+        self.cutoff = cutoff
+        self.max_dt = max_dt
+        self.num_samples = num_samples
+        self.rng = np.random.default_rng(seed)
+        self._gates = {}
+
+    def get_mpo(self, t: float):
+        """
+        Get the matrix product operator of the Hamiltonian at time `t`.
+
+        Parameters
+        ----------
+        t : float or str
+            Time or step label at which to evaluate the Hamiltonian.
+
+        Returns
+        -------
+        list[np.ndarray]
+            MPO tensors with indices (left, right, bra, ket).
+        """
+        return mps.build_mpo(mps.local_terms(self.graph, t),
+                             self.graph.num_sites)
+
+    def run_calculation(self, t: float = 0.0, num_sweeps: int = 10,
+                        tol: float = 1e-10):
+        """
+        Find the ground state of the Hamiltonian at time `t` with DMRG.
+
+        Parameters
+        ----------
+        t : float or str, optional
+            Time or step label at which to evaluate the Hamiltonian, defaults
+            to 0.
+        num_sweeps : int, optional
+            Maximum number of sweeps, defaults to 10.
+        tol : float, optional
+            Convergence tolerance on the energy, defaults to 1e-10.
+
+        Returns
+        -------
+        energy : float
+            The ground state energy.
+        state : models.mps.MPS
+            The ground state.
+        """
+        state = mps.MPS.random(self.graph.num_sites, min(self.chi_max, 8),
+                               self.rng)
+        return mps.dmrg(self.get_mpo(t), state, num_sweeps=num_sweeps,
+                        chi_max=self.chi_max, cutoff=self.cutoff, tol=tol)
+
+    def evolve_state(self, psi, params: list[float or str],
+                     dt_list: list[float], num_periods: int = 1):
+        """
+        Propagate an MPS through a sequence of piecewise-constant steps with
+        TEBD.
+
+        Parameters
+        ----------
+        psi : models.mps.MPS
+            Initial state, which is not modified.
+        params : list[float or str]
+            List of times or parameters to evaluate the Hamiltonian at.
+        dt_list : list[float]
+            Durations of each time step. Set dt=0 for a delta pulse, as in
+            `DiagonEngine.get_quspin_floquet_hamiltonian`.
+        num_periods : int, optional
+            Number of repetitions of the sequence, defaults to 1.
+
+        Returns
+        -------
+        models.mps.MPS
+            The propagated state.
+        """
+        if len(params) != len(dt_list):
+            raise ValueError("paramList and dtList must have the same length")
+
+        steps = [self._get_trotter_step(t, dt if dt > 0 else 1)
+                 for t, dt in zip(params, dt_list)]
+        psi = psi.copy()
+        for _ in range(num_periods):
+            for gates, num_steps in steps:
+                mps.apply_trotter_steps(psi, gates, num_steps,
+                                        chi_max=self.chi_max,
+                                        cutoff=self.cutoff)
+        return psi
+
+    def _get_trotter_step(self, t, tau: float):
+        """
+        Get the (cached) Trotter gates and number of Trotter steps that
+        evolve the Hamiltonian at time `t` for a time `tau`.
+        """
+        num_steps = max(1, int(np.ceil(tau / self.max_dt)))
+        try:
+            key = (t, tau, num_steps)
+            return self._gates[key], num_steps
+        except KeyError:
+            pass
+        except TypeError:
+            key = None
+
+        gates = mps.trotter_gates(mps.local_terms(self.graph, t),
+                                  tau / num_steps)
+        if key is not None:
+            if len(self._gates) >= 64:
+                self._gates.clear()
+            self._gates[key] = gates
+        return gates, num_steps
+
+    def floquet_identity_loss(self, params1: list[float or str],
+                              dt_list1: list[float],
+                              params2: list[float or str],
+                              dt_list2: list[float],
+                              num_samples: int = None):
+        """
+        Estimate the norm identity loss between the Floquet unitaries of two
+        sequences, ||U1^dagger U2 - 1||_F = ||U2 - U1||_F.
+
+        The squared norm is estimated as 2^L times the mean of
+        ||(U2 - U1) psi||^2 over Haar-random product states psi, which are
+        propagated with TEBD.
+
+        Parameters
+        ----------
+        params1, dt_list1 : list
+            Step labels and durations of the first sequence.
+        params2, dt_list2 : list
+            Step labels and durations of the second sequence.
+        num_samples : int, optional
+            Number of random states, defaults to `num_samples`.
+
+        Returns
+        -------
+        float
+            The estimated norm difference.
+        """
+        squared = []
+        for _ in range(num_samples or self.num_samples):
+            psi = mps.MPS.random_product_state(self.graph.num_sites,
+                                               self.rng)
+            psi1 = self.evolve_state(psi, params1, dt_list1)
+            psi2 = self.evolve_state(psi, params2, dt_list2)
+            squared.append(np.real(psi1.overlap(psi1) + psi2.overlap(psi2) -
+                                   2 * psi1.overlap(psi2)))
+        return np.sqrt(2. ** self.graph.num_sites *
+                       max(np.mean(squared), 0))
+
+    def frobenius_norm(self, matrix1, matrix2):
+        """
+        Compute the Frobenius norm of the overlap between two Hamiltonians,
+        contracted exactly from their MPOs.
+
+        Parameters
+        ----------
+        matrix1 : float, str or list[np.ndarray]
+            Step label of the first Hamiltonian, or its MPO.
+        matrix2 : float, str or list[np.ndarray]
+            Step label of the second Hamiltonian, or its MPO.
+
+        Returns
+        -------
+        float
+            The Frobenius norm of the overlap between the two Hamiltonians.
+        """
+        if not isinstance(matrix1, list):
+            matrix1 = self.get_mpo(matrix1)
+        if not isinstance(matrix2, list):
+            matrix2 = self.get_mpo(matrix2)
+        return np.sqrt(np.abs(mps.mpo_overlap(matrix1, matrix2)))
+
+    def norm_identity_loss(self, matrix1, matrix2, num_samples: int = None):
+        """
+        Estimate the norm identity loss between the unitaries generated by
+        two Hamiltonians in unit time (see `floquet_identity_loss`).
+
+        Parameters
+        ----------
+        matrix1 : float or str
+            Step label of the first Hamiltonian times evolution time.
+        matrix2 : float or str
+            Step label of the second Hamiltonian times evolution time.
+        num_samples : int, optional
+            Number of random states, defaults to `num_samples`.
+
+        Returns
+        -------
+        float
+            The estimated norm difference between the product of the two
+            unitaries and the identity.
+        """
+        return self.floquet_identity_loss([matrix1], [0], [matrix2], [0],
+                                          num_samples=num_samples)
 
 
 if __name__ == "__main__":
@@ -8,29 +8,30 @@ def plot_Cs_ground_state_tweezer_shift():
     shifter = ac_stark.ACStarkShift()#laserWaist=1e-6, n=6, l=0, j=0.5,
     # mj=0.5, q=0)
     tweezer_wavelength = np.asarray([1069.79]) * 1e-9
-    wavelengths = np.linspace(450, 460, 3000) * 1e-9
-    powers = np.asarray([20e-3])
-    shirley_shift_wavelength_6S = shifter.ac_stark_shift_shirley(wavelengths,
-                                                                 powers).squeeze()
+    # 1 MHz interpolation error, well below the resolution of the plot
+    wavelengths_6S, shirley_shift_wavelength_6S, _ = \
+        shifter.ac_stark_shift_shirley_adaptive(450e-9, 460e-9, 20e-3,
+                                                tol=1e6)
 
     powers = np.linspace(0, 20e-3, 1000)
     shirley_shift_power_6S = shifter.ac_stark_shift_shirley(tweezer_wavelength,
                                                             powers).squeeze()
 
     shifter_6P = ac_stark.ACStarkShift(l=1, j=1.5, mj=1.5)
-    powers = np.asarray([20e-3])
-    shirley_shift_wavelength_6P = shifter.ac_stark_shift_shirley(wavelengths,
-                                                                 powers).squeeze()
+    wavelengths_6P, shirley_shift_wavelength_6P, _ = \
+        shifter_6P.ac_stark_shift_shirley_adaptive(450e-9, 460e-9, 20e-3,
+                                                   tol=1e6)
 
     powers = np.linspace(0, 20e-3, 1000)
-    shirley_shift_power_6P = shifter.ac_stark_shift_shirley(tweezer_wavelength,
-                                                            powers).squeeze()
+    shirley_shift_power_6P = shifter_6P.ac_stark_shift_shirley(
+        tweezer_wavelength, powers).squeeze()
 
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 5))
-    ax1.plot(wavelengths * 1e9, shirley_shift_wavelength_6S * 1e-6,
+    ax1.plot(wavelengths_6S * 1e9, shirley_shift_wavelength_6S * 1e-6,
              '--',
-             label=f"state = {shifter.state}")
-    ax1.plot(wavelengths * 1e9, shirley_shift_wavelength_6P * 1e-6, '--', label=f"state = {shifter_6P.state}")
+             label=f"state = {shifter.target_state}")
+    ax1.plot(wavelengths_6P * 1e9, shirley_shift_wavelength_6P * 1e-6, '--',
+             label=f"state = {shifter_6P.target_state}")
     ax1.set_xlabel("wavelength (nm)")
     ax1.set_ylim([-2000, 2000])
     ax1.set_ylabel("AC Stark Shift (MHz)")
@@ -0,0 +1,177 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from arc import DynamicPolarizability
+from models.ac_stark import (ACStarkShift, clear_shirley_cache,
+                             find_magic_wavelengths, tweezer_light_shift_map)
+from models.utility import wavelength2freq, power2field
+
+
+class ACStarkShiftTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.shifter = ACStarkShift()
+        cls.wavelengths = np.linspace(1000, 1100, 5) * 1e-9
+        cls.powers = np.asarray([5e-3, 20e-3])
+
+    def test_shirley_batch_matches_arc(self):
+        shifts = self.shifter.ac_stark_shift_shirley(self.wavelengths,
+                                                     self.powers)
+        self.assertEqual(shifts.shape, (len(self.powers),
+                                        len(self.wavelengths)))
+
+        calc = self.shifter.define_shirley_calculation()
+        calc.diagonalise(power2field(self.powers, self.shifter.laserWaist),
+                         wavelength2freq(self.wavelengths))
+        np.testing.assert_allclose(shifts, calc.targetShifts, rtol=1e-6)
+
+    def test_shirley_tracking_matches_batch(self):
+        shifts = self.shifter.ac_stark_shift_shirley(self.wavelengths,
+                                                     self.powers)
+        tracked = self.shifter.ac_stark_shift_shirley(self.wavelengths,
+                                                      self.powers,
+                                                      method="tracking")
+        np.testing.assert_allclose(tracked, shifts, rtol=1e-6)
+
+    def test_shirley_blocks_cache(self):
+        clear_shirley_cache()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            shifter = ACStarkShift(cache_dir=cache_dir)
+            blocks = shifter.get_shirley_blocks()
+            self.assertIs(ACStarkShift().get_shirley_blocks(), blocks)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            clear_shirley_cache()
+            loaded = ACStarkShift(cache_dir=cache_dir).get_shirley_blocks()
+            self.assertIsNot(loaded, blocks)
+            np.testing.assert_array_equal(loaded["h0"], blocks["h0"])
+            np.testing.assert_array_equal(loaded["B"].toarray(),
+                                          blocks["B"].toarray())
+            self.assertEqual(loaded["target_index"], blocks["target_index"])
+            self.assertEqual(loaded["target_energy"], blocks["target_energy"])
+
+    def test_vectorized_polarizability_matches_arc(self):
+        shifter = ACStarkShift(n=7, l=1, j=1.5, mj=1.5)
+        alphas = np.asarray(shifter.get_polarizability(self.wavelengths))
+
+        calc = DynamicPolarizability(shifter.atom, *shifter.target_state)
+        calc.defineBasis(shifter.basis_n_min, shifter.basis_n_max)
+        expected = np.asarray([calc.getPolarizability(wavelength)[:3]
+                               for wavelength in self.wavelengths]).T
+        np.testing.assert_allclose(alphas, expected, rtol=1e-10)
+
+    def test_find_magic_wavelengths(self):
+        shifter_7P = ACStarkShift(n=7, l=1, j=1.5, mj=1.5)
+        magic = find_magic_wavelengths(self.shifter, shifter_7P, 850e-9,
+                                       1000e-9)
+        self.assertEqual(len(magic), 1)
+
+        # the differential light shift, including the tensor shift of the
+        # |mj|=3/2 state, changes sign across the root
+        wavelengths = magic[0] * np.asarray([1 - 1e-9, 1 + 1e-9])
+        diff_shift = (
+            self.shifter.ac_stark_shift_polarizability(wavelengths, 20e-3) -
+            shifter_7P.ac_stark_shift_polarizability(wavelengths, 20e-3))
+        self.assertLess(diff_shift[0] * diff_shift[1], 0)
+
+        # the scalar polarizabilities alone cross elsewhere
+        diff_alpha0 = (self.shifter.get_polarizability(wavelengths)[0] -
+                       shifter_7P.get_polarizability(wavelengths)[0])
+        self.assertGreater(diff_alpha0[0] * diff_alpha0[1], 0)
+
+        # |mj|=1/2 has the opposite tensor shift and another magic wavelength
+        magic_half = find_magic_wavelengths(
+            self.shifter, ACStarkShift(n=7, l=1, j=1.5, mj=0.5), 850e-9,
+            1000e-9)
+        self.assertEqual(len(magic_half), 1)
+        self.assertLess(magic_half[0], magic[0] - 0.05e-9)
+
+    def test_state_polarizability(self):
+        shifter = ACStarkShift(n=7, l=1, j=1.5, mj=1.5)
+        alpha0, alpha1, alpha2 = shifter.get_polarizability(self.wavelengths)
+        np.testing.assert_allclose(
+            shifter.get_state_polarizability(self.wavelengths),
+            alpha0 + alpha2)
+        # sigma+ light adds the vector part and halves the tensor part
+        shifter.q = 1
+        np.testing.assert_allclose(
+            shifter.get_state_polarizability(self.wavelengths),
+            alpha0 + alpha1 / 2 - alpha2 / 2)
+        # j=1/2 states only have the scalar part in linearly polarized light
+        np.testing.assert_allclose(
+            self.shifter.get_state_polarizability(self.wavelengths),
+            self.shifter.get_polarizability(self.wavelengths)[0])
+
+    def test_shirley_adaptive_grid(self):
+        tol = 1e4
+        wavelengths, shifts, errors = \
+            self.shifter.ac_stark_shift_shirley_adaptive(1000e-9, 1100e-9,
+                                                         20e-3, tol=tol,
+                                                         n_initial=8)
+        self.assertEqual(len(errors), len(wavelengths) - 1)
+        self.assertTrue(np.all(errors <= tol))
+        self.assertTrue(np.all(np.diff(wavelengths) > 0))
+
+        test_wavelengths = np.linspace(1000, 1100, 17) * 1e-9
+        expected = self.shifter.ac_stark_shift_shirley(test_wavelengths,
+                                                       [20e-3])[0]
+        np.testing.assert_allclose(np.interp(test_wavelengths, wavelengths,
+                                             shifts), expected, atol=4 * tol)
+
+    def test_shirley_adaptive_evaluations(self):
+        # the 450-460 nm scan of the plots, formerly 3000 uniform points
+        tol = 1e6
+        wavelengths, shifts, _ = \
+            self.shifter.ac_stark_shift_shirley_adaptive(450e-9, 460e-9,
+                                                         20e-3, tol=tol)
+        self.assertLessEqual(10 * len(wavelengths), 3000)
+
+        # at least as accurate as the uniform grid, up to 2 tol, on a sample
+        # of its intervals (the uniform grid is off by GHz at resonances)
+        uniform = np.linspace(450, 460, 3000) * 1e-9
+        k = np.arange(0, len(uniform) - 1, 10)
+        midpoints = 0.5 * (uniform[k] + uniform[k + 1])
+        exact, left, right = [
+            self.shifter.ac_stark_shift_shirley(x, [20e-3])[0]
+            for x in (midpoints, uniform[k], uniform[k + 1])]
+        uniform_error = np.abs(exact - 0.5 * (left + right))
+        adaptive_error = np.abs(np.interp(midpoints, wavelengths, shifts) -
+                                exact)
+        self.assertTrue(np.all(adaptive_error <=
+                               np.maximum(uniform_error, 2 * tol)))
+
+    def test_tweezer_light_shift_map(self):
+        # peak intensities of the beams with the powers of the test grid
+        peak_intensities = 2 * self.powers / (np.pi *
+                                              self.shifter.laserWaist**2)
+        intensity_map = np.zeros((4, 5))
+        intensity_map[1, 1] = peak_intensities[0]
+        intensity_map[2, 3] = peak_intensities[1]
+        sites = [[1, 1], [2, 3]]
+
+        shift_maps, site_shifts = tweezer_light_shift_map(
+            [self.shifter], self.wavelengths[0], intensity_map, sites=sites)
+        self.assertEqual(shift_maps.shape, (1, 4, 5))
+
+        expected = self.shifter.ac_stark_shift_shirley(self.wavelengths[:1],
+                                                       self.powers)[:, 0]
+        np.testing.assert_allclose(site_shifts[0], expected, rtol=1e-3)
+        np.testing.assert_allclose(shift_maps[0, 0, 0], 0, atol=1)
+
+    def test_hybrid_matches_shirley(self):
+        powers = np.linspace(0, 20e-3, 11)
+        # far from and close to the 6S-7P1/2 resonance near 459.3 nm
+        wavelengths = np.asarray([1069.79e-9, 459.4e-9])
+        rtol = 1e-3
+        shifts, shirley_mask = self.shifter.ac_stark_shift_hybrid(
+            wavelengths, powers, rtol=rtol)
+        self.assertFalse(np.any(shirley_mask[:, 0]))
+        self.assertTrue(np.any(shirley_mask[:, 1]))
+
+        expected = self.shifter.ac_stark_shift_shirley(wavelengths, powers)
+        np.testing.assert_allclose(shifts, expected, rtol=rtol, atol=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
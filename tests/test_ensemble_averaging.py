@@ -0,0 +1,144 @@
+import unittest
+import numpy as np
+import scipy.constants as const
+from scipy.linalg import expm
+from models.ensemble_averaging import (evolve_batch, get_doppler_nodes,
+                                       doppler_average,
+                                       get_intensity_noise_nodes,
+                                       intensity_noise_average)
+from models.rydberg_dynamics import LossyRydberg
+
+
+class EnsembleAveragingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.time_array = np.linspace(0, 2e-6, 801)
+        self.Omega12 = 2 * np.pi * 20e6 * np.sin(
+            np.pi * self.time_array / 2e-6)**2
+        self.Omega23 = 2 * np.pi * 20e6
+        self.Delta = 2 * np.pi * 100e6
+        self.mass = 2.2e-25
+
+    def test_evolve_batch(self):
+        Delta = self.Delta * np.array([[1], [-1]])
+        populations = evolve_batch(self.time_array, self.Omega12,
+                                   self.Omega23, Delta, 0.0, 2e6, 5e5)
+        self.assertEqual(populations.shape, (2, len(self.time_array), 4))
+
+        # piecewise-constant Liouvillian of LossyRydberg, row-major vec(rho)
+        identity = np.identity(4)
+        jump_operators = np.zeros((2, 4, 4))
+        jump_operators[0, 3, 1] = np.sqrt(2e6)
+        jump_operators[1, 3, 2] = np.sqrt(5e5)
+        rho = np.diag([1, 0, 0, 0]).astype(np.complex128).ravel()
+        for i, deltaT in enumerate(np.diff(self.time_array)):
+            H = LossyRydberg.get_hamiltonian(self.Omega12[i], self.Omega23,
+                                             -self.Delta, 0.0)
+            liouvillian = -1j * (np.kron(H, identity) -
+                                 np.kron(identity, H.T))
+            for L in jump_operators:
+                LdL = L.T @ L
+                liouvillian += np.kron(L, L) - 0.5 * (
+                    np.kron(LdL, identity) + np.kron(identity, LdL.T))
+            rho = expm(liouvillian * deltaT) @ rho
+        np.testing.assert_allclose(populations[1, -1], np.real(rho[::5]),
+                                   atol=1e-10)
+
+    def test_doppler_nodes(self):
+        temperature = 20e-6
+        sigma_v = np.sqrt(const.k * temperature / self.mass)
+        k1, k2 = 2 * np.pi / 456e-9, 2 * np.pi / 1064e-9
+
+        # counter-propagating beams only need one dimension
+        Delta_shifts, delta_shifts, weights = get_doppler_nodes(
+            temperature, 10, mass=self.mass)
+        self.assertEqual(len(weights), 10)
+        self.assertAlmostEqual(np.sum(weights), 1)
+        np.testing.assert_allclose(delta_shifts * k1,
+                                   Delta_shifts * (k1 - k2))
+        self.assertAlmostEqual(np.sqrt(weights @ Delta_shifts**2),
+                               sigma_v * k1)
+
+        Delta_shifts, delta_shifts, weights = get_doppler_nodes(
+            temperature, 10, couple_direction=(1, 0, 0), mass=self.mass)
+        self.assertEqual(len(weights), 100)
+        coupling_shifts = delta_shifts - Delta_shifts
+        np.testing.assert_allclose(
+            [weights @ Delta_shifts**2, weights @ coupling_shifts**2,
+             weights @ (Delta_shifts * coupling_shifts)],
+            [(sigma_v * k1)**2, (sigma_v * k2)**2, 0],
+            atol=1e-9 * (sigma_v * k1)**2)
+
+    def test_doppler_average(self):
+        temperature = 50e-6
+        result = doppler_average(self.time_array, self.Omega12,
+                                 self.Omega23, self.Delta, 0.0, temperature,
+                                 num_nodes=10, mass=self.mass)
+        self.assertEqual(result["populations"].shape,
+                         (len(self.time_array), 4))
+        converged = doppler_average(self.time_array, self.Omega12,
+                                    self.Omega23, self.Delta, 0.0,
+                                    temperature, num_nodes=30,
+                                    mass=self.mass)
+        np.testing.assert_allclose(result["populations"],
+                                   converged["populations"], atol=1e-6)
+
+        # random velocities converge to the quadrature
+        rng = np.random.default_rng(0)
+        velocities = rng.normal(size=500) * np.sqrt(
+            const.k * temperature / self.mass)
+        k1, k2 = 2 * np.pi / 456e-9, 2 * np.pi / 1064e-9
+        samples = evolve_batch(
+            self.time_array, self.Omega12, self.Omega23,
+            self.Delta + k1 * velocities[:, np.newaxis],
+            (k1 - k2) * velocities[:, np.newaxis])[:, -1]
+        np.testing.assert_array_less(
+            np.abs(samples.mean(axis=0) - result["populations"][-1]),
+            4 * samples.std(axis=0) / np.sqrt(len(samples)) + 1e-12)
+        self.assertGreater(result["variance"][-1, 2], 1e-8)
+
+    def test_intensity_noise_nodes(self):
+        # mean intensity at the atom, <(1 + RIN x) exp(-2 r^2 / w^2)>
+        probe_scales, couple_scales, weights = get_intensity_noise_nodes(
+            probe_rin=0.02, couple_rin=0.01, probe_pointing=2e-6,
+            couple_pointing=3e-6, laserWaist=25e-6, num_nodes=4)
+        self.assertEqual(len(weights), 4**4)
+        self.assertAlmostEqual(np.sum(weights), 1)
+        self.assertAlmostEqual(weights @ probe_scales**2,
+                               1 / (1 + 4 * (2e-6 / 25e-6)**2))
+        self.assertAlmostEqual(weights @ couple_scales**2,
+                               1 / (1 + 4 * (3e-6 / 25e-6)**2))
+
+        probe_scales, couple_scales, weights = get_intensity_noise_nodes(
+            couple_rin=0.05, num_nodes=4)
+        self.assertEqual(len(weights), 4)
+        np.testing.assert_allclose(probe_scales, 1)
+
+    def test_intensity_noise_average(self):
+        noise = {"probe_rin": 0.05, "couple_pointing": 4e-6}
+        nominal = evolve_batch(self.time_array, self.Omega12, self.Omega23,
+                               self.Delta, 0.0)[0]
+        result = intensity_noise_average(
+            self.time_array, self.Omega12, self.Omega23, self.Delta, 0.0,
+            num_nodes=6, **noise)
+        self.assertEqual(result["node_populations"].shape,
+                         (36, len(self.time_array), 4))
+        self.assertGreater(result["variance"][-1, 2], 1e-6)
+        self.assertFalse(np.allclose(result["populations"][-1], nominal[-1],
+                                     atol=1e-4))
+
+        samples = intensity_noise_average(
+            self.time_array, self.Omega12, self.Omega23, self.Delta, 0.0,
+            num_samples=500, seed=0, **noise)
+        np.testing.assert_array_less(
+            np.abs(samples["populations"][-1] - result["populations"][-1]),
+            4 * np.sqrt(samples["variance"][-1] / 500) + 1e-12)
+
+        # without noise the average is the nominal evolution
+        result = intensity_noise_average(self.time_array, self.Omega12,
+                                         self.Omega23, self.Delta, 0.0)
+        np.testing.assert_allclose(result["populations"], nominal)
+        np.testing.assert_allclose(result["variance"], 0, atol=1e-20)
+
+
+if __name__ == '__main__':
+    unittest.main()
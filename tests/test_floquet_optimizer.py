@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from models.spin_chain import LatticeGraph, SparseEngine
+from models.floquet_optimizer import FloquetOptimizer
+
+
+class FloquetOptimizerTestCase(unittest.TestCase):
+    @staticmethod
+    def field(t, i):
+        return {"a": 0.7 * (i % 3), "b": -0.4, "target": 0.0}[t]
+
+    @staticmethod
+    def exchange(t, i, j):
+        return {"a": 0.5, "b": 0.2, "target": 0.3}[t]
+
+    def setUp(self):
+        terms = [['xx', self.exchange, 'nn'], ['yy', self.exchange, 'nn'],
+                 ['z', self.field, np.inf],
+                 ['zz', lambda t, i, j: 0.6 if t == "target" else 0.1, 'nn'],
+                 ['+-', 0.1, 'nnn'], ['-+', 0.1, 'nnn']]
+        graph = LatticeGraph.from_interactions(5, terms, pbc=True)
+        self.engine = SparseEngine(graph)
+
+    def test_gradient(self):
+        for ignore_global_phase in [False, True]:
+            optimizer = FloquetOptimizer(
+                self.engine, ["a", "b", "a"], "target",
+                couplings=['zz', 'xx', '-+'],
+                ignore_global_phase=ignore_global_phase)
+            self.assertEqual(optimizer.couplings, ['zz', 'xx', '+-'])
+            dt_list = np.array([0.3, 0, 0.5])
+            scales = np.random.default_rng(0).uniform(0.5, 1.5, (3, 3))
+            _, grad_dt, grad_scales = optimizer.loss_and_gradient(dt_list,
+                                                                  scales)
+            h = 1e-6
+            for k in [0, 2]:
+                step = np.zeros(3)
+                step[k] = h
+                numerical = (optimizer.loss_and_gradient(
+                    dt_list + step, scales)[0] - optimizer.loss_and_gradient(
+                    dt_list - step, scales)[0]) / (2 * h)
+                self.assertAlmostEqual(grad_dt[k], numerical, places=5)
+            self.assertEqual(grad_dt[1], 0)
+            for index in np.ndindex(scales.shape):
+                step = np.zeros(scales.shape)
+                step[index] = h
+                numerical = (optimizer.loss_and_gradient(
+                    dt_list, scales + step)[0] - optimizer.loss_and_gradient(
+                    dt_list, scales - step)[0]) / (2 * h)
+                self.assertAlmostEqual(grad_scales[index], numerical,
+                                       places=5)
+
+    def test_optimize(self):
+        optimizer = FloquetOptimizer(self.engine, ["a"], "target",
+                                     couplings=['xx', 'yy', 'z', 'zz', '+-'],
+                                     optimize_durations=False)
+        result = optimizer.optimize([1.0])
+        self.assertLess(result["loss"], 1e-8)
+        np.testing.assert_allclose(result["scales"],
+                                   [[0.6, 0.6, 0, 6, 1]], atol=1e-4)
+        np.testing.assert_allclose(
+            optimizer.get_floquet_hamiltonian(result["dt_list"],
+                                              result["scales"]),
+            optimizer.target, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
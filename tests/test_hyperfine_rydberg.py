@@ -0,0 +1,78 @@
+import unittest
+import numpy as np
+import scipy.constants as const
+from models.hyperfine_rydberg import HyperfineRydberg
+from models.ensemble_averaging import evolve_batch
+
+
+class HyperfineRydbergTestCase(unittest.TestCase):
+    def setUp(self):
+        self.time_array = np.linspace(0, 1e-6, 401)
+        self.parameters = (2 * np.pi * 20e6 * np.sin(
+            np.pi * self.time_array / 1e-6)**2, 2 * np.pi * 20e6,
+            2 * np.pi * 100e6, 0.0)
+
+    def test_operators(self):
+        model = HyperfineRydberg(ground_f=(3, 4))
+        self.assertEqual(model.num_states, 16 + 32 + 48)
+        H = model.get_hamiltonian(1.0, 2.0, 3.0, 4.0)
+        self.assertEqual(abs(H - H.conj().T).max(), 0)
+
+        # hyperfine couplings agree with ARC, relative to |4, 4> -> |5', 5>
+        coupling = model.get_operators()['ge'].toarray()
+        reference = model.atom.getDipoleMatrixElement(6, 0, 0.5, 0.5, 7, 1,
+                                                      1.5, 1.5, 1)
+        for i, (manifold, f, mf) in enumerate(model.labels):
+            for k, (upper, f2, mf2) in enumerate(model.labels):
+                if manifold == 'g' and upper == 'e' and mf2 == mf + 1:
+                    self.assertAlmostEqual(
+                        coupling[k, i], model.atom.getDipoleMatrixElementHFS(
+                            6, 0, 0.5, f, mf, 7, 1, 1.5, f2, mf2, 1) /
+                        reference)
+
+        A, B = model.atom.getHFSCoefficients(6, 0, 0.5)
+        shifts = model.get_hyperfine_shifts()
+        self.assertAlmostEqual(
+            shifts[model.index('g', 3, 0)] / (2 * np.pi),
+            model.atom.getHFSEnergyShift(0.5, 3, A, B) -
+            model.atom.getHFSEnergyShift(0.5, 4, A, B))
+        self.assertEqual(shifts[model.reference_states[1]], 0)
+
+    def test_reference_ladder(self):
+        # pure sigma+ polarizations from the stretched state form a closed
+        # three-level ladder
+        model = HyperfineRydberg()
+        psi, populations = model.evolve(model.get_state(), self.time_array,
+                                        *self.parameters)
+        expected = evolve_batch(self.time_array, *self.parameters)[0]
+        np.testing.assert_allclose(
+            populations[:, model.reference_states], expected[:, :3],
+            atol=1e-10)
+        np.testing.assert_allclose(model.get_level_populations(psi),
+                                   list(expected[-1, :3]) + [0], atol=1e-10)
+
+    def test_leakage(self):
+        model = HyperfineRydberg(polarization1=[0.1, 0, 1],
+                                 magnetic_field=1e-4)
+        psi0 = model.get_state()
+        psi, populations = model.evolve(np.stack([psi0, psi0], axis=1),
+                                        self.time_array, *self.parameters)
+        self.assertEqual(populations.shape,
+                         (len(self.time_array), model.num_states, 2))
+        levels = model.get_level_populations(psi)
+        self.assertEqual(levels.shape, (2, 4))
+        self.assertAlmostEqual(np.sum(levels[0, :3]), 1)
+        self.assertGreater(levels[0, 3], 1e-3)
+        # the stretched states shift like their fine-structure components
+        zeeman = model.get_zeeman_shifts()
+        for manifold, (l, j, mj) in zip('ger', ((0, 0.5, 0.5), (1, 1.5, 1.5),
+                                               (2, 2.5, 2.5))):
+            expected = model.atom.getZeemanEnergyShift(l, j, mj, 1e-4) / \
+                const.hbar
+            self.assertAlmostEqual(
+                zeeman[model.reference_states['ger'.index(manifold)]] /
+                expected, 1, places=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
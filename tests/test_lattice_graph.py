@@ -54,5 +54,115 @@ class LatticeGraphTestCase(unittest.TestCase):
         self.assertEqual(minus_DM_dict, graph("-DM"))
         self.assertEqual(minus_DM_pbc_dict, graph_pbc("-DM"))
 
+    def test_compile(self):
+        terms = [['XX', self.native, 'nn'], ['yy', 0.25, 'nnn'],
+                 ['z', self.DM_z_period4, np.inf]]
+        graph = LatticeGraph.from_interactions(4, terms, pbc=True)
+        compiled = graph.compile()
+
+        np.testing.assert_array_equal(compiled['xx'][0],
+                                      [[0, 1], [1, 2], [2, 3], [3, 0]])
+        np.testing.assert_array_equal(compiled['yy'][0],
+                                      [[0, 2], [1, 3], [2, 0], [3, 1]])
+        np.testing.assert_array_equal(compiled['z'][0], [[0], [1], [2], [3]])
+        coefficients = graph.coefficients("+DM")
+        np.testing.assert_allclose(coefficients['xx'], 0)
+        np.testing.assert_allclose(coefficients['yy'], 0.25)
+        np.testing.assert_allclose(coefficients['z'],
+                                   np.pi / 2 * np.arange(4))
+        # memoized per label
+        self.assertIs(graph.coefficients("+DM"), coefficients)
+
+        # graphs built from a raw dictionary compile the same way
+        raw_graph = LatticeGraph(4, graph.interaction_dict)
+        self.assertEqual(raw_graph("+DM"), graph("+DM"))
+
+    def test_coefficient_cache(self):
+        graph = LatticeGraph.from_interactions(4, [['zz', 1.0, 'nn']])
+        np.testing.assert_allclose(graph.coefficients(0.0)['zz'], 1.0)
+
+        # reassigning the interactions must not serve stale coefficients
+        graph.interaction_dict = {'zz': [[lambda t: 2.0 + t, 0, 1]]}
+        np.testing.assert_array_equal(graph.compile()['zz'][0], [[0, 1]])
+        np.testing.assert_allclose(graph.coefficients(0.0)['zz'], [2.0])
+        np.testing.assert_allclose(graph.coefficients(1.0)['zz'], [3.0])
+
+        # in-place modifications are picked up after clear_cache
+        graph.interaction_dict['zz'].append([0.5, 1, 2])
+        graph.clear_cache()
+        np.testing.assert_allclose(graph.coefficients(0.0)['zz'], [2.0, 0.5])
+
+    def test_bond_counts(self):
+        # nn and nnn chains have num_sites - k bonds when open and num_sites
+        # bonds when periodic, i.e. both wrap-around bonds for nnn
+        for pbc, num_nn, num_nnn in [(False, 5, 4), (True, 6, 6)]:
+            graph = LatticeGraph.from_interactions(
+                6, [['xx', 1, 'nn'], ['yy', 1, 'nnn']], pbc=pbc)
+            compiled = graph.compile()
+            self.assertEqual(len(compiled['xx'][0]), num_nn)
+            self.assertEqual(len(compiled['yy'][0]), num_nnn)
+        np.testing.assert_array_equal(compiled['yy'][0][-2:], [[4, 0], [5, 1]])
+
+        # long-range terms couple all ordered pairs i != j
+        graph = LatticeGraph.from_interactions(6, [['zz', 1.0, 3]])
+        sites = graph.compile()['zz'][0]
+        self.assertEqual(len(sites), 6 * 5)
+        self.assertFalse(np.any(sites[:, 0] == sites[:, 1]))
+        self.assertTrue(np.all(np.isfinite(graph.coefficients(0.0)['zz'])))
+
+    def test_long_range(self):
+        graph = LatticeGraph.from_interactions(3, [['zz', 1.0, 3]])
+        expected = {'zz': [[1.0, 0, 1], [0.125, 0, 2], [1.0, 1, 0],
+                           [1.0, 1, 2], [0.125, 2, 0], [1.0, 2, 1]]}
+        self.assertEqual(expected, graph(0.0))
+
+    def test_from_lattice(self):
+        terms = [['xx', 0.5, 'nn'], ['zz', 0.3, 'nnn'],
+                 ['z', lambda t, i: 0.1 * i, np.inf], ['zz', 1.0, 3]]
+        chain = LatticeGraph.from_lattice('chain', 5, terms)
+        self.assertEqual(chain(0.0),
+                         LatticeGraph.from_interactions(5, terms)(0.0))
+        np.testing.assert_allclose(chain.positions, np.arange(5)[:, None])
+
+        # (nn, nnn) bonds of each geometry, open and periodic
+        expected = {('square', (4, 3)): [(17, 12), (24, 24)],
+                    ('triangular', (4, 4)): [(33, 23), (48, 40)],
+                    ('ladder', 5): [(13, 8), (15, 10)]}
+        for (geometry, shape), counts in expected.items():
+            for pbc, (num_nn, num_nnn) in zip([False, True], counts):
+                graph = LatticeGraph.from_lattice(
+                    geometry, shape, [['xx', 1, 'nn'], ['yy', 1, 'nnn']],
+                    pbc=pbc, spacing=2.0)
+                compiled = graph.compile()
+                self.assertEqual(len(compiled['xx'][0]), num_nn)
+                self.assertEqual(len(compiled['yy'][0]), num_nnn)
+        with self.assertRaises(ValueError):
+            LatticeGraph.from_lattice('triangular', (4, 3), terms, pbc=True)
+
+    def test_from_positions(self):
+        positions = np.random.default_rng(0).uniform(0, 10, (60, 2))
+        graph = LatticeGraph.from_positions(positions, [['zz', 2.0, 6]],
+                                            cutoff=3.0)
+        sites, _ = graph.compile()['zz']
+        distance = np.linalg.norm(positions[:, None] - positions[None],
+                                  axis=-1)
+        i, j = np.nonzero((distance <= 3.0) & (distance > 0))
+        np.testing.assert_array_equal(sites, np.stack([i, j], axis=1))
+        np.testing.assert_allclose(graph.coefficients(0.0)['zz'],
+                                   2.0 / distance[i, j]**6)
+
+        # minimum image distances in a periodic box, open along y
+        graph = LatticeGraph.from_positions([[0.5, 0], [9.5, 0], [0.5, 9]],
+                                            [['zz', 1.0, 3]],
+                                            box=[10, None])
+        self.assertEqual(graph(0.0)['zz'][:2], [[1.0, 0, 1], [1 / 9**3, 0, 2]])
+
+        # without a cutoff all ordered pairs are coupled, as in
+        # from_interactions
+        chain = LatticeGraph.from_positions(np.arange(4), [['zz', 1.0, 3]])
+        self.assertEqual(chain(0.0), LatticeGraph.from_interactions(
+            4, [['zz', 1.0, 3]])(0.0))
+
+
 if __name__ == '__main__':
     unittest.main()
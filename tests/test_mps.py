@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from scipy.linalg import expm
+from models import mps
+from models.spin_chain import LatticeGraph, DiagonEngine
+
+
+class MPSTestCase(unittest.TestCase):
+    def setUp(self):
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'], ['xy', 0.2, 'nn'],
+                 ['z', lambda t, i: 0.7 * (i % 3), np.inf],
+                 ['zz', 0.3, 'nnn'], ['x', 0.1, np.inf], ['+-', 0.2, 'nnn'],
+                 ['-+', 0.2, 'nnn']]
+        self.graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        self.terms = mps.local_terms(self.graph, 0.0)
+        self.hamiltonian = DiagonEngine(self.graph).get_sparse_hamiltonian(
+            0.0).toarray()
+
+    def test_mpo(self):
+        mpo = mps.build_mpo(self.terms, self.graph.num_sites)
+        np.testing.assert_allclose(mps.mpo_to_matrix(mpo), self.hamiltonian,
+                                   atol=1e-12)
+        self.assertAlmostEqual(mps.mpo_overlap(mpo, mpo),
+                               np.sum(np.abs(self.hamiltonian) ** 2))
+
+    def test_dmrg(self):
+        mpo = mps.build_mpo(self.terms, self.graph.num_sites)
+        energy, state = mps.dmrg(mpo, mps.MPS.random(6, 4, rng=0))
+        energies, vectors = np.linalg.eigh(self.hamiltonian)
+        self.assertAlmostEqual(energy, energies[0], places=8)
+        self.assertAlmostEqual(abs(np.vdot(vectors[:, 0], state.to_vector())),
+                               1, places=6)
+
+    def test_tebd(self):
+        state = mps.MPS.random_product_state(6, rng=1)
+        expected = expm(-1j * 0.4 * self.hamiltonian) @ state.to_vector()
+        mps.tebd_evolve(state, self.terms, 0.4, num_steps=40)
+        np.testing.assert_allclose(state.to_vector(), expected, atol=1e-3)
+        self.assertAlmostEqual(state.norm(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
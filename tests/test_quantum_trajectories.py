@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+from scipy.linalg import expm
+from models.quantum_trajectories import TrajectorySolver
+from models.rydberg_blockade import RydbergBlockade
+from models.rydberg_dynamics import LossyRydberg
+
+
+class TrajectorySolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.time_array = np.linspace(0, 1e-6, 201)
+        self.Omega12 = 2 * np.pi * 20e6 * np.sin(
+            np.pi * self.time_array / 1e-6)**2
+        self.parameters = (self.Omega12, 2 * np.pi * 15e6, 2 * np.pi * 30e6,
+                           0.0)
+
+    def lindblad_populations(self, jump_operators):
+        # piecewise-constant Liouvillian of LossyRydberg, row-major vec(rho)
+        identity = np.identity(4)
+        rho = np.diag([1, 0, 0, 0]).astype(np.complex128).ravel()
+        populations = [np.real(rho[::5])]
+        for i, deltaT in enumerate(np.diff(self.time_array)):
+            H = LossyRydberg.get_hamiltonian(self.Omega12[i],
+                                             *self.parameters[1:])
+            liouvillian = -1j * (np.kron(H, identity) -
+                                 np.kron(identity, H.T))
+            for L in jump_operators:
+                LdL = L.conj().T @ L
+                liouvillian += np.kron(L, L.conj()) - 0.5 * (
+                    np.kron(LdL, identity) + np.kron(identity, LdL.T))
+            rho = expm(liouvillian * deltaT) @ rho
+            populations.append(np.real(rho[::5]))
+        return np.array(populations)
+
+    def test_lossy_rydberg(self):
+        solver = TrajectorySolver.from_lossy_rydberg(
+            self.time_array, *self.parameters, gamma2=2e6, gamma3=5e5)
+        result = solver.run(np.array([1, 0, 0, 0]), num_trajectories=2000,
+                            batch_size=500, seed=1)
+        self.assertEqual(result["num_trajectories"], 2000)
+        self.assertGreater(result["num_jumps"], 0)
+        expected = self.lindblad_populations(
+            [L.toarray() for L in solver.jump_operators])
+        np.testing.assert_array_less(
+            np.abs(result["populations"] - expected),
+            4 * result["std_error"] + 2e-3)
+
+        # batches draw independent streams, whichever process runs them
+        parallel = solver.run(np.array([1, 0, 0, 0]), num_trajectories=2000,
+                              batch_size=500, seed=1, n_jobs=2)
+        np.testing.assert_allclose(parallel["populations"],
+                                   result["populations"])
+
+        # a bounded cache and constant Hamiltonians reproduce the results
+        bounded = TrajectorySolver.from_lossy_rydberg(
+            self.time_array, *self.parameters, gamma2=2e6, gamma3=5e5)
+        bounded.max_cache_bytes = 10 * 16 * 4**2
+        np.testing.assert_allclose(
+            bounded.run(np.array([1, 0, 0, 0]), num_trajectories=2000,
+                        batch_size=500, seed=1)["populations"],
+            result["populations"])
+        self.assertEqual(len(bounded._propagators), 10)
+        constant = TrajectorySolver.from_lossy_rydberg(
+            self.time_array, 2 * np.pi * 20e6, *self.parameters[1:],
+            gamma2=2e6, gamma3=5e5)
+        constant.run(np.array([1, 0, 0, 0]), num_trajectories=10)
+        self.assertEqual(len(constant._propagators), 1)
+
+        converged = solver.run(np.array([1, 0, 0, 0]),
+                               num_trajectories=10000, batch_size=200,
+                               seed=1, tol=0.02)
+        self.assertLess(converged["num_trajectories"], 10000)
+        self.assertLess(converged["history"][-1][1], 0.02)
+
+    def test_blockade(self):
+        atoms = RydbergBlockade([0, 3e-6, 6e-6], C6=1e-24, max_rydberg=1,
+                                loss_state=True)
+        psi0 = atoms.product_state('ggg')
+        # without decay every trajectory follows the unitary evolution
+        solver = TrajectorySolver.from_blockade(
+            atoms, self.time_array, *self.parameters, gamma2=0, gamma3=0)
+        result = solver.run(psi0, num_trajectories=4, batch_size=2)
+        _, expected = atoms.evolve(psi0, self.time_array, *self.parameters)
+        np.testing.assert_allclose(
+            result["populations"].reshape(expected.shape), expected,
+            atol=1e-10)
+
+        solver = TrajectorySolver.from_blockade(
+            atoms, self.time_array, *self.parameters, gamma2=2e6, gamma3=5e5)
+        populations = solver.run(psi0, num_trajectories=200,
+                                 seed=0)["populations"].reshape(
+            expected.shape)
+        np.testing.assert_allclose(populations.sum(axis=-1), 1)
+        self.assertGreater(np.min(populations[-1, :, atoms.level('l')]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import numpy as np
+from scipy.linalg import expm
+from models.rydberg_blockade import RydbergBlockade
+from models.rydberg_dynamics import UnitaryRydberg
+
+
+class RydbergBlockadeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.time_array = np.linspace(0, 1e-6, 201)
+        self.Omega12 = 2 * np.pi * 20e6 * np.sin(
+            np.pi * self.time_array / 1e-6)**2
+        self.parameters = (self.Omega12, 2 * np.pi * 15e6, 2 * np.pi * 100e6,
+                           2 * np.pi * 0.5e6)
+
+    def test_independent_atoms(self):
+        atoms = RydbergBlockade([0, 3e-6, 7e-6], C6=0.0, dark_state=False)
+        _, populations = atoms.evolve(atoms.product_state('ggg'),
+                                      self.time_array, *self.parameters)
+        self.assertEqual(populations.shape, (201, 3, 3))
+
+        psi = np.array([1, 0, 0], dtype=np.complex128)
+        for i, deltaT in enumerate(np.diff(self.time_array)):
+            H = UnitaryRydberg.get_hamiltonian(self.Omega12[i],
+                                               *self.parameters[1:])
+            psi = expm(-1j * deltaT * H) @ psi
+        for atom in range(3):
+            np.testing.assert_allclose(populations[-1, atom], np.abs(psi)**2,
+                                       atol=1e-10)
+
+    def test_blockade_truncation(self):
+        positions = [[0, 0], [3e-6, 0], [0, 4e-6]]
+        full = RydbergBlockade(positions, C6=1e-24)
+        blockaded = RydbergBlockade(positions, C6=1e-24, max_rydberg=1)
+        self.assertEqual((full.num_states, blockaded.num_states), (64, 54))
+        H = full.get_hamiltonian(*[p if np.isscalar(p) else p[10] for p in
+                                   self.parameters])
+        np.testing.assert_allclose(H.toarray(), H.toarray().conj().T)
+
+        psi, expected = full.evolve(full.product_state('gg0'),
+                                    self.time_array, *self.parameters)
+        _, populations = blockaded.evolve(blockaded.product_state('gg0'),
+                                          self.time_array, *self.parameters)
+        # up to virtual couplings to the shifted states, of order Omega^2 / V
+        np.testing.assert_allclose(populations, expected, atol=5e-3)
+        # doubly excited states are shifted out of resonance
+        doubly_excited = np.sum(full.states == full.level('r'), axis=1) > 1
+        self.assertGreater(np.max(expected[:, 0, full.level('r')]), 0.1)
+        self.assertLess(np.sum(np.abs(psi[doubly_excited])**2), 1e-3)
+
+    def test_truncated_basis(self):
+        # the truncated basis is enumerated directly, without the 4^10
+        # product states
+        atoms = RydbergBlockade(np.arange(10) * 3e-6, C6=1e-24,
+                                max_rydberg=1)
+        self.assertEqual(atoms.num_states, 3**10 + 10 * 3**9)
+        self.assertTrue(np.all(np.diff(atoms.codes) > 0))
+        self.assertLessEqual(
+            np.max(np.sum(atoms.states == atoms.level('r'), axis=1)), 1)
+        np.testing.assert_array_equal(atoms.index(atoms.states),
+                                      np.arange(atoms.num_states))
+        self.assertEqual(atoms.index(np.full(10, atoms.level('r'))), -1)
+        H = atoms.get_hamiltonian(1e6, 2e6, 0.0, 0.0)
+        self.assertEqual(H.shape, (atoms.num_states, atoms.num_states))
+
+    def test_gate_unitary(self):
+        atoms = RydbergBlockade([0, 3e-6], C6=0.0)
+        U = atoms.gate_unitary(self.time_array, *self.parameters)
+        self.assertEqual(U.shape, (4, 4))
+        self.assertAlmostEqual(U[0, 0], 1)
+        np.testing.assert_allclose(U - np.diag(np.diag(U)), 0, atol=1e-12)
+        # without interactions the gate factorizes
+        self.assertAlmostEqual(U[3, 3], U[1, 1] * U[2, 2])
+
+        interacting = RydbergBlockade([0, 3e-6], C6=1e-24, max_rydberg=1)
+        U_blockade = interacting.gate_unitary(self.time_array,
+                                              *self.parameters)
+        np.testing.assert_allclose(np.diag(U_blockade)[:3], np.diag(U)[:3],
+                                   atol=1e-12)
+        self.assertGreater(abs(U_blockade[3, 3] - U[3, 3]), 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,342 @@
+import unittest
+import numpy as np
+import quspin
+from quspin.basis import spin_basis_1d
+from scipy.linalg import expm
+from models.spin_chain import (LatticeGraph, DiagonEngine, KrylovEngine,
+                               DMRGEngine, SparseEngine, PauliBasis,
+                               QuenchEngine)
+from models import mps
+from models.utility import HiddenPrints
+
+
+class DiagonEngineTestCase(unittest.TestCase):
+    @staticmethod
+    def DM_z_period4(t, i):
+        phase = np.pi / 2 * (i % 4)
+        if t == "+DM":
+            return phase
+        elif t == "-DM":
+            return -phase
+        else:
+            return 0
+
+    @staticmethod
+    def native(t, i, j):
+        if t in ["+DM", "-DM"]:
+            return 0
+        else:
+            return 0.5
+
+    def setUp(self):
+        terms = [['XX', self.native, 'nn'], ['yy', self.native, 'nn'],
+                 ['z', self.DM_z_period4, np.inf], ['zz', 0.3, 'nnn']]
+        self.graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        self.engine = DiagonEngine(self.graph)
+
+    def test_cached_hamiltonian_matches_quspin(self):
+        basis = spin_basis_1d(L=self.graph.num_sites)
+        for t in ["+DM", "-DM", "native"]:
+            interactions = self.graph(t)
+            static = [[key, interactions[key]] for key in interactions]
+            with HiddenPrints():
+                expected = quspin.operators.hamiltonian(static, [],
+                                                        basis=basis)
+            np.testing.assert_allclose(
+                self.engine.get_sparse_hamiltonian(t).toarray(),
+                expected.toarray())
+            np.testing.assert_allclose(
+                self.engine.get_quspin_hamiltonian(t).toarray(),
+                expected.toarray())
+        self.assertIs(self.engine.get_basis(), self.engine.get_basis())
+
+    def test_symmetry_sectors(self):
+        params = ["+DM", "native", "-DM"]
+        sectors = self.engine.get_symmetry_sectors(params)
+        # the period-4 fields break translation symmetry on 6 sites
+        self.assertEqual(sectors, [{'Nup': n} for n in range(7)])
+
+        # a uniform field keeps it, here in units of a two-site cell
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'], ['z', 0.2, np.inf]]
+        graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        sectors = DiagonEngine(graph, unit_cell_length=2
+                               ).get_symmetry_sectors(params)
+        self.assertEqual(len(sectors), 7 * 3)
+        self.assertEqual(sectors[1], {'Nup': 0, 'kblock': 1})
+
+        # an xx coupling without the matching yy does not conserve Sz
+        terms = [['xx', 0.5, 'nn'], ['z', 0.2, np.inf]]
+        graph = LatticeGraph.from_interactions(6, terms, pbc=False)
+        self.assertEqual(DiagonEngine(graph).get_symmetry_sectors(params),
+                         [{}])
+
+    def test_block_floquet_hamiltonian(self):
+        params = ["+DM", "native", "-DM"]
+        dt_list = [0, 0.7, 0]
+        full = self.engine.get_quspin_floquet_hamiltonian(params, dt_list)
+        blocks = self.engine.get_block_floquet_hamiltonians(params, dt_list)
+        self.assertEqual(len(blocks), 7)
+        np.testing.assert_allclose(
+            np.sort(np.concatenate([np.linalg.eigvalsh(block) for block in
+                                    blocks.values()])),
+            np.sort(np.linalg.eigvalsh(full)), atol=1e-10)
+
+        sectors = self.engine.get_symmetry_sectors(params)
+        target = self.engine.get_quspin_hamiltonian("native")
+        target_blocks = self.engine.get_block_hamiltonians("native", sectors)
+        self.assertAlmostEqual(
+            self.engine.frobenius_loss(blocks, target_blocks),
+            self.engine.frobenius_loss(full, target))
+        self.assertAlmostEqual(
+            self.engine.norm_identity_loss(blocks, target_blocks),
+            self.engine.norm_identity_loss(full, target))
+
+    def test_sweep_floquet(self):
+        params = ["+DM", "native", "-DM"]
+        dt_lists = [[0, 0.1 * k, 0] for k in range(1, 7)]
+        target = self.engine.get_quspin_hamiltonian("native")
+        expected = [self.engine.get_quspin_floquet_hamiltonian(params, dt)
+                    for dt in dt_lists[:2]]
+
+        losses, hamiltonians = self.engine.sweep_floquet(
+            params, dt_lists, target=target, return_hamiltonians=True)
+        for HF, expected_HF in zip(hamiltonians, expected):
+            np.testing.assert_allclose(HF, expected_HF, atol=1e-10)
+        np.testing.assert_allclose(
+            losses[:2], [self.engine.frobenius_loss(HF, target)
+                         for HF in expected], atol=1e-10)
+
+        parallel_losses, parallel_hamiltonians = self.engine.sweep_floquet(
+            params, dt_lists, target=target, n_jobs=2, chunk_size=2)
+        self.assertIsNone(parallel_hamiltonians)
+        np.testing.assert_allclose(parallel_losses, losses, atol=1e-12)
+
+    def test_magnus_floquet_hamiltonian(self):
+        # the nnn zz coupling also acts during the pulses, which therefore do
+        # not cancel
+        with self.assertRaises(ValueError):
+            self.engine.get_magnus_floquet_hamiltonian(
+                ["+DM", "native", "-DM"], [0, 0.3, 0])
+
+        terms = [['XX', self.native, 'nn'], ['yy', self.native, 'nn'],
+                 ['z', self.DM_z_period4, np.inf]]
+        engine = DiagonEngine(LatticeGraph.from_interactions(6, terms,
+                                                             pbc=True))
+        # in the toggling frame a single finite step is exact to first order
+        np.testing.assert_allclose(
+            engine.get_magnus_errors(["+DM", "native", "-DM"], [0, 0.3, 0]),
+            0, atol=1e-10)
+
+        # the error of order n scales as dt^n
+        errors = np.array([engine.get_magnus_errors(
+            ["+DM", "native"], [0.1 * scale, 0.2 * scale],
+            toggling_frame=False) for scale in [1, 0.5]])
+        np.testing.assert_allclose(errors[0] / errors[1], [2, 4, 8],
+                                   rtol=0.2)
+
+    def test_losses(self):
+        H1 = self.engine.get_quspin_hamiltonian("native")
+        H2 = self.engine.get_quspin_hamiltonian("+DM")
+        A, B = H1.toarray(), H2.toarray()
+        expected = np.linalg.norm(expm(-1j * A).conj().T @ expm(-1j * B) -
+                                  np.identity(len(A)))
+        self.assertAlmostEqual(self.engine.norm_identity_loss(H1, H2),
+                               expected)
+        # the unitary of a repeated argument is cached
+        self.assertIs(self.engine.get_unitary(H2),
+                      self.engine.get_unitary(H2))
+        self.assertAlmostEqual(self.engine.norm_identity_loss(A, H2),
+                               expected)
+        self.assertAlmostEqual(
+            self.engine.norm_identity_loss(H1, H2, num_samples=2000,
+                                           seed=0) / expected, 1,
+            delta=0.05)
+
+        expected = 1 - np.sqrt(np.abs(np.trace(A.conj().T @ B)) / np.sqrt(
+            np.trace(A.conj().T @ A).real * np.trace(B.conj().T @ B).real))
+        self.assertAlmostEqual(self.engine.frobenius_loss(H1, H2), expected)
+        self.assertAlmostEqual(self.engine.frobenius_loss(H1.tocsr(), B),
+                               expected)
+
+
+class SparseEngineTestCase(unittest.TestCase):
+    def test_pauli_basis(self):
+        for Nup in [None, 2]:
+            basis = PauliBasis(4, Nup=Nup)
+            expected_basis = spin_basis_1d(4, Nup=Nup)
+            np.testing.assert_array_equal(basis.states, expected_basis.states)
+            for op, sites in [('z', [1]), ('x', [1]), ('y', [2]), ('+', [0]),
+                              ('-', [3]), ('+-', [0, 2]), ('xy', [1, 2]),
+                              ('zx', [0, 3]), ('xy', [1, 1])]:
+                matrices = []
+                for b in (basis, expected_basis):
+                    ME, row, col = b.Op(op, sites, 0.5, np.complex128)
+                    matrix = np.zeros((b.Ns, b.Ns), dtype=complex)
+                    np.add.at(matrix, (row, col), ME)
+                    matrices.append(matrix)
+                np.testing.assert_allclose(*matrices, err_msg=op)
+
+    def test_matches_diagon_engine(self):
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'], ['+-', 0.2, 'nnn'],
+                 ['-+', 0.2, 'nnn'],
+                 ['z', lambda t, i: 0.7 * (i % 3) if t == "a" else -0.4,
+                  np.inf], ['zz', 0.3, 'nnn']]
+        graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        engine, reference = SparseEngine(graph), DiagonEngine(graph)
+        for sector in [None, {'Nup': 2}]:
+            np.testing.assert_allclose(
+                engine.get_sparse_hamiltonian("a", sector).toarray(),
+                reference.get_sparse_hamiltonian("a", sector).toarray())
+
+        params, dt_list = ["a", "b"], [0.3, 0]
+        HF = engine.get_floquet_hamiltonian(params, dt_list)
+        np.testing.assert_allclose(
+            HF, reference.get_quspin_floquet_hamiltonian(params, dt_list),
+            atol=1e-10)
+        blocks = engine.get_block_floquet_hamiltonians(params, dt_list)
+        self.assertEqual(len(blocks), 7)
+        np.testing.assert_allclose(
+            np.sort(np.concatenate([np.linalg.eigvalsh(block) for block in
+                                    blocks.values()])),
+            np.sort(np.linalg.eigvalsh(HF)), atol=1e-10)
+
+        # QuSpin objects are built on the equivalent spin_basis_1d
+        np.testing.assert_allclose(
+            engine.get_quspin_hamiltonian("a", {'Nup': 2}).toarray(),
+            reference.get_quspin_hamiltonian("a", {'Nup': 2}).toarray())
+        np.testing.assert_allclose(
+            engine.get_quspin_floquet_hamiltonian(params, dt_list), HF,
+            atol=1e-10)
+
+
+class KrylovEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'],
+                 ['z', lambda t, i: 0.7 * (i % 3) if t == "a" else -0.4,
+                  np.inf], ['zz', 0.3, 'nnn']]
+        self.graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        self.engine = KrylovEngine(self.graph, num_samples=2000, seed=0)
+        self.reference = DiagonEngine(self.graph)
+
+    def unitary(self, params, dt_list):
+        unitary = np.identity(self.reference.get_basis().Ns)
+        for t, dt in zip(params, dt_list):
+            H = self.reference.get_sparse_hamiltonian(t).toarray()
+            unitary = expm(-1j * (dt if dt > 0 else 1) * H) @ unitary
+        return unitary
+
+    def test_evolve_state(self):
+        np.testing.assert_allclose(
+            self.engine.get_sparse_hamiltonian("a").toarray(),
+            self.reference.get_sparse_hamiltonian("a").toarray())
+        psi = np.zeros(self.reference.get_basis().Ns, dtype=complex)
+        psi[5] = 1
+        unitary = self.unitary(["a", "b"], [0.3, 0])
+        np.testing.assert_allclose(
+            self.engine.evolve_state(psi, ["a", "b"], [0.3, 0],
+                                     num_periods=3),
+            np.linalg.matrix_power(unitary, 3) @ psi, atol=1e-12)
+
+    def test_identity_loss_estimate(self):
+        exact = np.linalg.norm(self.unitary(["a", "b"], [0.3, 0.5]) -
+                               self.unitary(["b", "a"], [0.5, 0.3]))
+        estimate = self.engine.floquet_identity_loss(
+            ["a", "b"], [0.3, 0.5], ["b", "a"], [0.5, 0.3])
+        self.assertAlmostEqual(estimate / exact, 1, delta=0.05)
+
+        H1 = self.reference.get_quspin_hamiltonian("a")
+        H2 = self.reference.get_quspin_hamiltonian("b")
+        self.assertAlmostEqual(
+            self.engine.norm_identity_loss(H1, H2) /
+            self.reference.norm_identity_loss(H1, H2), 1, delta=0.05)
+
+
+class QuenchEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'],
+                 ['z', lambda t, i: 0.7 * (i % 3) if t == "a" else -0.4,
+                  np.inf], ['zz', 0.3, 'nnn'],
+                 ['x', lambda t, i: 0.3 if t == "pulse" else 0, np.inf]]
+        self.graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        self.engine = QuenchEngine(self.graph)
+
+    def test_product_state(self):
+        psi = self.engine.product_state('uddudu')
+        self.assertEqual(psi[self.engine.get_basis().index(0b100101)], 1)
+        psi = self.engine.product_state('uddudu', sector={'Nup': 3})
+        self.assertEqual(np.linalg.norm(psi), 1)
+        with self.assertRaises(ValueError):
+            self.engine.product_state(np.zeros((6, 2)) + np.pi / 2,
+                                      sector={'Nup': 3})
+        angles = np.column_stack([np.linspace(0, 3, 6),
+                                  np.linspace(0, 1, 6)])
+        psi = self.engine.product_state(['uddudu', angles])
+        self.assertEqual(psi.shape, (64, 2))
+        values = self.engine.expectation_values(
+            psi, ['magnetization', ('x', [2]), 'entropy'])
+        np.testing.assert_allclose(values['magnetization'][1],
+                                   np.cos(angles[:, 0]), atol=1e-12)
+        np.testing.assert_allclose(values[('x', (2,))][1],
+                                   np.sin(angles[2, 0]) * np.cos(angles[2, 1]))
+        np.testing.assert_allclose(values['entropy'], 0, atol=1e-12)
+
+    def test_quench(self):
+        params, dt_list = ["a", "pulse", "b"], [0.3, 0, 0.5]
+        hamiltonians = {t: self.engine.get_sparse_hamiltonian(t).toarray()
+                        for t in params}
+        psi = self.engine.product_state(['uduudd', 'dddudu'])
+        times = [1.6, 0, 0.8, 0.1]
+        observables = ['magnetization', 'correlations', 'entropy',
+                       ('xx', [0, 1])]
+        results = self.engine.quench(psi, params, dt_list, times, observables)
+
+        # two periods, recorded after the pulses at t=0.3 and t=1.1
+        steps = [("a", 0.1), ("a", 0.2), ("pulse", 1), ("b", 0.5), ("a", 0.3),
+                 ("pulse", 1), ("b", 0.5)]
+        states = {0: psi}
+        for t, (label, dt) in zip(np.cumsum([0.1, 0.2, 0, 0.5, 0.3, 0, 0.5]),
+                                  steps):
+            psi = expm(-1j * dt * hamiltonians[label]) @ psi
+            states[round(t, 6)] = psi
+        for n, t in enumerate(times):
+            expected = self.engine.expectation_values(states[t], observables)
+            for observable, value in expected.items():
+                np.testing.assert_allclose(results[observable][n], value,
+                                           atol=1e-10)
+
+
+class DMRGEngineTestCase(unittest.TestCase):
+    def setUp(self):
+        terms = [['xx', 0.5, 'nn'], ['yy', 0.5, 'nn'],
+                 ['z', lambda t, i: 0.7 * (i % 3) if t == "a" else -0.4,
+                  np.inf], ['zz', 0.3, 'nnn']]
+        self.graph = LatticeGraph.from_interactions(6, terms, pbc=True)
+        self.engine = DMRGEngine(self.graph, max_dt=0.01, seed=0)
+        self.reference = KrylovEngine(self.graph)
+
+    def test_ground_state(self):
+        energy, _ = self.engine.run_calculation("a")
+        self.assertAlmostEqual(energy, np.linalg.eigvalsh(
+            self.reference.get_sparse_hamiltonian("a").toarray())[0],
+                               places=8)
+
+    def test_evolve_state(self):
+        psi = mps.MPS.random_product_state(6, rng=0)
+        state = self.engine.evolve_state(psi, ["a", "b"], [0.3, 0.5])
+        expected = self.reference.evolve_state(psi.to_vector(), ["a", "b"],
+                                               [0.3, 0.5])
+        np.testing.assert_allclose(state.to_vector(), expected, atol=1e-3)
+
+    def test_losses(self):
+        self.assertAlmostEqual(
+            self.engine.frobenius_loss("a", "b"),
+            self.reference.frobenius_loss(
+                self.reference.get_quspin_hamiltonian("a"),
+                self.reference.get_quspin_hamiltonian("b")))
+        self.assertAlmostEqual(self.engine.norm_identity_loss(
+            "a", "a", num_samples=2), 0,
+                               places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()